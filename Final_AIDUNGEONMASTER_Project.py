@@ -1,11 +1,17 @@
 # ai_dungeon_master_with_db_and_bg.py
 import streamlit as st
 import os
-import base64
 import time
-import json
-import sqlite3
-from openai import OpenAI
+from asset_cache import ASSET_CACHE
+from game_engine import OFFLINE_MODE, ONLINE_MODE, GameSession, GameState
+from history_render import block_html, dm_block_html, entry_html, last_dm_index, older_page, page_count, split_history
+from metrics import METRICS, begin_rerun, end_rerun, serve_metrics
+from scheduler import default_client, is_retryable
+from save_store import SAVE_STORE
+from scene_classifier import scene_table
+from static_assets import enable_static_assets
+# Every path out of the script (stop(), safe_rerun() or the end) calls end_rerun(); see metrics.py
+begin_rerun()
 # ---------------------------
 # Configuration
 # ---------------------------
@@ -13,42 +19,69 @@ st.set_page_config(page_title="AI Dungeon Master", layout="wide")
 # Image paths (edit if your files are elsewhere)
 PARCHMENT_TEXTURE = "templates/Scroll wooden-floor background.jpg"
 SCROLL_IMAGE = "static/Scroll_PNG_Clipart.png"
-IMG_FOREST = "templates/forest background.jpg"
-IMG_LIGHTHOUSE = "templates/lighthouse background.jpg"  # add your lighthouse image here
+# Scene backgrounds are set in scene_classifier.py (or AIDM_SCENES_FILE); offline ones in stories/
 IMG_DEFAULT_BG = PARCHMENT_TEXTURE
+# AIDM_ASSET_MODE=static serves these as cached static files instead of inline base64
+enable_static_assets(ASSET_CACHE)
+# AIDM_METRICS_PORT serves per-turn timings and counters for the whole process
+serve_metrics()
 
 # ---------------------------
 # Helpers
 # ---------------------------
 def safe_rerun():
+    end_rerun()
     if hasattr(st, "rerun"):
         st.rerun()
     elif hasattr(st, "experimental_rerun"):
         st.experimental_rerun()
 
+def stop():
+    end_rerun()
+    st.stop()
+
+def get_query_param(name: str, default: str = ""):
+    if hasattr(st, "query_params"):
+        return st.query_params.get(name, default)
+    if hasattr(st, "experimental_get_query_params"):
+        return (st.experimental_get_query_params().get(name) or [default])[0]
+    return default
+
+def set_query_param(name: str, value: str):
+    if hasattr(st, "query_params"):
+        st.query_params[name] = value
+    elif hasattr(st, "experimental_set_query_params"):
+        params = st.experimental_get_query_params()
+        params[name] = value
+        st.experimental_set_query_params(**params)
+
 def file_to_base64(path):
-    with open(path, "rb") as f:
-        return base64.b64encode(f.read()).decode()
+    """Base64 of an image, served from the process-wide asset cache."""
+    return ASSET_CACHE.base64(path)
 
 def set_page_background(image_path: str, fade: float = 0.45):
     """Embed page background with a light fade overlay."""
-    if not image_path or not os.path.exists(image_path):
-        return
-    b64 = file_to_base64(image_path)
-    css = f"""
-    <style>
-    [data-testid="stAppViewContainer"], .stApp {{
-      background: linear-gradient(rgba(255,255,240,{fade}), rgba(255,255,240,{fade})),
-                  url("data:image/jpeg;base64,{b64}") center/cover no-repeat fixed;
-    }}
-    </style>
-    """
-    st.markdown(css, unsafe_allow_html=True)
+    with METRICS.span("page_background"):
+        css = ASSET_CACHE.background_css(image_path, fade)
+        if css:
+            st.markdown(css, unsafe_allow_html=True)
+
+def intro_countdown_keyframes(duration: float) -> str:
+    """CSS keyframes that tick a ``::after`` counter down once per second."""
+    seconds = max(1, int(duration))
+    steps = " ".join(f"{100 * i / seconds:.2f}% {{ content: \"{seconds - i}\"; }}" for i in range(seconds))
+    return f"@keyframes introCountdown {{ {steps} 100% {{ content: \"0\"; }} }}"
 
 # Inject CSS (parchment font, parchment-box, scroll animation, choices)
-def inject_css(parchment_b64: str, show_parchment_background: bool = True):
-    bg_css = (f'url("data:image/jpeg;base64,{parchment_b64}") center/cover no-repeat fixed' if parchment_b64 and show_parchment_background else "linear-gradient(180deg,#fffaf0,#fffdf8)")
-    st.markdown(f"""
+def inject_css(parchment_path: str, show_parchment_background: bool = True):
+    css = ASSET_CACHE.render(parchment_path, ("app_css", show_parchment_background),
+                             lambda src: build_app_css(src, show_parchment_background))
+    st.markdown(css, unsafe_allow_html=True)
+
+def build_app_css(parchment_src: str, show_parchment_background: bool = True):
+    """App-wide CSS; ``parchment_src`` is a static URL or data URI ("" if missing)."""
+    bg_css = (f'url("{parchment_src}") center/cover no-repeat fixed' if parchment_src and show_parchment_background else "linear-gradient(180deg,#fffaf0,#fffdf8)")
+    return f"""
     <style>
     [data-testid="stAppViewContainer"], .stApp {{
         background: linear-gradient(rgba(255,255,240,0.50), rgba(255,255,240,0.50)), {bg_css};
@@ -98,7 +131,7 @@ def inject_css(parchment_b64: str, show_parchment_background: bool = True):
         padding: 22px;
         margin: 14px 0;
         box-shadow: 0 8px 24px rgba(0,0,0,0.16);
-        background-image: {('url("data:image/jpeg;base64,' + parchment_b64 + '")') if parchment_b64 else 'none'};
+        background-image: {('url("' + parchment_src + '")') if parchment_src else 'none'};
         background-size: cover;
         background-blend-mode: multiply;
     }}
@@ -109,253 +142,56 @@ def inject_css(parchment_b64: str, show_parchment_background: bool = True):
     .choice-btn:hover {{ background:#e9d0a0; }}
     .meta {{ font-size:0.9em; color:#5b3e2b; margin-bottom:6px; }}
     </style>
-    """, unsafe_allow_html=True)
+    """
 
 # ---------------------------
-# OpenAI client init (OpenAI only)
+# OpenAI client (created on the first AI call, once per process)
 # ---------------------------
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY") or st.secrets.get("OPENAI_API_KEY", "")
-client = None
-if OPENAI_API_KEY:
+def openai_api_key() -> str:
+    key = os.getenv("OPENAI_API_KEY")
+    if key:
+        return key
     try:
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        print("✅ OpenAI API key loaded")  # Backend console output
-    except Exception as e:
-        client = None
-        print(f"OpenAI init error: {e}")
-else:
-    print("No OpenAI key found — offline mode available")
+        return st.secrets.get("OPENAI_API_KEY", "")
+    except Exception:  # no secrets.toml at all
+        return ""
 
-# ---------------------------
-# Offline stories with per-segment backgrounds
-# ---------------------------
-OFFLINE_STORIES = [
-    {
-        "id": "stillhollow",
-        "title": "Lantern of Stillhollow",
-        "segments": [
-            {
-                "text": "You arrive at the fog-choked town of Stillhollow...",
-                "background": IMG_LIGHTHOUSE,
-                "choices": [
-                    {"label": "Enter Stillhollow", "result": "You step into the fog-wreathed square."},
-                    {"label": "Scout the coast", "result": "On the pier you find barnacled charts."},
-                    {"label": "Question the locals", "result": "A fisherwoman whispers of a drowned bell."}
-                ],
-            },
-            {
-                "text": "You approach the lighthouse atop the cliff...",
-                "background": IMG_LIGHTHOUSE,
-                "choices": [
-                    {"label": "Pick the lock", "result": "The lock clicks softly."},
-                    {"label": "Break the door", "result": "The door splinters on impact."},
-                    {"label": "Circle the lighthouse", "result": "Behind the tower, a hidden cellar gapes."}
-                ],
-            },
-            {
-                "text": "Down below, a ruined jetty leads to watery graves...",
-                "background": IMG_FOREST,
-                "choices": [
-                    {"label": "Investigate the jetty", "result": "You find a carved rune."},
-                    {"label": "Call out to the sea", "result": "Your voice is swallowed by the fog."},
-                    {"label": "Return to town", "result": "The lantern in a shop window flickers oddly."}
-                ],
-            },
-        ],
-    },
-    {
-        "id": "obsidian_crypt",
-        "title": "The Obsidian Crypt",
-        "segments": [
-            {
-                "text": "At the edge of the desert stands the Obsidian Crypt, its door sealed for centuries...",
-                "background": IMG_FOREST,
-                "choices": [
-                    {"label": "Examine the carvings", "result": "Ancient glyphs warn of a curse."},
-                    {"label": "Push open the door", "result": "The door grinds open, revealing darkness."},
-                    {"label": "Circle the crypt", "result": "You find a sand-buried skeleton clutching a key."}
-                ],
-            },
-            {
-                "text": "Inside, torchlight dances across black stone walls...",
-                "background": IMG_LIGHTHOUSE,
-                "choices": [
-                    {"label": "Take the left passage", "result": "It leads to a chamber of broken statues."},
-                    {"label": "Take the right passage", "result": "You hear faint whispers ahead."},
-                    {"label": "Go straight ahead", "result": "A massive door stands before you, chained shut."}
-                ],
-            },
-            {
-                "text": "Deep within, you stand before a sarcophagus of polished obsidian...",
-                "background": IMG_FOREST,
-                "choices": [
-                    {"label": "Open the sarcophagus", "result": "Inside lies a golden dagger."},
-                    {"label": "Inspect the surroundings", "result": "Symbols on the walls shift before your eyes."},
-                    {"label": "Leave quietly", "result": "You retreat, the whispers fading."}
-                ],
-            },
-        ],
-    },
-    {
-        "id": "stormspire",
-        "title": "Stormspire Keep",
-        "segments": [
-            {
-                "text": "Lightning arcs across the sky as you reach Stormspire Keep...",
-                "background": IMG_LIGHTHOUSE,
-                "choices": [
-                    {"label": "Enter the courtyard", "result": "You step through a gate of rusted iron."},
-                    {"label": "Climb the outer wall", "result": "Rain makes the climb treacherous."},
-                    {"label": "Search the stables", "result": "You find an abandoned warhorse."}
-                ],
-            },
-            {
-                "text": "Inside, the halls echo with the sound of distant footsteps...",
-                "background": IMG_FOREST,
-                "choices": [
-                    {"label": "Head for the throne room", "result": "A shattered crown lies on the dais."},
-                    {"label": "Descend into the dungeons", "result": "A prisoner begs for your help."},
-                    {"label": "Search the library", "result": "You find a tome crackling with static energy."}
-                ],
-            },
-            {
-                "text": "At the highest tower, you confront the source of the storm...",
-                "background": IMG_LIGHTHOUSE,
-                "choices": [
-                    {"label": "Attack the sorcerer", "result": "Your weapon clashes with his staff."},
-                    {"label": "Offer a truce", "result": "He pauses, lightning fading in his eyes."},
-                    {"label": "Flee the tower", "result": "The storm follows you down the stairs."}
-                ],
-            },
-        ],
-    },
-    {
-        "id": "whispering_forest",
-        "title": "The Whispering Forest",
-        "segments": [
-            {
-                "text": "The trees seem to murmur as you step into the Whispering Forest...",
-                "background": IMG_FOREST,
-                "choices": [
-                    {"label": "Follow the whispers", "result": "They lead you to a mossy stone circle."},
-                    {"label": "Climb a tree", "result": "You see smoke rising far to the east."},
-                    {"label": "Search the undergrowth", "result": "You find an old leather satchel."}
-                ],
-            },
-            {
-                "text": "The deeper you go, the louder the voices become...",
-                "background": IMG_FOREST,
-                "choices": [
-                    {"label": "Confront the voices", "result": "They belong to a council of dryads."},
-                    {"label": "Ignore them", "result": "A root snags your foot, almost tripping you."},
-                    {"label": "Ask for guidance", "result": "The dryads tell of a hidden glade."}
-                ],
-            },
-            {
-                "text": "In the glade, moonlight falls upon a crystal pool...",
-                "background": IMG_LIGHTHOUSE,
-                "choices": [
-                    {"label": "Drink from the pool", "result": "You feel a strange power course through you."},
-                    {"label": "Look into the water", "result": "You see visions of your future."},
-                    {"label": "Leave the glade", "result": "The forest quiets as you depart."}
-                ],
-            },
-        ],
-    },
-]
+def get_client():
+    """Shared OpenAI client, or None without a key; reruns only read the cached result."""
+    return default_client(openai_api_key)
+
+# Seconds between repaints of a streamed DM reply (streaming itself: AIDM_STREAM, see game_engine.py)
+STREAM_REPAINT_INTERVAL = 0.05
+
+# Game rules live in game_engine.py; this script keeps a GameState in st.session_state.game and renders it.
+# The engine only references process-wide objects (save store, story library, prefetcher), so it is cheap per rerun.
+engine = GameSession(client=get_client)
 
 # ---------------------------
 # Database (per-player saves)
 # ---------------------------
-DB_FOLDER = os.path.join(os.path.expanduser("~"), ".ai_dungeon_master")
-os.makedirs(DB_FOLDER, exist_ok=True)
-DB_PATH = os.path.join(DB_FOLDER, "game_data.db")
-conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-cur = conn.cursor()
-cur.execute("""
-CREATE TABLE IF NOT EXISTS saves (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    player_name TEXT,
-    created_at REAL,
-    mode TEXT,
-    history TEXT,
-    offline_story_id TEXT,
-    offline_segment INTEGER
-)
-""")
-conn.commit()
-
-def save_to_db(player_name: str):
-    cur.execute("INSERT INTO saves (player_name, created_at, mode, history, offline_story_id, offline_segment) VALUES (?,?,?,?,?,?)",
-                (player_name, time.time(), st.session_state.mode, json.dumps(st.session_state.online_history),
-                 st.session_state.offline_story_id, st.session_state.offline_segment))
-    conn.commit()
-
-def list_saves():
-    cur.execute("SELECT id, player_name, created_at FROM saves ORDER BY created_at DESC")
-    return cur.fetchall()
-
-def load_from_db(save_id: int):
-    cur.execute("SELECT player_name, mode, history, offline_story_id, offline_segment FROM saves WHERE id=?", (save_id,))
-    row = cur.fetchone()
-    if row:
-        st.session_state.character_name = row[0]
-        st.session_state.mode = row[1]
-        st.session_state.online_history = json.loads(row[2])
-        st.session_state.offline_story_id = row[3]
-        st.session_state.offline_segment = row[4]
-        return True
-    return False
+# SAVE_STORE (save_store.py) is local SQLite (a connection per thread, WAL mode) unless
+# AIDM_SAVE_BACKEND points every replica at a shared Redis.
+# Each session plays one campaign; a save appends only the new history entries.
+# Saves are queued to the background writer in autosave.py, so clicking Save never waits on the store.
+SAVES_PAGE_SIZE = 10
+
+def list_saves_page(player_name=None, after=None):
+    return SAVE_STORE.list_saves_page(player_name, after=after, limit=SAVES_PAGE_SIZE)
+
+def count_saves(player_name=None):
+    return SAVE_STORE.count_saves(player_name)
 
 def delete_save(save_id: int):
-    cur.execute("DELETE FROM saves WHERE id=?", (save_id,))
-    conn.commit()
-# ---------------------------
-# Parse AI output (robust)
-# ---------------------------
-def parse_ai_output(text):
-    if not text:
-        return ("", [])
-    lines = [ln.rstrip() for ln in text.splitlines()]
-    joined_lower = "\n".join(lines).lower()
-    choices = []
-    if "choices:" in joined_lower:
-        story_lines = []
-        in_choices = False
-        for ln in lines:
-            if ln.strip().lower().startswith("choices:"):
-                in_choices = True
-                continue
-            if in_choices:
-                s = ln.strip()
-                if not s:
-                    continue
-                s = s.lstrip("0123456789.)-• \t")
-                if s:
-                    choices.append(s)
-            else:
-                story_lines.append(ln)
-        return ("\n".join(story_lines).strip(), choices)
-    story_lines = []
-    for ln in lines:
-        s = ln.strip()
-        if not s:
-            story_lines.append(ln)
-            continue
-        if (s[0].isdigit() and (s[1:2] in ('.', ')'))) or s.startswith(("-", "•")):
-            candidate = s.lstrip("0123456789.)-• \t")
-            if len(candidate.split()) <= 20:
-                choices.append(candidate)
-            else:
-                story_lines.append(ln)
-        else:
-            story_lines.append(ln)
-    if not choices:
-        tail = [ln.strip() for ln in lines[-6:] if ln.strip()]
-        heur = [ln for ln in tail if len(ln.split()) <= 12]
-        choices = heur[-3:]
-        story_lines = lines[:-len(choices)] if choices else lines
-    return ("\n".join(story_lines).strip(), choices)
+    SAVE_STORE.delete(save_id)
+
+def save_game():
+    """Save button: needs a character name, like starting a game does."""
+    if not st.session_state.game.player_name.strip():
+        st.warning("Please enter a character name on the home screen before saving.")
+    else:
+        st.session_state.game = engine.save_async(st.session_state.game)
+        st.success("Saving to DB in the background.")
 
 # ---------------------------
 # Session state init
@@ -366,25 +202,22 @@ if "intro_start" not in st.session_state:
     st.session_state.intro_start = time.time()
 if "character_name" not in st.session_state:
     st.session_state.character_name = ""
-if "mode" not in st.session_state:
-    st.session_state.mode = None
-if "online_history" not in st.session_state:
-    st.session_state.online_history = []
-if "offline_story_id" not in st.session_state:
-    st.session_state.offline_story_id = OFFLINE_STORIES[0]["id"]
-if "offline_segment" not in st.session_state:
-    st.session_state.offline_segment = 0
+if "game" not in st.session_state:
+    st.session_state.game = GameState()
+# campaign key and entry count of the background writer's latest save of this game
+st.session_state.game = engine.sync_saves(st.session_state.game)
 
 # ---------------------------
 # Inject CSS (hide parchment on intro)
 # ---------------------------
-parch_b64 = file_to_base64(PARCHMENT_TEXTURE) if os.path.exists(PARCHMENT_TEXTURE) else ""
-inject_css(parch_b64, show_parchment_background=st.session_state.intro_seen)
+inject_css(PARCHMENT_TEXTURE, show_parchment_background=st.session_state.intro_seen)
 
 # ---------------------------
-# Intro (scroll) – auto advance after 8s
+# Intro (scroll) – auto advance after INTRO_DURATION
 # ---------------------------
 INTRO_DURATION = 5.0
+# AIDM_SKIP_INTRO=1 disables the intro for every session
+SKIP_INTRO = os.getenv("AIDM_SKIP_INTRO", "") == "1"
 
 # Initialize intro state
 if "intro_seen" not in st.session_state:
@@ -394,15 +227,23 @@ if "intro_page" not in st.session_state:
 if "intro_start" not in st.session_state:
     st.session_state.intro_start = time.time()
 
+def finish_intro():
+    st.session_state.intro_page = 2
+    st.session_state.intro_start = time.time()
+    # Remember in the URL so reloads/bookmarks of a returning player skip the intro
+    set_query_param("intro", "seen")
+
+# Returning players (?intro=seen or ?intro=skip) go straight to the home screen
+if st.session_state.intro_page == 1 and (SKIP_INTRO or get_query_param("intro") in ("seen", "skip")):
+    st.session_state.intro_page = 2
+
 # ---------------- PAGE 1 ----------------
 if not st.session_state.intro_seen and st.session_state.intro_page == 1:
-    if os.path.exists(SCROLL_IMAGE):
-        sb64 = file_to_base64(SCROLL_IMAGE)
-        scroll_tag = f'<img src="data:image/png;base64,{sb64}" style="width:90%; max-width:1300px; object-fit:contain;">'
-    else:
-        scroll_tag = ""
+    scroll_tag = ASSET_CACHE.render(
+        SCROLL_IMAGE, "intro_scroll_tag",
+        lambda src: f'<img src="{src}" style="width:90%; max-width:1300px; object-fit:contain;">' if src else "")
 
-    css = f"""
+    css = ASSET_CACHE.render(PARCHMENT_TEXTURE, ("intro_css", INTRO_DURATION), lambda parch_src: f"""
     <link href="https://fonts.googleapis.com/css2?family=MedievalSharp&display=swap" rel="stylesheet">
     <style>
     @keyframes scrollUpFade {{
@@ -418,7 +259,7 @@ if not st.session_state.intro_seen and st.session_state.intro_page == 1:
         animation: scrollUpFade {INTRO_DURATION}s ease-out forwards;
         text-align: center;
         font-family: 'MedievalSharp', cursive;
-        background: url("data:image/png;base64,{parch_b64}") no-repeat center center;
+        background: url("{parch_src}") no-repeat center center;
         background-size: cover;
         padding: 20px;
     }}
@@ -442,8 +283,13 @@ if not st.session_state.intro_seen and st.session_state.intro_page == 1:
         color: rgba(255, 255, 255, 0.8);
         font-family: Arial, sans-serif;
     }}
+    .intro-counter .countdown::after {{
+        content: "{int(INTRO_DURATION)}";
+        animation: introCountdown {INTRO_DURATION}s steps(1, end) forwards;
+    }}
+    {intro_countdown_keyframes(INTRO_DURATION)}
     </style>
-    """
+    """)
 
     html = f"""
        {css}
@@ -456,23 +302,37 @@ if not st.session_state.intro_seen and st.session_state.intro_page == 1:
        </div>
        """
 
-    elapsed = time.time() - st.session_state.intro_start
-    remaining = max(0, int(INTRO_DURATION - elapsed))
+    # The countdown runs in the browser (CSS animation); the server renders the
+    # intro once and schedules a single transition instead of polling.
     st.markdown(html, unsafe_allow_html=True)
-    st.markdown(f"<div class='intro-counter'>Page 1 ends in ~{remaining}s</div>", unsafe_allow_html=True)
+    st.markdown("<div class='intro-counter'>Page 1 ends in ~<span class='countdown'></span>s</div>", unsafe_allow_html=True)
+    if st.button("Skip intro", key="skip_intro"):
+        finish_intro()
+        safe_rerun()
 
-    if elapsed < INTRO_DURATION:
-        time.sleep(0.5)
+    remaining = INTRO_DURATION - (time.time() - st.session_state.intro_start)
+    if remaining <= 0:
+        finish_intro()
         safe_rerun()
+    elif hasattr(st, "fragment"):
+        @st.fragment(run_every=remaining)
+        def intro_timer():
+            if time.time() - st.session_state.intro_start >= INTRO_DURATION:
+                finish_intro()
+                safe_rerun()
+        intro_timer()
     else:
-        st.session_state.intro_page = 2
-        st.session_state.intro_start = time.time()
+        # Older Streamlit: one deferred transition (no per-0.5s reruns)
+        time.sleep(remaining)
+        finish_intro()
         safe_rerun()
+    stop()
 
 # ---------------------------
 # Character / Home screen
 # ---------------------------
-if st.session_state.mode is None:
+game = st.session_state.game
+if game.mode is None:
     # show parchment background now
     set_page_background(PARCHMENT_TEXTURE, fade=0.45)
     st.markdown("<div style='display:flex; gap:20px; align-items:center;'>", unsafe_allow_html=True)
@@ -493,35 +353,42 @@ if st.session_state.mode is None:
 
     # Save/load area (list saves)
     st.markdown("<div style='margin-top:12px; display:flex; gap:12px;'>", unsafe_allow_html=True)
-    if st.button("Start Online (AI)"):
-        if not st.session_state.character_name.strip():
-            st.warning("Please enter a character name.")
-        else:
-            st.session_state.mode = "online"
-            st.session_state.online_history = []
-            safe_rerun()
-    if st.button("Start Offline"):
-        if not st.session_state.character_name.strip():
-            st.warning("Please enter a character name.")
-        else:
-            st.session_state.mode = "offline"
-            st.session_state.offline_segment = 0
-            st.session_state.online_history = []
-            safe_rerun()
+    for label, mode in (("Start Online (AI)", ONLINE_MODE), ("Start Offline", OFFLINE_MODE)):
+        if st.button(label):
+            if not st.session_state.character_name.strip():
+                st.warning("Please enter a character name.")
+            else:
+                st.session_state.game = engine.new_game(game, mode, player_name=st.session_state.character_name.strip())
+                safe_rerun()
     st.markdown("</div>", unsafe_allow_html=True)
 
     st.markdown("---")
     st.markdown("#### Saved games")
-    saves = list_saves()
+    # Pages of SAVES_PAGE_SIZE rows; saves_page_cursors holds the keyset cursor of each page
+    save_filter = st.text_input("Filter by player name", key="saves_filter").strip()
+    if st.session_state.get("saves_filter_applied") != save_filter:
+        st.session_state.saves_filter_applied = save_filter
+        st.session_state.saves_page_cursors = [None]
+    cursors = st.session_state.setdefault("saves_page_cursors", [None])
+    saves, next_cursor = list_saves_page(save_filter or None, after=cursors[-1])
+    if not saves and len(cursors) > 1:
+        # page emptied by deletes; step back
+        cursors.pop()
+        saves, next_cursor = list_saves_page(save_filter or None, after=cursors[-1])
     if saves:
+        total = count_saves(save_filter or None)
+        first = (len(cursors) - 1) * SAVES_PAGE_SIZE + 1
+        st.caption(f"Showing {first}–{first + len(saves) - 1} of {total} saves")
         for sid, pname, ctime in saves:
             col1, col2, col3 = st.columns([3,1,1])
             with col1:
                 st.write(f"{pname}** — {time.ctime(ctime)}")
             with col2:
                 if st.button("Load", key=f"load_{sid}"):
-                    loaded = load_from_db(sid)
+                    loaded = engine.load(sid)
                     if loaded:
+                        st.session_state.game = loaded
+                        st.session_state.character_name = loaded.player_name
                         st.success("Loaded save.")
                         safe_rerun()
                     else:
@@ -531,186 +398,169 @@ if st.session_state.mode is None:
                     delete_save(sid)
                     st.success("Deleted save.")
                     safe_rerun()
+        pcol1, pcol2 = st.columns([1,1])
+        with pcol1:
+            if len(cursors) > 1 and st.button("◀ Newer", key="saves_prev"):
+                cursors.pop()
+                safe_rerun()
+        with pcol2:
+            if next_cursor is not None and st.button("Older ▶", key="saves_next"):
+                cursors.append(next_cursor)
+                safe_rerun()
+    elif save_filter:
+        st.write(f"No saves for {save_filter}.")
     else:
         st.write("No saves yet. Your gameplay will appear here after you save.")
 
     st.markdown("</div><div style='flex:1'></div>", unsafe_allow_html=True)
-    st.stop()
+    stop()
 
 # ---------------------------
 # AI helper
 # ---------------------------
-def ask_ai_and_update(choice_label=None, free_text=None):
-    history = st.session_state.online_history[-8:]
-    prompt = "You are a consistent Dungeon Master running a long-form interactive fantasy adventure. Maintain continuity and character.\n\n"
-    prompt += "History:\n"
-    for h in history:
-        prompt += h + "\n"
-    if choice_label:
-        prompt += f"Player chooses: {choice_label}\n"
-    elif free_text:
-        prompt += f"Player says: {free_text}\n"
-    prompt += "Now continue the story in vivid detail (a few paragraphs) and then provide exactly 3 clear choices for the player (either numbered or under 'Choices:')."
-
-    if not client:
-        raise RuntimeError("OpenAI client not configured")
+AI_BUSY_NOTICE = "The Dungeon Master is busy right now — please try that again in a moment."
+
+def live_painter(live):
+    """``on_text`` for engine.play: repaints the streamed reply into ``live`` (``st.empty()``)."""
+    if not engine.stream or live is None:
+        return None
+    last_paint = [0.0]
+    def on_text(partial):
+        now = time.perf_counter()
+        if now - last_paint[0] >= STREAM_REPAINT_INTERVAL:
+            last_paint[0] = now
+            live.markdown(dm_block_html(partial, is_new=False), unsafe_allow_html=True)
+    return on_text
+
+def play_turn(choice_label=None, free_text=None, live=None):
+    """Run the player's action and the DM's reply through the engine, then rerun."""
     try:
-        # Try Responses API
-        try:
-            resp = client.responses.create(model="gpt-4o-mini", input=prompt, max_output_tokens=400, temperature=0.8)
-            text = ""
-            if getattr(resp, "output_text", None):
-                text = resp.output_text
-            else:
-                outputs = resp.output if hasattr(resp, "output") else resp.get("output", [])
-                if isinstance(outputs, list) and outputs:
-                    parts = []
-                    for o in outputs:
-                        if isinstance(o, dict) and "content" in o:
-                            for c in o["content"]:
-                                if c.get("type") == "output_text":
-                                    parts.append(c.get("text",""))
-                    text = "\n".join(parts).strip()
-                else:
-                    text = str(resp)
-        except Exception:
-            # fallback to old chat completion (SDK specific)
-            resp = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role":"system","content":"You are a helpful Dungeon Master."},
-                          {"role":"user","content":prompt}],
-                max_tokens=400,
-                temperature=0.8
-            )
-            text = resp.choices[0].message.content
-        story_text, choices = parse_ai_output(text)
-        dm_block = "DM: " + story_text.strip()
-        if choices:
-            dm_block += "\n\nChoices:\n" + "\n".join([f"{i+1}. {c}" for i,c in enumerate(choices)])
-        st.session_state.online_history.append(dm_block)
-        return story_text, choices
+        st.session_state.game = engine.play(st.session_state.game, choice_label=choice_label, free_text=free_text,
+                                            on_text=live_painter(live))
     except Exception as e:
-        raise
-# ---------------------------
-# Utility: choose background for a block based on keywords (online)
-# ---------------------------
-def pick_bg_for_text(text: str):
-    t = text.lower()
-    if "forest" in t or "trees" in t or "wood" in t:
-        return IMG_FOREST if os.path.exists(IMG_FOREST) else IMG_DEFAULT_BG
-    if "lighthouse" in t or "sea" in t or "pier" in t or "coast" in t:
-        return IMG_LIGHTHOUSE if os.path.exists(IMG_LIGHTHOUSE) else IMG_DEFAULT_BG
-    return IMG_DEFAULT_BG
+        # Rate limits and outages that outlasted the retries keep the game online (the action
+        # was not recorded, so it can simply be clicked again); other errors go offline.
+        if is_retryable(e):
+            st.session_state.ai_notice = AI_BUSY_NOTICE
+        else:
+            st.warning("AI error — switching to offline mode.")
+            st.session_state.game = engine.fall_back_offline(st.session_state.game)
+    finally:
+        if live is not None:
+            live.empty()
+    safe_rerun()
+
 # ---------------------------
 # Online Mode UI & Flow
 # ---------------------------
-if st.session_state.mode == "online":
-    st.header(f"🌐 Online Adventure — {st.session_state.character_name}")
+if game.mode == ONLINE_MODE:
+    st.header(f"🌐 Online Adventure — {game.player_name}")
+
+    notice = st.session_state.pop("ai_notice", None)
+    if notice:
+        st.warning(notice)
 
     # If no DM intro exists, ask AI
-    if not st.session_state.online_history:
+    if not game.history:
+        live = st.empty()
         try:
-            ask_ai_and_update()
-        except Exception:
+            game = st.session_state.game = engine.play(game, on_text=live_painter(live))
+        except Exception as e:
+            if is_retryable(e):
+                st.warning(AI_BUSY_NOTICE)
+                st.button("Try again")  # any click reruns the script, which retries the opening
+                stop()
             st.warning("AI not available — switching to offline mode.")
-            st.session_state.mode = "offline"
+            st.session_state.game = engine.fall_back_offline(game)
             safe_rerun()
-
-    # Find last DM block and adjust background accordingly
-    last_dm_block = next((b for b in reversed(st.session_state.online_history) if b.startswith("DM:")), None)
-    if last_dm_block:
-        # pick background by heuristics
-        bg = pick_bg_for_text(last_dm_block)
-        set_page_background(bg, fade=0.5)
-
-    # Render full history. Animate latest DM.
-    last_dm_index = None
-    for i, entry in enumerate(st.session_state.online_history):
-        if entry.startswith("DM:"):
-            last_dm_index = i
-    for idx, entry in enumerate(st.session_state.online_history):
-        if entry.startswith("DM:"):
-            is_new = (idx == last_dm_index)
-            cls = "parchment-box dm-new" if is_new else "parchment-box"
-            html = f"<div class='{cls}'><div class='meta'>Dungeon Master</div><div style='white-space:pre-wrap; font-size:1.05em;'>{entry[3:].replace(chr(10),'<br>')}</div></div>"
-            st.markdown(html, unsafe_allow_html=True)
-        else:
-            st.markdown(f"<div style='margin:8px 0; color:#2f2f2f;'><b>Player:</b> {entry.replace('PLAYER: ','')}</div>", unsafe_allow_html=True)
+        live.empty()
+
+    # Find last DM turn and adjust background accordingly
+    history = game.history
+    newest_dm = last_dm_index(history)
+    last_dm = history[newest_dm] if newest_dm is not None else None
+    if last_dm:
+        # scene picked by keywords when the turn arrived (older saves: from the text now)
+        scenes = scene_table()
+        scene = last_dm.background or scenes.classify(last_dm.text)
+        set_page_background(scenes.background(scene) or IMG_DEFAULT_BG, fade=0.5)
+
+    # Render history: older entries in one cached (and paged) container, recent ones one by one.
+    # The latest DM block animates.
+    with METRICS.span("history_render"):
+        older, recent = split_history(history)
+        if older:
+            with st.expander(f"Earlier in your adventure ({len(older)} entries)"):
+                pages = page_count(len(older))
+                page = 1
+                if pages > 1:
+                    page = int(st.number_input(f"Page (1 = most recent of {pages})", min_value=1, max_value=pages,
+                                               value=1, step=1, key="history_page"))
+                st.markdown(block_html(tuple(older_page(older, page))), unsafe_allow_html=True)
+        for idx, entry in enumerate(recent, start=len(older)):
+            st.markdown(entry_html(entry, is_new=(idx == newest_dm)), unsafe_allow_html=True)
+
+    # Streamed DM replies render here, between the history and the choices
+    live_dm = st.empty()
 
     # Choices at bottom (after DM)
-    last_dm = last_dm_block or ""
-    story_text, choices = parse_ai_output(last_dm[3:] if last_dm else "")
+    choices = last_dm.choices if last_dm else ()
     if choices:
         st.markdown("<div class='choices-area'>", unsafe_allow_html=True)
         for i, c in enumerate(choices):
-            key = f"online_choice_{i}_{len(st.session_state.online_history)}"
+            key = f"online_choice_{i}_{len(history)}"
             if st.button(c, key=key):
-                st.session_state.online_history.append("PLAYER: " + c)
-                try:
-                    ask_ai_and_update(choice_label=c)
-                except Exception:
-                    st.warning("AI error — switching to offline mode.")
-                    st.session_state.mode = "offline"
-                safe_rerun()
+                play_turn(choice_label=c, live=live_dm)
         st.markdown("</div>", unsafe_allow_html=True)
+        engine.prefetch(game)
     else:
         txt = st.text_input("Your action (free text):", key="free_action")
         if st.button("Submit action (free)"):
             if txt.strip():
-                st.session_state.online_history.append("PLAYER: " + txt.strip())
-                try:
-                    ask_ai_and_update(free_text=txt.strip())
-                except Exception:
-                    st.warning("AI error — switching to offline mode.")
-                    st.session_state.mode = "offline"
-                safe_rerun()
+                play_turn(free_text=txt.strip(), live=live_dm)
 
     # Save/load controls for online mode
     st.markdown("---")
     col1, col2 = st.columns([1,1])
     with col1:
         if st.button("Save Game (to DB)"):
-            if not st.session_state.character_name.strip():
-                st.warning("Please enter a character name on the home screen before saving.")
-            else:
-                save_to_db(st.session_state.character_name.strip())
-                st.success("Saved to DB.")
+            save_game()
     with col2:
         if st.button("Return to Home"):
-            st.session_state.mode = None
+            st.session_state.game = engine.leave(game)
             safe_rerun()
 
 # ---------------------------
 # Offline Mode UI & Flow
 # ---------------------------
-elif st.session_state.mode == "offline":
-    # show selection of offline story and segment background
-    titles = [s["title"] for s in OFFLINE_STORIES]
-    title_map = {s["title"]: s for s in OFFLINE_STORIES}
-    sel_title = st.selectbox("Choose an offline adventure:", titles, index=0)
-    story = title_map[sel_title]
-    seg_idx = st.session_state.offline_segment
-    if seg_idx >= len(story["segments"]):
+elif game.mode == OFFLINE_MODE:
+    # Story packs are loaded and validated once per process; a rerun only looks them up
+    library = engine.library()
+    if not library.ids:
+        st.error("No offline adventures could be loaded — check the stories folder.")
+        stop()
+    sel_id = st.selectbox("Choose an offline adventure:", library.ids, index=library.position(game.offline_story_id),
+                          format_func=library.title)
+    # a different adventure (or a save whose story is gone) starts from the beginning
+    game = st.session_state.game = engine.select_story(game, sel_id)
+    story = engine.offline_story(game)
+    seg_idx = game.offline_segment
+    seg = story.segment(seg_idx)
+    if seg is None:
         st.success("🎉 You completed this offline adventure!")
         if st.button("Return to home"):
-            st.session_state.mode = None
+            st.session_state.game = engine.leave(game)
             safe_rerun()
     else:
-        seg = story["segments"][seg_idx]
-        # set segment background if provided
-        seg_bg = seg.get("background", IMG_DEFAULT_BG)
-        if seg_bg and os.path.exists(seg_bg):
-            set_page_background(seg_bg, fade=0.45)
-        else:
-            set_page_background(PARCHMENT_TEXTURE, fade=0.45)
+        # backgrounds were checked when the story was loaded; None means it is missing
+        set_page_background(seg.background or PARCHMENT_TEXTURE, fade=0.45)
 
-        st.markdown(f"<div class='parchment-box'><h2 style='margin-top:0'>{story['title']}</h2><div style='white-space:pre-wrap; font-size:1.05em;'>{seg['text']}</div></div>", unsafe_allow_html=True)
+        st.markdown(f"<div class='parchment-box'><h2 style='margin-top:0'>{story.title}</h2><div style='white-space:pre-wrap; font-size:1.05em;'>{seg.text}</div></div>", unsafe_allow_html=True)
         st.markdown("<div class='choices-area'>", unsafe_allow_html=True)
-        for i, ch in enumerate(seg["choices"]):
+        for i, ch in enumerate(seg.choices):
             key = f"off_choice_{seg_idx}_{i}"
-            if st.button(ch["label"], key=key):
-                st.session_state.online_history.append("OFFLINE: " + ch["result"])
-                st.session_state.offline_segment += 1
+            if st.button(ch.label, key=key):
+                st.session_state.game = engine.choose_offline(game, i)
                 safe_rerun()
         st.markdown("</div>", unsafe_allow_html=True)
 
@@ -719,21 +569,18 @@ elif st.session_state.mode == "offline":
         col1, col2, col3 = st.columns([1,1,1])
         with col1:
             if st.button("Save Game (to DB)"):
-                if not st.session_state.character_name.strip():
-                    st.warning("Please enter a character name on the home screen before saving.")
-                else:
-                    save_to_db(st.session_state.character_name.strip())
-                    st.success("Saved to DB.")
+                save_game()
         with col2:
             if st.button("Restart Story"):
-                st.session_state.offline_segment = 0
-                st.session_state.online_history = []
+                st.session_state.game = engine.new_game(game, OFFLINE_MODE)
                 safe_rerun()
         with col3:
             if st.button("Return to Home"):
-                st.session_state.mode = None
+                st.session_state.game = engine.leave(game)
                 safe_rerun()
 
         # Adventure log
-        if st.session_state.online_history:
-            st.markdown("<div style='margin-top:18px;' class='parchment-box'><h3>Adventure Log</h3>" + "".join(f"<div>- {e}</div>" for e in st.session_state.online_history) + "</div>", unsafe_allow_html=True)
\ No newline at end of file
+        if game.history:
+            st.markdown("<div style='margin-top:18px;' class='parchment-box'><h3>Adventure Log</h3>" + "".join(f"<div>- {e}</div>" for e in game.history) + "</div>", unsafe_allow_html=True)
+
+end_rerun()
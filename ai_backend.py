@@ -0,0 +1,313 @@
+# ai_backend.py
+"""OpenAI calls for Dungeon Master turns, blocking or streamed.
+
+Two backends are supported: the Responses API and the older
+``chat.completions`` API.  ``BackendRouter`` remembers, per client, which
+one works so SDKs or proxies without the Responses API do not pay for a
+failed round trip on every turn; the preferred backend is re-probed after a
+cooldown.  With ``stream=True`` text deltas are passed to ``on_text`` as
+they arrive so the UI can render the story while the model is still writing.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from metrics import Histogram
+from response_cache import RESPONSE_CACHE, CacheMiss, cache_key
+from scheduler import SCHEDULER, is_retryable
+
+MODEL = "gpt-4o-mini"
+MAX_OUTPUT_TOKENS = 400
+TEMPERATURE = 0.8
+SYSTEM_PROMPT = "You are a helpful Dungeon Master."
+# Seconds before a client that fell back to chat.completions tries the Responses API again
+REPROBE_COOLDOWN = float(os.getenv("AIDM_BACKEND_REPROBE_S", "300"))
+
+
+@dataclass
+class TurnTiming:
+    api: str = ""             # "responses", "chat" or "cache"
+    streamed: bool = False
+    ttft: float = None        # seconds until the first text delta (streaming only)
+    total: float = 0.0        # seconds for the whole completion
+    chars: int = 0
+
+    def as_dict(self) -> dict:
+        return {"api": self.api, "streamed": self.streamed, "ttft": self.ttft,
+                "total": self.total, "chars": self.chars}
+
+
+# ---------------------------
+# Response normalization
+# ---------------------------
+def _field(obj, name, default=None):
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def normalize_response_text(resp) -> str:
+    """Text of a non-streamed completion, whatever shape it came back in.
+
+    Handles SDK objects and plain dicts for both APIs: Responses results
+    (``output_text`` or ``output[].content[]`` parts of type
+    ``output_text``/``text``, concatenated as the SDK's ``output_text`` does)
+    and chat completions (``choices[0].message``, or ``choices[0].text``).
+    """
+    if resp is None:
+        return ""
+    if isinstance(resp, str):
+        return resp
+    text = _field(resp, "output_text")
+    if isinstance(text, str) and text:
+        return text
+    outputs = _field(resp, "output")
+    if isinstance(outputs, list):
+        parts = []
+        for item in outputs:
+            for part in _field(item, "content") or []:
+                if _field(part, "type") in ("output_text", "text"):
+                    parts.append(_field(part, "text") or "")
+        return "".join(parts).strip()
+    choices = _field(resp, "choices")
+    if isinstance(choices, list) and choices:
+        message = _field(choices[0], "message")
+        content = _field(message, "content") if message is not None else _field(choices[0], "text")
+        return content or ""
+    return str(resp)
+
+
+# ---------------------------
+# Backends
+# ---------------------------
+class ResponsesBackend:
+    name = "responses"
+
+    def complete(self, client, prompt):
+        resp = client.responses.create(model=MODEL, input=prompt, max_output_tokens=MAX_OUTPUT_TOKENS,
+                                       temperature=TEMPERATURE)
+        return normalize_response_text(resp)
+
+    def stream(self, client, prompt):
+        events = client.responses.create(model=MODEL, input=prompt, max_output_tokens=MAX_OUTPUT_TOKENS,
+                                         temperature=TEMPERATURE, stream=True)
+        for event in events:
+            etype = _field(event, "type")
+            if etype == "response.output_text.delta":
+                yield _field(event, "delta")
+            elif etype in ("response.failed", "error"):
+                raise RuntimeError(f"Responses stream failed: {event}")
+
+
+class ChatBackend:
+    name = "chat"
+
+    def _messages(self, prompt):
+        return [{"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}]
+
+    def complete(self, client, prompt):
+        resp = client.chat.completions.create(model=MODEL, messages=self._messages(prompt),
+                                              max_tokens=MAX_OUTPUT_TOKENS, temperature=TEMPERATURE)
+        return normalize_response_text(resp)
+
+    def stream(self, client, prompt):
+        chunks = client.chat.completions.create(model=MODEL, messages=self._messages(prompt),
+                                                max_tokens=MAX_OUTPUT_TOKENS, temperature=TEMPERATURE,
+                                                stream=True)
+        for chunk in chunks:
+            choices = _field(chunk, "choices")
+            if choices:
+                delta = _field(choices[0], "delta")
+                content = _field(delta, "content") if delta is not None else None
+                if content:
+                    yield content
+
+
+def is_capability_error(exc: Exception) -> bool:
+    """True when the error means "this API is not available here" rather than a transient failure."""
+    if isinstance(exc, (AttributeError, NotImplementedError, TypeError)):
+        return True
+    return getattr(exc, "status_code", None) in (404, 405, 501)
+
+
+# ---------------------------
+# Stats
+# ---------------------------
+class BackendStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.capability_errors = 0
+        self.latency = Histogram()
+        self.ttft = Histogram()
+
+    def snapshot(self) -> dict:
+        return {"calls": self.calls, "errors": self.errors, "capability_errors": self.capability_errors,
+                "latency": self.latency.snapshot(), "ttft": self.ttft.snapshot()}
+
+
+# ---------------------------
+# Router
+# ---------------------------
+def client_key(client):
+    """Identity of the endpoint a client talks to.
+
+    Streamlit may build a new client object per rerun, so capability is
+    remembered per endpoint (class + base URL) rather than per object.
+    """
+    return (type(client).__name__, str(getattr(client, "base_url", "")) or id(client))
+
+
+class _CallbackError(Exception):
+    """Carries an exception raised by ``on_text`` past the backend error handling."""
+
+    def __init__(self, error: BaseException):
+        super().__init__(error)
+        self.error = error
+
+
+class BackendRouter:
+    """Sends each turn to the backend known to work for that client.
+
+    The first backend is preferred; after it fails with a capability error
+    the client is pinned to the next one until ``cooldown`` seconds pass.
+    Other errors fall back for that call but do not re-pin, except rate
+    limits and server errors, which are raised for the scheduler to retry
+    (the other API shares the same limits).
+    """
+
+    def __init__(self, backends=None, cooldown: float = REPROBE_COOLDOWN):
+        self.backends = list(backends or (ResponsesBackend(), ChatBackend()))
+        self.cooldown = cooldown
+        self.stats = {b.name: BackendStats() for b in self.backends}
+        self._pinned = {}  # client_key(client) -> (backend index, pinned_at)
+        self._lock = threading.Lock()
+
+    def _order(self, client):
+        key = client_key(client)
+        with self._lock:
+            pinned = self._pinned.get(key)
+            if pinned and time.monotonic() - pinned[1] >= self.cooldown:
+                del self._pinned[key]
+                pinned = None
+        start = pinned[0] if pinned else 0
+        return self.backends[start:]
+
+    def _pin(self, client, backend):
+        idx = self.backends.index(backend)
+        key = client_key(client)
+        with self._lock:
+            if idx == 0:
+                self._pinned.pop(key, None)
+            elif key not in self._pinned:
+                self._pinned[key] = (idx, time.monotonic())
+
+    def preferred(self, client) -> str:
+        return self._order(client)[0].name
+
+    def generate(self, client, prompt: str, stream: bool = False, on_text=None):
+        """Run one DM completion; returns ``(text, TurnTiming)``.
+
+        When streaming, a fallback backend is only used if the previous one
+        failed before producing any text, so a half-rendered story is never
+        replaced by a different one.
+        """
+        timing = TurnTiming(streamed=stream)
+        started = time.perf_counter()
+        order = self._order(client)
+        capability_failed = False
+        for i, backend in enumerate(order):
+            stats = self.stats[backend.name]
+            timing.api = backend.name
+            call_started = time.perf_counter()
+            with self._lock:
+                stats.calls += 1
+            try:
+                if stream:
+                    text = self._consume(backend.stream(client, prompt), timing, started, on_text)
+                else:
+                    text = backend.complete(client, prompt)
+            except _CallbackError as e:
+                # the caller's own exception (e.g. PrefetchCancelled), not a backend failure
+                raise e.error
+            except Exception as e:
+                capability = is_capability_error(e)
+                with self._lock:
+                    stats.errors += 1
+                    stats.capability_errors += int(capability)
+                capability_failed = capability_failed or capability
+                if i == len(order) - 1 or timing.ttft is not None or is_retryable(e):
+                    raise
+                continue
+            elapsed = time.perf_counter() - call_started
+            with self._lock:
+                stats.latency.observe(elapsed)
+                if timing.ttft is not None:
+                    stats.ttft.observe(timing.ttft)
+            if capability_failed or i == 0:
+                self._pin(client, backend)
+            timing.total = time.perf_counter() - started
+            timing.chars = len(text or "")
+            return text, timing
+
+    @staticmethod
+    def _consume(deltas, timing, started, on_text):
+        text = ""
+        for delta in deltas:
+            if not delta:
+                continue
+            if timing.ttft is None:
+                timing.ttft = time.perf_counter() - started
+            text += delta
+            if on_text:
+                try:
+                    on_text(text)
+                except Exception as e:
+                    raise _CallbackError(e) from e
+        return text
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: s.snapshot() for name, s in self.stats.items()}
+
+
+# One router per process, shared by every session.
+ROUTER = BackendRouter()
+
+
+def generate_dm_text(client, prompt: str, stream: bool = False, on_text=None, cacheable: bool = False,
+                     session_id: str = "", background: bool = False):
+    """Run one DM completion through the process-wide router; returns ``(text, TurnTiming)``.
+
+    ``cacheable`` opts the call into the response cache (see response_cache.py);
+    record and replay modes cache every call.  A cache hit is delivered to
+    ``on_text`` in one piece.  In replay mode a miss raises ``CacheMiss``
+    and ``client`` is never used.  API calls go through ``SCHEDULER``, queued
+    per ``session_id``; ``background`` marks speculative calls.
+    """
+    key = None
+    if RESPONSE_CACHE.enabled_for(cacheable):
+        key = cache_key(prompt, model=MODEL, max_tokens=MAX_OUTPUT_TOKENS, temperature=TEMPERATURE,
+                        system=SYSTEM_PROMPT)
+        started = time.perf_counter()
+        text = RESPONSE_CACHE.get(key)
+        if text is not None:
+            if on_text:
+                on_text(text)
+            return text, TurnTiming(api="cache", streamed=stream, total=time.perf_counter() - started,
+                                    chars=len(text))
+        if RESPONSE_CACHE.replay_only:
+            raise CacheMiss(f"No recorded response for prompt {key[:12]}")
+    painted = [False]
+    def paint(partial):
+        painted[0] = True
+        if on_text:
+            on_text(partial)
+    # a reply that has started painting is not retried, so it is never replaced by a different one
+    text, timing = SCHEDULER.run(lambda: ROUTER.generate(client, prompt, stream=stream, on_text=paint),
+                                 session_id=session_id, background=background, can_retry=lambda: not painted[0])
+    if key is not None and text:
+        RESPONSE_CACHE.put(key, text)
+    return text, timing
@@ -0,0 +1,214 @@
+# asset_cache.py
+"""Process-wide cache of pre-encoded page assets.
+
+Streamlit re-executes the main script on every interaction, but imported
+modules stay in ``sys.modules``, so the cache below is shared by every
+session and thread in the process.  Entries are keyed by
+``(path, mtime, size, variant)`` and kept in LRU order under a byte budget.
+"""
+import base64
+import os
+import threading
+import time
+from collections import OrderedDict
+
+MIME_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+}
+
+
+def mime_type_for(path: str) -> str:
+    return MIME_TYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
+
+
+def _read_base64(path: str) -> str:
+    # Called outside the cache lock so other sessions are not blocked on disk.
+    try:
+        with open(path, "rb") as f:
+            return base64.b64encode(f.read()).decode()
+    except OSError:
+        return ""
+
+
+class AssetCache:
+    """LRU cache of base64 payloads and the CSS/HTML strings built from them.
+
+    ``revalidate_after`` throttles the ``os.stat`` freshness check, so a warm
+    rerun does no file I/O at all; an edited image is picked up within that
+    many seconds.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, revalidate_after: float = 5.0):
+        self.max_bytes = max_bytes
+        self.revalidate_after = revalidate_after
+        # Optional ``path -> URL or None`` hook (see static_assets.py); when it
+        # returns None the image is inlined as a data URI.
+        self.url_resolver = None
+        self._entries = OrderedDict()  # (path, mtime_ns, size, variant) -> str
+        self._signatures = {}          # path -> (checked_at, (mtime_ns, size) or None)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ---------------------------
+    # Internals
+    # ---------------------------
+    def _signature(self, path: str):
+        now = time.monotonic()
+        cached = self._signatures.get(path)
+        if cached and now - cached[0] < self.revalidate_after:
+            return cached[1]
+        try:
+            st_ = os.stat(path)
+            sig = (st_.st_mtime_ns, st_.st_size)
+        except OSError:
+            sig = None
+        self._signatures[path] = (now, sig)
+        return sig
+
+    def _store(self, key, value: str):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._entries[key] = value
+        self._bytes += size
+        while self._bytes > self.max_bytes and self._entries:
+            _, dropped = self._entries.popitem(last=False)
+            self._bytes -= len(dropped)
+            self.evictions += 1
+
+    def _lookup(self, key):
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    # ---------------------------
+    # Public API
+    # ---------------------------
+    def signature(self, path: str):
+        """``(mtime_ns, size)`` of ``path`` or None, re-checked at most every ``revalidate_after`` s."""
+        if not path:
+            return None
+        with self._lock:
+            return self._signature(path)
+
+    def exists(self, path: str) -> bool:
+        return self.signature(path) is not None
+
+    def base64(self, path: str) -> str:
+        """Base64 text of ``path`` ("" if the file is missing)."""
+        if not path:
+            return ""
+        with self._lock:
+            sig = self._signature(path)
+            if sig is None:
+                return ""
+            key = (path, sig[0], sig[1], "b64")
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            self.misses += 1
+        value = _read_base64(path)
+        if value:
+            with self._lock:
+                self._store(key, value)
+        return value
+
+    def data_uri(self, path: str) -> str:
+        sig = self.signature(path)
+        if sig is None:
+            return ""
+        key = (path, sig[0], sig[1], "data_uri")
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            self.misses += 1
+        b64 = _read_base64(path)
+        value = f"data:{mime_type_for(path)};base64,{b64}" if b64 else ""
+        if value:
+            with self._lock:
+                self._store(key, value)
+        return value
+
+    def url(self, path: str) -> str:
+        """Static URL for ``path`` when a resolver serves it, else its data URI ("" if missing)."""
+        if not self.exists(path):
+            return ""
+        if self.url_resolver is not None:
+            served = self.url_resolver(path)
+            if served:
+                return served
+        return self.data_uri(path)
+
+    def render(self, path: str, variant, build) -> str:
+        """Return ``build(url_of_path)``, cached per file version, URL and ``variant``.
+
+        ``build`` receives "" when the file is missing, so callers can
+        render a fallback; the fallback is cached like any other result.
+        """
+        src = self.url(path)
+        inline = not src or src.startswith("data:")
+        with self._lock:
+            sig = self._signature(path) if path else None
+            key = (path, sig[0] if sig else None, sig[1] if sig else None, variant,
+                   "inline" if inline else src)
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            self.misses += 1
+        value = build(src)
+        with self._lock:
+            self._store(key, value)
+        return value
+
+    def background_css(self, path: str, fade: float = 0.45) -> str:
+        """Ready-made ``<style>`` block for a faded full-page background ("" if missing)."""
+        def build(src):
+            if not src:
+                return ""
+            return f"""
+    <style>
+    [data-testid="stAppViewContainer"], .stApp {{
+      background: linear-gradient(rgba(255,255,240,{fade}), rgba(255,255,240,{fade})),
+                  url("{src}") center/cover no-repeat fixed;
+    }}
+    </style>
+    """
+        return self.render(path, ("background_css", fade), build)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._signatures.clear()
+            self._bytes = 0
+
+
+# One instance per process; size the budget with AIDM_ASSET_CACHE_MB.
+ASSET_CACHE = AssetCache(max_bytes=int(float(os.getenv("AIDM_ASSET_CACHE_MB", "64")) * 1024 * 1024))
@@ -0,0 +1,196 @@
+# autosave.py
+"""Write-behind saving: checkpoints are queued and written by one background thread.
+
+``AutosaveWriter.enqueue`` takes the arguments of ``SaveStore.save`` and
+returns a ticket at once.  A session that checkpoints again before the
+writer got to its previous checkpoint simply replaces it (only the newest
+state is worth writing).  The writer waits
+``AIDM_AUTOSAVE_LINGER_MS`` for more work to arrive, then writes up to
+``AIDM_AUTOSAVE_BATCH`` checkpoints in one transaction (``save_many``).
+If a batch fails, its checkpoints are retried one by one so a single bad
+one cannot sink the rest.  Everything still pending is written when the
+process exits.
+
+Sessions pick up the result (campaign key and entry count) with
+``take_result(ticket)`` on a later rerun (see GameSession.sync_saves).  A
+checkpoint queued before the previous one's result was taken continues
+from that result, so it neither forks the campaign nor clobbers another
+session that loaded the same save.  Queue depth, write latency and lag are kept
+in ``metrics.METRICS`` and in ``stats()``.
+"""
+import atexit
+import os
+import threading
+import time
+import uuid
+
+from metrics import METRICS
+from save_store import SAVE_STORE
+
+# Checkpoint every N turns (DM replies or offline choices); 0 disables autosave
+AUTOSAVE_EVERY = int(os.getenv("AIDM_AUTOSAVE_EVERY", "0"))
+AUTOSAVE_BATCH = int(os.getenv("AIDM_AUTOSAVE_BATCH", "64"))
+AUTOSAVE_LINGER = float(os.getenv("AIDM_AUTOSAVE_LINGER_MS", "20")) / 1000
+
+
+class AutosaveWriter:
+    def __init__(self, store=SAVE_STORE, batch: int = AUTOSAVE_BATCH, linger: float = AUTOSAVE_LINGER,
+                 keep_results: int = 10000, log=print):
+        self.store = store
+        self.batch = max(1, batch)
+        self.linger = linger
+        self.keep_results = keep_results
+        self.log = log
+        self._pending = {}            # ticket -> (enqueued at, ticket it follows, save kwargs), oldest first
+        self._results = {}            # ticket -> save() result, until the session takes it
+        self._cond = threading.Condition()
+        self._thread = None
+        self._writing = 0
+        self._closed = False
+        self.queued = 0
+        self.coalesced = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+
+    def enqueue(self, after: str = None, **save_args) -> str:
+        """Queue a save (``SaveStore.save`` arguments as keywords) and return its ticket.
+
+        ``after`` is the session's previous ticket whose result it has not
+        taken yet: if that save is still queued it is replaced, otherwise
+        this one continues from its result.
+        """
+        ticket = uuid.uuid4().hex
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("autosave writer is closed")
+            self._start()
+            enqueued = time.perf_counter()
+            if after in self._pending:
+                enqueued, after, _ = self._pending.pop(after)  # keeps its age and its predecessor
+                self.coalesced += 1
+                METRICS.inc("autosaves_coalesced")
+            self._pending[ticket] = (enqueued, after, save_args)
+            self.queued += 1
+            METRICS.inc("autosaves_queued")
+            METRICS.set_gauge("autosave_queue_depth", len(self._pending))
+            self._cond.notify()
+        return ticket
+
+    def take_result(self, ticket: str):
+        """``{"id", "campaign_key", "entry_count"}`` once the save is written (then forgotten), else None."""
+        with self._cond:
+            return self._results.pop(ticket, None)
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until everything queued so far is written; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._writing:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """Write what is pending and stop the writer thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"depth": len(self._pending), "writing": self._writing, "queued": self.queued,
+                    "coalesced": self.coalesced, "written": self.written, "batches": self.batches,
+                    "errors": self.errors, "write": METRICS.histogram("autosave_write").snapshot(),
+                    "lag": METRICS.histogram("autosave_lag").snapshot()}
+
+    # ---------------------------
+    # Writer thread
+    # ---------------------------
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="aidm-autosave", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return  # closed and drained
+                if self.linger and not self._closed and len(self._pending) < self.batch:
+                    self._cond.wait(self.linger)  # let a burst of checkpoints share one commit
+                tickets = list(self._pending)[:self.batch]
+                batch = [self._pending.pop(t) for t in tickets]
+                self._writing = len(batch)
+                METRICS.set_gauge("autosave_queue_depth", len(self._pending))
+                saves = [self._chain(after, args) for _, after, args in batch]
+            results = [None] * len(saves)
+            try:
+                results = self._write(saves)
+            finally:
+                done = time.perf_counter()
+                with self._cond:
+                    for ticket, (enqueued, _, _), result in zip(tickets, batch, results):
+                        if result is not None:
+                            self._results[ticket] = result
+                            METRICS.observe("autosave_lag", done - enqueued)
+                    while len(self._results) > self.keep_results:  # sessions that never came back
+                        del self._results[next(iter(self._results))]
+                    self._writing = 0
+                    self._cond.notify_all()
+
+    def _chain(self, after: str, args: dict) -> dict:
+        """Continue from the session's previous save, whose result it had not seen when it queued this one.
+
+        The previous save was written in an earlier batch (a still-queued one
+        is replaced instead).  If it failed, this save is written as queued.
+        """
+        last = self._results.pop(after, None) if after else None
+        if last is not None:
+            args = dict(args, campaign_key=last["campaign_key"], expected_count=last["entry_count"])
+        return args
+
+    def _write(self, saves: list) -> list:
+        try:
+            with METRICS.span("autosave_write"):
+                results = self.store.save_many(saves)
+            self._count(len(results))
+            return results
+        except Exception as e:
+            if len(saves) == 1:
+                self._failed(saves[0], e)
+                return [None]
+        results = []
+        for save in saves:
+            try:
+                with METRICS.span("autosave_write"):
+                    results += self.store.save_many([save])
+                self._count(1)
+            except Exception as e:
+                self._failed(save, e)
+                results.append(None)
+        return results
+
+    def _count(self, n: int):
+        with self._cond:
+            self.written += n
+            self.batches += 1
+        METRICS.inc("saves", n)
+
+    def _failed(self, save: dict, e: Exception):
+        with self._cond:
+            self.errors += 1
+        METRICS.inc("autosave_errors")
+        self.log(f"Autosave of campaign {save['campaign_key']} failed: {e}")
+
+
+# One writer per process, started on the first checkpoint.
+AUTOSAVE = AutosaveWriter()
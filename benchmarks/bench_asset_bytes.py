@@ -0,0 +1,71 @@
+# bench_asset_bytes.py
+"""Compare bytes sent to the browser per turn with inline vs static backgrounds.
+
+Runs the app headlessly (streamlit.testing AppTest) once per asset mode in a
+fresh subprocess, plays a few offline turns and sums the size of every
+markdown payload emitted per rerun -- the part of the websocket delta that
+carries the background CSS.
+
+    python benchmarks/bench_asset_bytes.py --workdir /path/with/templates --turns 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "Final_AIDUNGEONMASTER_Project.py")
+
+
+def measure(turns: int) -> dict:
+    sys.path.insert(0, ROOT)
+    from streamlit.testing.v1 import AppTest
+
+    def payload_bytes(at):
+        return sum(len(m.value.encode()) for m in at.markdown)
+
+    at = AppTest.from_file(APP, default_timeout=120)
+    at.run()
+    at.text_input(key="ui_name").input("Bench").run()
+    next(b for b in at.button if b.label == "Start Offline").click().run()
+    per_turn = []
+    for _ in range(turns):
+        choice = next((b for b in at.button if b.key and b.key.startswith("off_choice_")), None)
+        if choice is None:
+            break
+        choice.click().run()
+        per_turn.append(payload_bytes(at))
+    return {"mode": os.getenv("AIDM_ASSET_MODE", "inline"), "turns": len(per_turn),
+            "bytes_per_turn": per_turn,
+            "avg_bytes_per_turn": sum(per_turn) / len(per_turn) if per_turn else 0}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--workdir", default=os.getcwd(), help="directory containing templates/ and static/")
+    ap.add_argument("--turns", type=int, default=3)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.turns)))
+        return
+
+    if not os.path.isdir(os.path.join(args.workdir, "templates")):
+        print(f"warning: no templates/ under {args.workdir}; backgrounds will be empty in both modes")
+    results = []
+    for mode in ("inline", "static"):
+        env = dict(os.environ, AIDM_ASSET_MODE=mode, AIDM_SKIP_INTRO="1",
+                   OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "bench"))
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", "--turns", str(args.turns)],
+                             cwd=args.workdir, env=env, capture_output=True, text=True, check=True)
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    for r in results:
+        print(f"{r['mode']:>7}: {r['avg_bytes_per_turn'] / 1024:10.1f} KiB/turn over {r['turns']} turns")
+    if results[1]["avg_bytes_per_turn"]:
+        print(f"ratio inline/static: {results[0]['avg_bytes_per_turn'] / results[1]['avg_bytes_per_turn']:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# bench_dm_parser.py
+"""Micro-benchmark for dm_parser against the original parser.
+
+Both parsers are timed on short, normal and very long replies (best of
+``--rounds`` runs).  That they agree is checked by tests/test_dm_parser.py,
+which also holds the original ``parse_ai_output`` timed here.
+
+    python benchmarks/bench_dm_parser.py --rounds 15
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import dm_parser  # noqa: E402
+from dm_parser import parse_ai_output  # noqa: E402
+from tests.test_dm_parser import CORPUS, STORY, legacy_parse_ai_output  # noqa: E402
+
+
+def timeit(fns, texts, repeat: int, rounds: int):
+    """Fastest time per call of each function; rounds alternate between them so drift hits all alike."""
+    best = [float("inf")] * len(fns)
+    for _ in range(rounds):
+        for i, fn in enumerate(fns):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                for t in texts:
+                    fn(t)
+            best[i] = min(best[i], time.perf_counter() - started)
+    return [b / (repeat * len(texts)) for b in best]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--repeat", type=int, default=200)
+    ap.add_argument("--rounds", type=int, default=9, help="timing runs per sample; the fastest is reported")
+    args = ap.parse_args()
+    reply = "\n\n".join([STORY * 3] * 3)  # a typical ~400-token reply
+    samples = {
+        "short header": [CORPUS[3]],
+        "short bullets": [CORPUS[7]],
+        "header": [reply + "\n\nChoices:\n1. Ask the figure\n2. Follow the road\n3. Slip into the forest"],
+        "bullets": [reply + "\n\n1. Ask the figure\n2. Follow the road\n3. Slip into the forest"],
+        "tail": [reply + "\n\nAsk the figure?\nFollow the road?\nSlip into the forest?"],
+        # either side of dm_parser.SHORT_REPLY, where the line loop hands over to the pattern scan
+        "2k bullets": [(STORY + "\n") * (dm_parser.SHORT_REPLY // len(STORY) - 1) + "\n- Ask\n- Follow\n- Hide"],
+        "2k+ bullets": [(STORY + "\n") * (dm_parser.SHORT_REPLY // len(STORY) + 1) + "\n- Ask\n- Follow\n- Hide"],
+        "2k+ header": [(STORY + "\n") * (dm_parser.SHORT_REPLY // len(STORY) + 1) + "\nChoices:\n1. Ask\n2. Hide"],
+        "long header": [(STORY + "\n") * 500 + "\nChoices:\n1. Ask\n2. Follow\n3. Hide"],
+        "long bullets": [(STORY + "\n") * 500 + "\n- Ask\n- Follow\n- Hide"],
+        "long tail": [(STORY + "\n") * 500 + "Left?\nRight?\nWait?"],
+    }
+    for label, texts in samples.items():
+        repeat = args.repeat if not label.startswith("long") else max(1, args.repeat // 20)
+        old, new = timeit((legacy_parse_ai_output, parse_ai_output), texts, repeat, args.rounds)
+        print(f"{label:>13}: legacy {old * 1e6:9.1f} us, single-pass {new * 1e6:9.1f} us ({old / new:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
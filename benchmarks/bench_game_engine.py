@@ -0,0 +1,121 @@
+# bench_game_engine.py
+"""Load test of the headless game engine: simulated sessions, no browser and no network.
+
+Each session starts an online game, plays ``--turns`` DM turns by picking a
+random offered choice (saving every ``--save-every`` turns and at the end),
+then plays one offline adventure to its end.  The DM is scripted: it answers
+instantly, or after ``--dm-latency`` seconds, so the figures are the
+engine's own cost (prompt building, parsing, scene scoring, state updates,
+SQLite saves) rather than the model's.  Saves go to a throwaway database;
+with ``--async-saves`` they are queued to an autosave.AutosaveWriter instead
+of written inline, and the writer's batching and lag are reported.
+
+    python benchmarks/bench_game_engine.py --sessions 2000 --turns 5 --threads 8
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ai_backend import TurnTiming  # noqa: E402
+from autosave import AutosaveWriter  # noqa: E402
+from game_engine import OFFLINE_MODE, ONLINE_MODE, GameSession, GameState  # noqa: E402
+from save_store import SaveStore  # noqa: E402
+
+REPLY = ("The fog parts as you step onto the old stone road. Lanterns sway from crooked posts, and somewhere "
+         "beyond the trees a bell tolls once, then falls silent.\n\n") * 3 + (
+         "Choices:\n1. Ask the figure who sent them\n2. Follow the road toward the bell\n3. Slip into the forest")
+
+
+def scripted_dm(latency: float):
+    def generate(prompt, stream=False, on_text=None, cacheable=False, session_id="", background=False):
+        if latency:
+            time.sleep(latency)
+        if on_text:
+            on_text(REPLY)
+        return REPLY, TurnTiming(api="scripted", streamed=stream, total=latency, chars=len(REPLY))
+    return generate
+
+
+def run_session(engine, rng, turns: int, save_every: int, turn_times: list, save):
+    state = engine.new_game(GameState(), ONLINE_MODE, player_name=f"bench-{rng.random():.6f}")
+    saves = 0
+    for t in range(turns + 1):  # the opening turn, then one per choice
+        last = state.last_dm()
+        started = time.perf_counter()
+        state = engine.play(state, choice_label=rng.choice(last.choices) if last else None)
+        turn_times.append(time.perf_counter() - started)
+        if save_every and t and t % save_every == 0:
+            state = save(state)
+            saves += 1
+    state = save(state)
+    state = engine.new_game(state, OFFLINE_MODE)
+    story = engine.offline_story(state)
+    while story.segment(state.offline_segment) is not None:
+        state = engine.choose_offline(state, rng.randrange(len(story.segment(state.offline_segment).choices)))
+    return saves + 1
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sessions", type=int, default=2000)
+    ap.add_argument("--turns", type=int, default=5, help="DM turns after the opening one")
+    ap.add_argument("--save-every", type=int, default=2)
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--dm-latency", type=float, default=0.0, help="seconds the scripted DM takes per reply")
+    ap.add_argument("--async-saves", action="store_true", help="queue saves to the background writer")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        store = SaveStore(path=os.path.join(folder, "bench.db"))
+        writer = AutosaveWriter(store)
+        engine = GameSession(generate=scripted_dm(args.dm_latency), store=store, prefetch=False, writer=writer,
+                             autosave_every=0, log=lambda message: None)
+        save = engine.save_async if args.async_saves else engine.save
+        engine.offline_story(GameState())  # load the story library before timing
+        turn_times, saves, lock = [], [0], threading.Lock()
+        remaining = iter(range(args.sessions))
+
+        def worker(seed):
+            rng, times, done = random.Random(seed), [], 0
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        break
+                done += run_session(engine, rng, args.turns, args.save_every, times, save)
+            with lock:
+                turn_times.extend(times)
+                saves[0] += done
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        writer.flush()
+        flushed = time.perf_counter() - started
+
+    cuts = statistics.quantiles(turn_times, n=100)
+    print(f"{args.sessions} sessions x {args.turns + 1} DM turns on {args.threads} threads in {elapsed:.2f}s")
+    print(f"  {args.sessions / elapsed:8.0f} sessions/s, {len(turn_times) / elapsed:8.0f} DM turns/s, "
+          f"{saves[0] / elapsed:6.0f} saves/s")
+    print(f"  DM turn in the engine: p50 {cuts[49] * 1e3:.2f} ms, p95 {cuts[94] * 1e3:.2f} ms, "
+          f"p99 {cuts[98] * 1e3:.2f} ms")
+    if args.async_saves:
+        stats = writer.stats()
+        print(f"  writer: {stats['queued']} queued, {stats['coalesced']} coalesced, {stats['written']} written in "
+              f"{stats['batches']} batches, drained {flushed - elapsed:.2f}s after the last turn; "
+              f"lag p50 {stats['lag']['p50'] * 1e3:.1f} ms, p99 {stats['lag']['p99'] * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# bench_history_codec.py
+"""Compression ratio and encode/decode time of stored histories.
+
+Builds synthetic 100-turn transcripts from shuffled DM phrases, stored as
+Turn JSON records like the app does (``--legacy`` for old "DM: ..." strings),
+and compares the whole-history JSON text against history_codec's per-entry
+encodings: zlib without a dictionary, zlib with each shipped dictionary, and
+zstd with the default one when ``zstandard`` is installed.
+
+    python benchmarks/bench_history_codec.py --turns 100 --transcripts 20
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import history_codec  # noqa: E402
+from history_codec import decode_entry, encode_entry  # noqa: E402
+from turns import Turn  # noqa: E402
+
+OPENINGS = ["The torches gutter as", "A cold wind sweeps through", "Somewhere below,", "Without warning,",
+            "As the dust settles,", "Beyond the ridge,", "In the flickering lamplight,", "Far above you,"]
+MIDDLES = ["chains rattle and a voice calls your name", "the forest falls silent around you",
+           "a hooded stranger watches from the shadows", "the ground trembles beneath your feet",
+           "the smell of smoke and old parchment fills the air", "a bell tolls once from the drowned chapel",
+           "the lighthouse beam sweeps across black water", "your torch reveals ancient carvings on the wall"]
+ENDINGS = ["The path ahead forks into darkness.", "You sense you are not alone.",
+           "Whatever waits below has noticed you.", "The choice, as always, is yours."]
+ACTIONS = ["Descend the stairs", "Follow the voice", "Light another torch", "Draw your sword",
+           "Call out to the stranger", "Search the room", "Retreat to the village", "Study the carvings"]
+
+
+def transcript(rng, turns):
+    history = []
+    for _ in range(turns):
+        paras = []
+        for _ in range(rng.randint(2, 4)):
+            paras.append(" ".join(f"{rng.choice(OPENINGS)} {rng.choice(MIDDLES)}. {rng.choice(ENDINGS)}"
+                                  for _ in range(rng.randint(2, 4))))
+        choices = rng.sample(ACTIONS, 3)
+        history.append("DM: " + "\n\n".join(paras) + "\n\nChoices:\n" +
+                       "\n".join(f"{i + 1}. {c}" for i, c in enumerate(choices)))
+        history.append("PLAYER: " + rng.choice(choices))
+    return history
+
+
+def zlib_no_dict(text):
+    return zlib.compress(text.encode(), 9)
+
+
+def encode_entry_with(zdict, text):
+    history_codec.register_dictionary(zdict, activate=True)
+    try:
+        return encode_entry(text, "zlib")
+    finally:
+        history_codec.register_dictionary(history_codec.BUILTIN_DICTIONARY, activate=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--turns", type=int, default=100)
+    ap.add_argument("--transcripts", type=int, default=20)
+    ap.add_argument("--legacy", action="store_true", help='entries as "DM: ..." strings instead of Turn JSON')
+    args = ap.parse_args()
+    rng = random.Random(7)
+    histories = [transcript(rng, args.turns) for _ in range(args.transcripts)]
+    if not args.legacy:
+        histories = [[Turn.load(e).dumps() for e in h] for h in histories]
+    plain_bytes = sum(len(json.dumps(h).encode()) for h in histories)
+    print(f"{args.transcripts} transcripts x {args.turns} turns, whole-history JSON: {plain_bytes / 1024:.0f} KiB")
+
+    variants = [("zlib, no dictionary", lambda t: zlib_no_dict(t), lambda b: zlib.decompress(b).decode())]
+    for name, did in history_codec.BUILTIN_DICTIONARIES:
+        zdict = history_codec._dictionaries[bytes.fromhex(did)]
+        variants.append((f"zlib + {name.split('.')[0]}",
+                         lambda t, zdict=zdict: encode_entry_with(zdict, t), decode_entry))
+    if history_codec.zstandard is not None:
+        variants.append(("zstd + dictionary", lambda t: encode_entry(t, "zstd"), decode_entry))
+    else:
+        print("(zstandard not installed; skipping zstd)")
+    entries = [e for h in histories for e in h]
+    for name, enc, dec in variants:
+        started = time.perf_counter()
+        encoded = [enc(e) for e in entries]
+        enc_s = time.perf_counter() - started
+        started = time.perf_counter()
+        decoded = [dec(b) for b in encoded]
+        dec_s = time.perf_counter() - started
+        assert decoded == entries
+        size = sum(len(b) if isinstance(b, bytes) else len(b.encode()) for b in encoded)
+        print(f"{name:>20}: {size / 1024:7.0f} KiB  ratio {plain_bytes / size:5.2f}x  "
+              f"encode {enc_s / len(entries) * 1e6:6.1f} us/entry  decode {dec_s / len(entries) * 1e6:6.1f} us/entry")
+
+
+if __name__ == "__main__":
+    main()
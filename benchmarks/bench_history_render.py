@@ -0,0 +1,86 @@
+# bench_history_render.py
+"""Per-rerun render time and HTML payload of the online log vs history length.
+
+"legacy" is the old loop over string entries: it scans the history to find
+the latest DM block and then builds a fresh HTML string for every entry on
+every rerun.  "cached" is history_render as the app uses it, on turns.Turn
+records.  Each rerun appends one turn first, as in play, so the cached path
+has warm fragments for everything but the new turn.
+
+    python benchmarks/bench_history_render.py --turns 10 100 1000
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from history_render import (PAGE_SIZE, block_html, dm_block_html, entry_html, last_dm_index,  # noqa: E402
+                            older_page, split_history)
+from turns import Turn  # noqa: E402
+
+DM_TEXT = ("DM: The fog parts as you step onto the old stone road. Lanterns sway from crooked posts, and "
+           "somewhere beyond the trees a bell tolls once, then falls silent.\n\nChoices:\n1. Ask the figure who "
+           "sent them\n2. Follow the road toward the bell\n3. Slip into the forest")
+
+
+def make_turn(i):
+    return [f"PLAYER: Choice number {i}", f"{DM_TEXT} (turn {i})"]
+
+
+def legacy_render(history):
+    out = []
+    last = None
+    for i, entry in enumerate(history):
+        if entry.startswith("DM:"):
+            last = i
+    for idx, entry in enumerate(history):
+        if entry.startswith("DM:"):
+            out.append(dm_block_html(entry[3:], is_new=(idx == last)))
+        else:
+            out.append(f"<div style='margin:8px 0; color:#2f2f2f;'><b>Player:</b> {entry.replace('PLAYER: ','')}</div>")
+    return out
+
+
+def cached_render(history):
+    newest = last_dm_index(history)
+    older, recent = split_history(history)
+    out = []
+    if older:
+        out.append(block_html(tuple(older_page(older, 1))))
+    out += [entry_html(e, is_new=(i == newest)) for i, e in enumerate(recent, start=len(older))]
+    return out
+
+
+def bench(render, turns: int, reruns: int, typed: bool):
+    convert = (lambda entries: [Turn.from_legacy(e) for e in entries]) if typed else (lambda entries: entries)
+    history = []
+    for i in range(turns):
+        history += convert(make_turn(i))
+    render(history)  # warm up
+    elapsed, payload = 0.0, 0
+    for r in range(reruns):
+        history = history + convert(make_turn(turns + r))
+        started = time.perf_counter()
+        out = render(history)
+        elapsed += time.perf_counter() - started
+        payload += sum(len(s) for s in out)
+    return elapsed / reruns, payload / reruns
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--turns", type=int, nargs="+", default=[10, 100, 1000])
+    ap.add_argument("--reruns", type=int, default=50)
+    args = ap.parse_args()
+    print(f"page size {PAGE_SIZE} older entries")
+    for turns in args.turns:
+        for label, render in (("legacy", legacy_render), ("cached", cached_render)):
+            per_rerun, payload = bench(render, turns, args.reruns, typed=render is cached_render)
+            print(f"{turns:>5} turns {label:>6}: {per_rerun * 1e6:9.1f} us/rerun, {payload / 1024:8.1f} KiB HTML/rerun")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# bench_prefetch.py
+"""Click-to-reply latency with and without speculative prefetch.
+
+Plays DM turns against the local fake OpenAI server.  After each turn the
+"player" reads for ``--think`` seconds and then picks a random choice; with
+prefetch on, the replies for all choices are generated during that time.
+Also reports how many completions were spent per turn.
+
+    python benchmarks/bench_prefetch.py --turns 10 --think 1.0
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from openai import OpenAI  # noqa: E402
+
+from ai_backend import generate_dm_text  # noqa: E402
+from fake_openai_server import FakeOpenAIServer  # noqa: E402
+from prefetch import Prefetcher, state_key  # noqa: E402
+
+CHOICES = ["Ask the figure who sent them", "Follow the road toward the bell", "Slip into the forest"]
+
+
+def play(client, turns: int, think: float, prefetcher=None):
+    history, latencies = ["DM: The fog parts as you step onto the old stone road."], []
+    for _ in range(turns):
+        branches = [(c, history + ["PLAYER: " + c]) for c in CHOICES]
+        if prefetcher is not None:
+            prefetcher.prefetch("bench", [
+                (state_key(h, None, c), lambda on_text, h=h: generate_dm_text(client, "\n".join(h), stream=True,
+                                                                                on_text=on_text), None)
+                for c, h in branches])
+        time.sleep(think)
+        choice, history = random.choice(branches)
+        clicked = time.perf_counter()
+        job = prefetcher.take("bench", state_key(history, None, choice)) if prefetcher else None
+        if job is not None:
+            text, _ = job.wait()
+        else:
+            text, _ = generate_dm_text(client, "\n".join(history), stream=True)
+        latencies.append(time.perf_counter() - clicked)
+        history = history + ["DM: " + text]
+    return latencies
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--turns", type=int, default=10)
+    ap.add_argument("--think", type=float, default=1.0, help="seconds the player reads before clicking")
+    ap.add_argument("--chunk-delay", type=float, default=0.02)
+    ap.add_argument("--first-token-delay", type=float, default=0.3)
+    args = ap.parse_args()
+    random.seed(1)
+    with FakeOpenAIServer(chunk_delay=args.chunk_delay, first_token_delay=args.first_token_delay) as server:
+        client = OpenAI(api_key="fake", base_url=server.base_url, max_retries=0)
+        for label, prefetcher in (("no prefetch", None), ("prefetch", Prefetcher(max_per_min=10_000))):
+            before = len(server.requests)
+            latencies = play(client, args.turns, args.think, prefetcher)
+            calls = (len(server.requests) - before) / args.turns
+            print(f"{label:>12}: click-to-reply median {statistics.median(latencies) * 1000:7.0f} ms, "
+                  f"max {max(latencies) * 1000:7.0f} ms, {calls:.1f} completions/turn")
+            if prefetcher is not None:
+                print(f"{'':>12}  {prefetcher.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+# bench_response_shapes.py
+"""Micro-benchmark for ai_backend.normalize_response_text.
+
+Times each recorded completion shape from tests/test_response_shapes.py
+(Responses API and chat/legacy completions, as plain dicts and, when the
+``openai`` package is installed, as SDK objects); that test checks the
+normalized text.
+
+    python benchmarks/bench_response_shapes.py --repeat 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ai_backend import normalize_response_text  # noqa: E402
+from tests.test_response_shapes import cases  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--repeat", type=int, default=20000, help="calls per shape when timing")
+    args = ap.parse_args()
+    for name, resp, _ in cases():
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            normalize_response_text(resp)
+        print(f"  {name:<50} {(time.perf_counter() - started) / args.repeat * 1e6:6.2f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# bench_save_backends.py
+"""Per-operation latency of every save backend under the same multi-threaded workload.
+
+Each thread plays its own campaign: it saves a new turn (an append), lists
+the first page of saves and loads a random campaign, and now and then starts
+a new campaign or deletes one.  Every operation is timed into a
+metrics.Histogram per backend and operation.  Backends:
+
+- ``sqlite``: save_store.SaveStore on a throwaway file.
+- ``fake-redis``: redis_store.RedisSaveStore over benchmarks/fake_redis.py,
+  with ``--rtt-ms`` of simulated network round trip per command.
+- ``redis``: the same store against a real server, only with ``--redis-url``
+  (a scratch database: the run deletes its own keys afterwards).
+
+    python benchmarks/bench_save_backends.py --threads 8 --ops 300 --rtt-ms 0.2
+    python benchmarks/bench_save_backends.py --redis-url redis://localhost:6379/15
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_redis import FakeRedis, WatchError  # noqa: E402
+from metrics import Histogram  # noqa: E402
+from redis_store import RedisSaveStore  # noqa: E402
+from save_store import SaveStore, new_campaign_key  # noqa: E402
+
+OPS = ("save", "append", "list_page", "count", "load", "delete")
+ENTRY = ("DM: The torches gutter as a cold wind sweeps through the hall. Somewhere below, chains rattle "
+         "and a voice calls your name.\nChoices:\n1. Descend\n2. Follow the voice\n3. Wait")
+
+
+def open_backend(name: str, args, tmp: str):
+    if name == "sqlite":
+        return SaveStore(path=os.path.join(tmp, "bench.db"))
+    prefix = f"aidm-bench-{uuid.uuid4().hex[:8]}:"
+    if name == "fake-redis":
+        return RedisSaveStore(FakeRedis(latency=args.rtt_ms / 1000), prefix=prefix, watch_errors=(WatchError,))
+    return RedisSaveStore.from_url(args.redis_url, pool_size=args.threads, prefix=prefix)
+
+
+def preload(store, campaigns: int, history: int):
+    transcript = [ENTRY] * history
+    for start in range(0, campaigns, 100):
+        store.save_many([{"campaign_key": new_campaign_key(), "player_name": f"player{i % 50}", "mode": "online",
+                          "history": transcript, "offline_story_id": None, "offline_segment": 0}
+                         for i in range(start, min(start + 100, campaigns))])
+
+
+def worker(store, seed: int, ops: int, history: int, hists: dict, errors: list):
+    rng = random.Random(seed)
+    player = f"player{seed % 50}"
+
+    def timed(op, fn, *a, **kw):
+        started = time.perf_counter()
+        try:
+            return fn(*a, **kw)
+        except Exception as e:
+            errors.append(f"{op}: {type(e).__name__}: {e}")
+        finally:
+            hists[op].observe(time.perf_counter() - started)
+
+    key, transcript, count = new_campaign_key(), [ENTRY] * history, None
+    result = timed("save", store.save, key, player, "online", transcript, None, 0)
+    ids = [result["id"]] if result else []
+    for _ in range(ops):
+        r = rng.random()
+        if r < 0.4:
+            transcript = transcript + [f"PLAYER: action {len(transcript)}", ENTRY]
+            result = timed("append", store.save, key, player, "online", transcript, None, 0, expected_count=count)
+            if result:
+                key, count = result["campaign_key"], result["entry_count"]
+        elif r < 0.6:
+            timed("list_page", store.list_saves_page, player_name=player if r < 0.5 else None, limit=10)
+        elif r < 0.65:
+            timed("count", store.count_saves)
+        elif r < 0.95 and ids:
+            timed("load", store.load, rng.choice(ids))
+        elif r < 0.98:
+            key, transcript, count = new_campaign_key(), [ENTRY] * history, None
+            result = timed("save", store.save, key, player, "online", transcript, None, 0)
+            if result:
+                ids.append(result["id"])
+        elif len(ids) > 1:
+            timed("delete", store.delete, ids.pop(0))
+
+
+def run(name: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        store = open_backend(name, args, tmp)
+        try:
+            preload(store, args.preload, args.history)
+            hists, errors = {op: Histogram() for op in OPS}, []
+            threads = [threading.Thread(target=worker, args=(store, seed, args.ops, args.history, hists, errors))
+                       for seed in range(args.threads)]
+            started = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            if name == "redis":
+                for key in store.client.scan_iter(match=store.prefix + "*"):
+                    store.client.delete(key)
+            store.close()
+    total = sum(h.count for h in hists.values())
+    return {"backend": name, "ops_per_s": total / elapsed, "errors": len(errors), "first_error": errors[:1],
+            "ops": {op: h.snapshot() for op, h in hists.items() if h.count}}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--backends", default="sqlite,fake-redis", help="comma-separated: sqlite, fake-redis, redis")
+    ap.add_argument("--redis-url", help="also benchmark a real Redis server (a scratch database)")
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--ops", type=int, default=300, help="operations per thread")
+    ap.add_argument("--history", type=int, default=20, help="history entries a campaign starts with")
+    ap.add_argument("--preload", type=int, default=2000, help="campaigns stored before the run")
+    ap.add_argument("--rtt-ms", type=float, default=0.2, help="simulated round trip per fake-redis command")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    if args.redis_url and "redis" not in backends:
+        backends.append("redis")
+    if "redis" in backends and not args.redis_url:
+        ap.error("the redis backend needs --redis-url")
+    results = [run(name, args) for name in backends]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for res in results:
+        print(f"{res['backend']:>10}: {res['ops_per_s']:8.0f} ops/s, {res['errors']} errors {res['first_error'] or ''}")
+        for op, h in res["ops"].items():
+            print(f"{'':>12}{op:<10} n={h['count']:<6} p50 {h['p50'] * 1000:7.2f} ms   p95 {h['p95'] * 1000:7.2f} ms   "
+                  f"max {h['max'] * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# bench_save_growth.py
+"""Save latency and database size against transcript length.
+
+Plays one synthetic campaign of ``--turns`` DM/player turns, saving after
+every turn, once with the old layout (a new ``saves`` row holding the whole
+JSON history on each save) and once with save_store.SaveStore (campaign row
+plus append-only history_entries).
+
+    python benchmarks/bench_save_growth.py --turns 400 --report-every 100
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from save_store import SaveStore  # noqa: E402
+
+DM_TEXT = ("DM: The torches gutter as a cold wind sweeps through the hall. Somewhere below, "
+           "chains rattle and a voice calls your name. The path ahead forks into darkness.\n\n"
+           "Choices:\n1. Descend the stairs\n2. Follow the voice\n3. Light another torch")
+
+
+def legacy_saver(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE saves (id INTEGER PRIMARY KEY AUTOINCREMENT, player_name TEXT, created_at REAL, "
+                 "mode TEXT, history TEXT, offline_story_id TEXT, offline_segment INTEGER)")
+
+    def save(history):
+        conn.execute("INSERT INTO saves (player_name, created_at, mode, history, offline_story_id, offline_segment) "
+                     "VALUES (?,?,?,?,?,?)", ("bench", time.time(), "online", json.dumps(history), None, 0))
+        conn.commit()
+    return save, lambda: None, conn.close
+
+
+def store_saver(path):
+    store = SaveStore(path)
+    state = {"count": None}
+
+    def save(history):
+        result = store.save("bench", "bench", "online", history, None, 0, expected_count=state["count"])
+        state["count"] = result["entry_count"]
+
+    def checkpoint():
+        with store.connection() as conn:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return save, checkpoint, store.close
+
+
+def db_size(path):
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+def run(kind, turns, report_every):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"{kind}.db")
+        save, checkpoint, close = (legacy_saver if kind == "legacy" else store_saver)(path)
+        history, window, rows = [], [], []
+        for turn in range(1, turns + 1):
+            history.append(f"PLAYER: action {turn}")
+            history.append(DM_TEXT)
+            started = time.perf_counter()
+            save(history)
+            window.append(time.perf_counter() - started)
+            if turn % report_every == 0:
+                checkpoint()  # fold the WAL back so file sizes are comparable
+                rows.append((turn, sum(window) / len(window) * 1000, db_size(path) / 1024))
+                window = []
+        close()
+        return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--turns", type=int, default=400)
+    ap.add_argument("--report-every", type=int, default=100)
+    args = ap.parse_args()
+    results = {kind: run(kind, args.turns, args.report_every) for kind in ("legacy", "store")}
+    print(f"{'turns':>6} | {'legacy ms/save':>14} {'legacy KiB':>11} | {'store ms/save':>13} {'store KiB':>10}")
+    for (turn, lms, lkb), (_, sms, skb) in zip(results["legacy"], results["store"]):
+        print(f"{turn:>6} | {lms:14.2f} {lkb:11.0f} | {sms:13.2f} {skb:10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# bench_save_io.py
+"""Export and import throughput of save_io.py, and the memory they need.
+
+Fills a throwaway database with ``--campaigns`` campaigns of ``--entries``
+history entries each (written straight into the tables, which is much
+faster than saving them), exports it to JSON Lines, imports that into a
+second database, and checks the two hold the same rows.  Memory is the
+growth of the process's peak RSS during each step, which should stay flat
+as the database grows.
+
+    python benchmarks/bench_save_io.py --campaigns 20000 --entries 50
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from save_io import import_saves, write_export  # noqa: E402
+from save_store import SaveStore, new_campaign_key  # noqa: E402
+
+ENTRY = ('{"role": "dm", "text": "The torches gutter as a cold wind sweeps through the hall. Somewhere below, '
+         'chains rattle and a voice calls your name.", "choices": ["Descend", "Follow the voice", "Wait"]}')
+
+
+def peak_mb() -> float:
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20
+
+
+def fill(store: SaveStore, campaigns: int, entries: int):
+    now = time.time()
+    for start in range(0, campaigns, 1000):
+        with store.transaction() as conn:
+            for i in range(start, min(start + 1000, campaigns)):
+                cur = conn.execute(
+                    "INSERT INTO campaigns (campaign_key, player_name, created_at, saved_at, mode, entry_count) "
+                    "VALUES (?,?,?,?,?,?)", (new_campaign_key(), f"player{i % 500}", now, now - i, "online", entries))
+                conn.executemany("INSERT INTO history_entries (campaign_id, seq, entry) VALUES (?,?,?)",
+                                 [(cur.lastrowid, seq, ENTRY) for seq in range(entries)])
+
+
+def table_counts(store: SaveStore):
+    with store.connection() as conn:
+        return (conn.execute("SELECT COUNT(*), SUM(entry_count) FROM campaigns").fetchone(),
+                conn.execute("SELECT COUNT(*) FROM history_entries").fetchone()[0])
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--campaigns", type=int, default=20000)
+    ap.add_argument("--entries", type=int, default=50, help="history entries per campaign")
+    ap.add_argument("--batch", type=int, default=1000)
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        source, target = SaveStore(os.path.join(tmp, "source.db")), SaveStore(os.path.join(tmp, "target.db"))
+        started = time.perf_counter()
+        fill(source, args.campaigns, args.entries)
+        rows = args.campaigns * (args.entries + 1)
+        print(f"filled {args.campaigns} campaigns, {rows} rows in {time.perf_counter() - started:.1f}s")
+        out = os.path.join(tmp, "saves.jsonl")
+        for label, step in (
+                ("export", lambda: write_export(source, out, progress_every=0)),
+                ("import", lambda: import_saves(target, open(out, encoding="utf-8"), batch=args.batch,
+                                                progress_every=0))):
+            before, started = peak_mb(), time.perf_counter()
+            counts = step()
+            elapsed = time.perf_counter() - started
+            print(f"{label}: {rows / elapsed:9.0f} rows/s ({elapsed:.1f}s), peak RSS +{peak_mb() - before:.1f} MB, "
+                  f"{counts}")
+        print(f"file {os.path.getsize(out) / 2 ** 20:.0f} MB; source {table_counts(source)}, "
+              f"target {table_counts(target)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# bench_save_store.py
+"""Multi-threaded save/list/load stress test: legacy global cursor vs SaveStore.
+
+"legacy" reproduces the original module-level code: one
+``sqlite3.connect(..., check_same_thread=False)`` and one shared cursor used
+by every thread, default journal mode, no indexes.  "store" is
+save_store.SaveStore (connection per thread, WAL, busy timeout, indexes,
+append-only history).  Each thread plays one campaign that grows by one
+entry per save.
+
+    python benchmarks/bench_save_store.py --threads 8 --ops 200 --history 40
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from save_store import SaveStore  # noqa: E402
+
+
+class LegacyStore:
+    """The original global-connection implementation, verbatim in behaviour."""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.cur = self.conn.cursor()
+        self.cur.execute("""
+        CREATE TABLE IF NOT EXISTS saves (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            player_name TEXT,
+            created_at REAL,
+            mode TEXT,
+            history TEXT,
+            offline_story_id TEXT,
+            offline_segment INTEGER
+        )
+        """)
+        self.conn.commit()
+
+    def save(self, campaign_key, player_name, mode, history, offline_story_id, offline_segment):
+        self.cur.execute("INSERT INTO saves (player_name, created_at, mode, history, offline_story_id, offline_segment) VALUES (?,?,?,?,?,?)",
+                         (player_name, time.time(), mode, json.dumps(history), offline_story_id, offline_segment))
+        self.conn.commit()
+
+    def list_saves(self):
+        self.cur.execute("SELECT id, player_name, created_at FROM saves ORDER BY created_at DESC")
+        return self.cur.fetchall()
+
+    def load(self, save_id):
+        self.cur.execute("SELECT player_name, mode, history, offline_story_id, offline_segment FROM saves WHERE id=?", (save_id,))
+        return self.cur.fetchone()
+
+
+def worker(store, ops, history, seed, errors, counts):
+    rng = random.Random(seed)
+    transcript = [f"DM: turn {i} " + "lorem ipsum " * 30 for i in range(history)]
+    key = f"bench-{seed}"
+    done = 0
+    for _ in range(ops):
+        try:
+            r = rng.random()
+            if r < 0.4:
+                transcript.append(f"PLAYER: action {len(transcript)}")
+                store.save(key, f"player{seed % 50}", "online", transcript, "stillhollow", 0)
+            elif r < 0.7:
+                store.list_saves()
+            else:
+                store.load(rng.randint(1, 100))
+            done += 1
+        except Exception as e:  # legacy store fails under concurrency; count, don't abort
+            errors.append(type(e).__name__)
+    counts.append(done)
+
+
+def run(kind, threads, ops, history, preload):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        store = LegacyStore(path) if kind == "legacy" else SaveStore(path)
+        transcript = ["DM: seed"] * history
+        for i in range(preload):
+            store.save(f"preload-{i}", f"player{i % 50}", "online", transcript, "stillhollow", 0)
+        errors, counts = [], []
+        pool = [threading.Thread(target=worker, args=(store, ops, history, i, errors, counts)) for i in range(threads)]
+        started = time.perf_counter()
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        elapsed = time.perf_counter() - started
+        return sum(counts) / elapsed, len(errors), sorted(set(errors))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--ops", type=int, default=200, help="operations per thread")
+    ap.add_argument("--history", type=int, default=40, help="history entries per save")
+    ap.add_argument("--preload", type=int, default=2000, help="saves in the table before the run")
+    ap.add_argument("--child", choices=("legacy", "store"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        print(json.dumps(run(args.child, args.threads, args.ops, args.history, args.preload)))
+        return
+    # Each variant runs in its own process: sharing one cursor across threads
+    # can crash the interpreter outright, which is part of what we measure.
+    for kind in ("legacy", "store"):
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", kind, "--threads", str(args.threads),
+               "--ops", str(args.ops), "--history", str(args.history), "--preload", str(args.preload)]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"{kind:>6}: crashed (exit code {proc.returncode})")
+            continue
+        rate, nerr, kinds = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{kind:>6}: {rate:8.0f} ops/s, {nerr} errors {kinds if kinds else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# bench_scene_classifier.py
+"""Cost of picking a scene background for one DM reply, vs the number of scenes.
+
+"legacy" is the old chain of substring tests for forest and lighthouse plus
+the ``os.path.exists`` call the online screen made on every rerun.
+"substring" extends that chain to the same table the classifier gets: one
+``in`` test per keyword, summing weights.  "classifier" is
+scene_classifier.SceneClassifier with the built-in scenes plus synthetic
+ones (12 keywords each) up to ``--scenes``.
+
+    python benchmarks/bench_scene_classifier.py --scenes 3 20 60
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scene_classifier import DEFAULT_SCENES, SceneClassifier  # noqa: E402
+
+REPLY = ("The fog parts as you step onto the old stone road. Lanterns sway from crooked posts, and somewhere "
+         "beyond the trees a bell tolls once, then falls silent. ") * 12 + "\n\nChoices:\n1. Ask\n2. Follow\n3. Hide"
+BACKGROUNDS = {"forest": "templates/forest background.jpg", "lighthouse": "templates/lighthouse background.jpg"}
+
+
+def legacy_background(text):
+    t = text.lower()
+    if "forest" in t or "trees" in t or "wood" in t:
+        scene = "forest"
+    elif "lighthouse" in t or "sea" in t or "pier" in t or "coast" in t:
+        scene = "lighthouse"
+    else:
+        scene = "default"
+    path = BACKGROUNDS.get(scene)
+    return path if path and os.path.exists(path) else None
+
+
+def substring_scores(text, scenes):
+    t = text.lower()
+    totals = {}
+    for scene in scenes:
+        for word, weight in scene["keywords"].items():
+            if word in t:
+                totals[scene["name"]] = totals.get(scene["name"], 0) + weight
+    return max(totals, key=totals.get) if totals else "default"
+
+
+def synthetic_scenes(n: int, rng):
+    scenes = list(DEFAULT_SCENES)
+    while len(scenes) < n:
+        words = {"".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 10))): rng.randint(1, 3)
+                 for _ in range(12)}
+        scenes.append({"name": f"scene{len(scenes)}", "background": "unused.jpg", "keywords": words})
+    return scenes
+
+
+def timeit(fn, repeat: int):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(REPLY)
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--scenes", type=int, nargs="+", default=[3, 20, 60])
+    ap.add_argument("--repeat", type=int, default=2000)
+    args = ap.parse_args()
+    rng = random.Random(1)
+    print(f"reply: {len(REPLY)} chars")
+    print(f"legacy, 2 scenes: {timeit(legacy_background, args.repeat) * 1e6:7.1f} us")
+    for n in args.scenes:
+        scenes = synthetic_scenes(n, rng)
+        classifier = SceneClassifier(scenes, exists=lambda path: True)
+        chain = timeit(lambda text: substring_scores(text, scenes), args.repeat)
+        per_call = timeit(lambda text: classifier.background(classifier.classify(text)), args.repeat)
+        print(f"{n:>3} scenes, {len(classifier.weights):>4} keywords: substring {chain * 1e6:7.1f} us, "
+              f"classifier {per_call * 1e6:7.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# bench_scheduler.py
+"""Bursts of concurrent DM turns against a rate-limited fake server.
+
+Each simulated session runs ``--turns`` turns back to back on its own
+thread.  The fake server answers 429 above ``--server-limit`` requests in
+flight and fails ``--fail-rate`` of the rest with ``--fail-status``.
+Compares calling the router directly (what every session used to do) with
+going through the process-wide ``RequestScheduler``.
+
+    python benchmarks/bench_scheduler.py --sessions 16 --turns 3 --server-limit 4 --fail-rate 0.1
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from openai import OpenAI  # noqa: E402
+
+from ai_backend import BackendRouter  # noqa: E402
+from fake_openai_server import FakeOpenAIServer  # noqa: E402
+from scheduler import RequestScheduler  # noqa: E402
+
+
+def burst(server, sessions: int, turns: int, scheduler=None):
+    client = OpenAI(api_key="fake", base_url=server.base_url, max_retries=0)
+    router = BackendRouter()
+    latencies, failures, lock = [], [], threading.Lock()
+
+    def session(sid):
+        for _ in range(turns):
+            started = time.perf_counter()
+            call = lambda: router.generate(client, "History:\nPlayer chooses: look around\n", stream=True)
+            try:
+                if scheduler is not None:
+                    scheduler.run(call, session_id=str(sid))
+                else:
+                    call()
+            except Exception as e:
+                with lock:
+                    failures.append(type(e).__name__)
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, failures, time.perf_counter() - started
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sessions", type=int, default=16)
+    ap.add_argument("--turns", type=int, default=3)
+    ap.add_argument("--server-limit", type=int, default=4, help="server answers 429 above this many in flight")
+    ap.add_argument("--fail-rate", type=float, default=0.1)
+    ap.add_argument("--fail-status", type=int, default=503)
+    ap.add_argument("--max-in-flight", type=int, default=4)
+    args = ap.parse_args()
+    for label, scheduler in (("direct", None),
+                             ("scheduler", RequestScheduler(max_in_flight=args.max_in_flight, base_delay=0.1))):
+        with FakeOpenAIServer(chunk_delay=0.005, first_token_delay=0.05, fail_rate=args.fail_rate,
+                              fail_status=args.fail_status, max_concurrent=args.server_limit) as server:
+            latencies, failures, elapsed = burst(server, args.sessions, args.turns, scheduler)
+        total = args.sessions * args.turns
+        lat = sorted(latencies) or [0.0]
+        print(f"{label:>9}: {len(latencies)}/{total} turns ok in {elapsed:5.2f}s, "
+              f"p50 {statistics.median(lat) * 1000:6.0f} ms, p95 {lat[int(len(lat) * 0.95) - 1] * 1000:6.0f} ms, "
+              f"{server.failures} injected errors, peak {server.peak_in_flight} in flight")
+        if scheduler is not None:
+            print(f"{'':>9}  {scheduler.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# bench_startup.py
+"""Time to first render and per-rerun overhead of the app, optionally vs an older revision.
+
+Each measurement runs in a fresh Python process with an empty HOME (no
+saves, no caches), using Streamlit's AppTest: the first ``run()`` includes
+importing the app's modules and building whatever the script builds on its
+first pass; later runs are plain reruns of the home screen.  ``--rev``
+extracts another git revision of the app (``git archive``) and measures it
+the same way, for a before/after comparison.
+
+    python benchmarks/bench_startup.py --rev HEAD~1 --workdir <dir with templates/>
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = "Final_AIDUNGEONMASTER_Project.py"
+
+MEASURE = r"""
+import json, os, sys, time
+tree, reruns = sys.argv[1], int(sys.argv[2])
+sys.path.insert(0, tree)
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+streamlit_s = time.perf_counter() - started
+at = AppTest.from_file(os.path.join(tree, "Final_AIDUNGEONMASTER_Project.py"), default_timeout=120)
+at.query_params["intro"] = "seen"  # the home screen, as a returning player sees it
+started = time.perf_counter()
+at.run()
+first = time.perf_counter() - started
+times = []
+for _ in range(reruns):
+    started = time.perf_counter()
+    at.run()
+    times.append(time.perf_counter() - started)
+print(json.dumps({"streamlit_s": streamlit_s, "first_s": first, "reruns_s": times,
+                  "errors": [str(e.value) for e in at.exception]}))
+"""
+
+
+def measure(tree: str, workdir: str, reruns: int) -> dict:
+    home = tempfile.mkdtemp(prefix="aidm-startup-")
+    try:
+        env = dict(os.environ, HOME=home, OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "sk-startup-bench"))
+        out = subprocess.run([sys.executable, "-c", MEASURE, tree, str(reruns)], cwd=workdir, env=env,
+                             capture_output=True, text=True, check=True).stdout
+        return json.loads(out.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+
+
+def extract_revision(rev: str, dest: str):
+    archive = subprocess.run(["git", "-C", ROOT, "archive", "--format=tar", rev], capture_output=True, check=True)
+    with tempfile.TemporaryFile() as f:
+        f.write(archive.stdout)
+        f.seek(0)
+        with tarfile.open(fileobj=f) as tar:
+            tar.extractall(dest)
+
+
+def report(label: str, result: dict):
+    reruns = [t * 1000 for t in result["reruns_s"]]
+    print(f"{label:>12}: first render {result['first_s'] * 1000:7.1f} ms "
+          f"(+ {result['streamlit_s'] * 1000:.0f} ms importing streamlit), "
+          f"rerun median {statistics.median(reruns):6.1f} ms, max {max(reruns):6.1f} ms")
+    for error in result["errors"]:
+        print(f"{'':>12}  error: {error}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rev", help="git revision to compare against, e.g. HEAD~1")
+    ap.add_argument("--workdir", default=ROOT, help="working directory (where templates/ lives)")
+    ap.add_argument("--reruns", type=int, default=20)
+    ap.add_argument("--rounds", type=int, default=3, help="fresh processes per tree; the best is reported")
+    args = ap.parse_args()
+    trees = [("current", ROOT)]
+    scratch = None
+    if args.rev:
+        scratch = tempfile.mkdtemp(prefix="aidm-rev-")
+        extract_revision(args.rev, scratch)
+        trees.insert(0, (args.rev, scratch))
+    try:
+        for label, tree in trees:
+            results = [measure(tree, args.workdir, args.reruns) for _ in range(args.rounds)]
+            report(label, min(results, key=lambda r: r["first_s"]))
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# bench_story_engine.py
+"""Load time of a large offline story library and the per-rerun cost of using it.
+
+Writes ``--packs`` synthetic JSON packs of ``--stories`` branching stories
+each to a temporary folder.  Then it times the one-off
+``story_engine.load_library`` (parse, resolve ``next`` ids, validate), and
+compares two per-rerun lookups of the selected story's current segment:
+"legacy" rebuilds ``titles`` and ``title_map`` from the raw dicts, as the
+offline screen used to; "indexed" uses the loaded library.
+
+    python benchmarks/bench_story_engine.py --packs 20 --stories 50 --segments 40
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from story_engine import load_library  # noqa: E402
+
+
+def make_story(rng, story_id: str, segments: int) -> dict:
+    segs = []
+    for pos in range(segments):
+        choices = []
+        for c in range(3):
+            choice = {"label": f"Choice {c} of segment {pos}", "result": "Something happens. " * 4}
+            if pos + 1 < segments and c == 2:
+                choice["next"] = f"seg{rng.randrange(pos + 1, segments)}"  # branch further ahead
+            choices.append(choice)
+        segs.append({"id": f"seg{pos}", "text": "The corridor stretches into darkness. " * 8, "choices": choices})
+    return {"id": story_id, "title": f"Adventure {story_id}", "segments": segs}
+
+
+def legacy_lookup(raw_stories, sel_title, seg_idx):
+    titles = [s["title"] for s in raw_stories]
+    title_map = {s["title"]: s for s in raw_stories}
+    story = title_map[titles[titles.index(sel_title)]]
+    return story["segments"][seg_idx] if seg_idx < len(story["segments"]) else None
+
+
+def indexed_lookup(library, story_id, seg_idx):
+    story = library.get(library.ids[library.position(story_id)])
+    return story.segment(seg_idx)
+
+
+def timeit(fn, repeat: int):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--packs", type=int, default=20)
+    ap.add_argument("--stories", type=int, default=50, help="stories per pack")
+    ap.add_argument("--segments", type=int, default=40, help="segments per story")
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+    rng = random.Random(1)
+    raw_stories = []
+    with tempfile.TemporaryDirectory() as folder:
+        for p in range(args.packs):
+            pack = [make_story(rng, f"p{p}s{s}", args.segments) for s in range(args.stories)]
+            raw_stories += pack
+            with open(os.path.join(folder, f"pack{p:03d}.json"), "w", encoding="utf-8") as f:
+                json.dump({"stories": pack}, f)
+        size = sum(os.path.getsize(os.path.join(folder, n)) for n in os.listdir(folder))
+        started = time.perf_counter()
+        library = load_library(folder)
+        load_s = time.perf_counter() - started
+
+    n_segments = sum(len(s.segments) for s in library.stories)
+    print(f"{len(library)} stories, {n_segments} segments, {size / 1024 / 1024:.1f} MiB of JSON; "
+          f"{len(library.warnings)} warnings")
+    print(f"load + validate once per process: {load_s * 1000:.1f} ms")
+    last = raw_stories[-1]
+    legacy = timeit(lambda: legacy_lookup(raw_stories, last["title"], 1), args.repeat)
+    indexed = timeit(lambda: indexed_lookup(library, last["id"], 1), args.repeat)
+    print(f"per rerun: legacy {legacy * 1e6:9.1f} us, indexed {indexed * 1e6:6.2f} us ({legacy / indexed:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# bench_streaming.py
+"""Time-to-first-token vs total latency, blocking vs streamed, per API path.
+
+Starts the local fake OpenAI server in-process and runs DM turns through
+ai_backend.generate_dm_text with every combination of API and streaming.
+
+    python benchmarks/bench_streaming.py --turns 5 --chunk-delay 0.02
+"""
+import argparse
+import os
+import statistics
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from openai import OpenAI  # noqa: E402
+
+from ai_backend import generate_dm_text  # noqa: E402
+from fake_openai_server import FakeOpenAIServer  # noqa: E402
+
+
+def run(server, turns: int, stream: bool):
+    client = OpenAI(api_key="fake", base_url=server.base_url, max_retries=0)
+    ttfts, totals, api = [], [], ""
+    for _ in range(turns):
+        text, timing = generate_dm_text(client, "History:\nPlayer chooses: look around\n", stream=stream,
+                                        on_text=lambda partial: None)
+        assert "Choices:" in text, text
+        api = timing.api
+        totals.append(timing.total)
+        if timing.ttft is not None:
+            ttfts.append(timing.ttft)
+    return api, ttfts, totals
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--turns", type=int, default=5)
+    ap.add_argument("--chunk-delay", type=float, default=0.02)
+    ap.add_argument("--first-token-delay", type=float, default=0.2)
+    args = ap.parse_args()
+    for responses_enabled in (True, False):
+        with FakeOpenAIServer(chunk_delay=args.chunk_delay, first_token_delay=args.first_token_delay,
+                              responses_enabled=responses_enabled) as server:
+            for stream in (False, True):
+                api, ttfts, totals = run(server, args.turns, stream)
+                ttft = f"{statistics.median(ttfts) * 1000:7.0f} ms" if ttfts else "      n/a"
+                print(f"{api:>9} {'stream' if stream else 'block ':>6}: first token {ttft}, "
+                      f"total {statistics.median(totals) * 1000:7.0f} ms (median of {len(totals)})")
+
+
+if __name__ == "__main__":
+    main()
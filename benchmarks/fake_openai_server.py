@@ -0,0 +1,268 @@
+# fake_openai_server.py
+"""Local stand-in for the OpenAI HTTP API used by benchmarks.
+
+Implements ``POST /v1/responses`` and ``POST /v1/chat/completions``, both
+blocking and streamed (server-sent events), returning a canned Dungeon Master
+reply split into small chunks with a configurable delay between them.
+
+    python benchmarks/fake_openai_server.py --port 8765 --chunk-delay 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake streamlit run Final_AIDUNGEONMASTER_Project.py
+
+It can also be started in-process: ``FakeOpenAIServer(port=0).start()``.
+
+To exercise retry and rate-limit handling it can fail a fraction of
+requests (``--fail-rate``, with ``--fail-status`` 429 or 5xx) and answer 429
+whenever more than ``--max-concurrent`` requests are in flight.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_REPLY = (
+    "The fog parts as you step onto the old stone road. Lanterns sway from crooked posts, "
+    "and somewhere beyond the trees a bell tolls once, then falls silent.\n\n"
+    "A hooded figure waits at the crossroads, a map clutched in one gloved hand. "
+    "\"You are late,\" they murmur. \"The tide will not wait for us.\"\n\n"
+    "Choices:\n"
+    "1. Ask the figure who sent them\n"
+    "2. Follow the road toward the bell\n"
+    "3. Slip into the forest to avoid the stranger"
+)
+
+
+def split_chunks(text: str, size: int):
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeOpenAI/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    # ---------------------------
+    # Plumbing
+    # ---------------------------
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b"{}"
+        return json.loads(raw or b"{}")
+
+    def _send_json(self, status: int, payload: dict, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_sse(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+    def _sse(self, data, event: str = None):
+        msg = ""
+        if event:
+            msg += f"event: {event}\n"
+        msg += f"data: {data if isinstance(data, str) else json.dumps(data)}\n\n"
+        self.wfile.write(msg.encode())
+        self.wfile.flush()
+
+    # ---------------------------
+    # Routes
+    # ---------------------------
+    def do_POST(self):
+        fake = self.server.fake
+        body = self._read_json()
+        fake.record(self.path, body)
+        status = fake.enter()
+        try:
+            if status:
+                return self._send_error(status)
+            self._route(fake, body)
+        finally:
+            fake.leave()
+
+    def _send_error(self, status: int):
+        if status == 429:
+            error = {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}
+            return self._send_json(429, {"error": error}, {"Retry-After": "0.05"})
+        self._send_json(status, {"error": {"message": "Injected server error", "type": "server_error"}})
+
+    def _route(self, fake, body):
+        if self.path.rstrip("/").endswith("/responses"):
+            if not fake.responses_enabled:
+                return self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+            handler = self._responses_stream if body.get("stream") else self._responses
+        elif self.path.rstrip("/").endswith("/chat/completions"):
+            handler = self._chat_stream if body.get("stream") else self._chat
+        else:
+            return self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+        time.sleep(fake.first_token_delay)
+        handler(body, fake.reply)
+
+    def _responses(self, body, text):
+        time.sleep(self.server.fake.chunk_delay * len(split_chunks(text, self.server.fake.chunk_size)))
+        self._send_json(200, _response_object(body, text))
+
+    def _responses_stream(self, body, text):
+        fake = self.server.fake
+        self._start_sse()
+        resp = _response_object(body, "")
+        resp["status"] = "in_progress"
+        self._sse({"type": "response.created", "sequence_number": 0, "response": resp}, "response.created")
+        seq = 1
+        item_id = "msg_" + uuid.uuid4().hex[:12]
+        for chunk in split_chunks(text, fake.chunk_size):
+            self._sse({"type": "response.output_text.delta", "sequence_number": seq, "item_id": item_id,
+                       "output_index": 0, "content_index": 0, "delta": chunk, "logprobs": []},
+                      "response.output_text.delta")
+            seq += 1
+            time.sleep(fake.chunk_delay)
+        self._sse({"type": "response.output_text.done", "sequence_number": seq, "item_id": item_id,
+                   "output_index": 0, "content_index": 0, "text": text, "logprobs": []},
+                  "response.output_text.done")
+        self._sse({"type": "response.completed", "sequence_number": seq + 1,
+                   "response": _response_object(body, text)}, "response.completed")
+
+    def _chat(self, body, text):
+        time.sleep(self.server.fake.chunk_delay * len(split_chunks(text, self.server.fake.chunk_size)))
+        self._send_json(200, {
+            "id": "chatcmpl-" + uuid.uuid4().hex[:12], "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": text}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    def _chat_stream(self, body, text):
+        fake = self.server.fake
+        self._start_sse()
+        cid = "chatcmpl-" + uuid.uuid4().hex[:12]
+        base = {"id": cid, "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": body.get("model", "fake")}
+        self._sse(dict(base, choices=[{"index": 0, "delta": {"role": "assistant", "content": ""},
+                                       "finish_reason": None}]))
+        for chunk in split_chunks(text, fake.chunk_size):
+            self._sse(dict(base, choices=[{"index": 0, "delta": {"content": chunk}, "finish_reason": None}]))
+            time.sleep(fake.chunk_delay)
+        self._sse(dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        self._sse("[DONE]")
+
+
+def _response_object(body, text):
+    return {
+        "id": "resp_" + uuid.uuid4().hex[:12], "object": "response", "created_at": int(time.time()),
+        "status": "completed", "model": body.get("model", "fake"),
+        "output": [{"id": "msg_" + uuid.uuid4().hex[:12], "type": "message", "role": "assistant",
+                    "status": "completed",
+                    "content": [{"type": "output_text", "text": text, "annotations": []}]}],
+        "parallel_tool_calls": False, "tool_choice": "auto", "tools": [],
+    }
+
+
+class FakeOpenAIServer:
+    """Threaded fake server; ``base_url`` is ready to pass to ``OpenAI(base_url=...)``."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, reply: str = CANNED_REPLY,
+                 chunk_size: int = 12, chunk_delay: float = 0.01, first_token_delay: float = 0.2,
+                 responses_enabled: bool = True, fail_rate: float = 0.0, fail_status: int = 429,
+                 max_concurrent: int = None):
+        self.reply = reply
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.first_token_delay = first_token_delay
+        self.responses_enabled = responses_enabled
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.max_concurrent = max_concurrent
+        self.requests = []  # (path, body) of every request, newest last
+        self.failures = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+
+    @property
+    def port(self) -> int:
+        return self._httpd.server_address[1]
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self._httpd.server_address[0]}:{self.port}/v1"
+
+    def record(self, path, body):
+        with self._lock:
+            self.requests.append((path, body))
+
+    def enter(self):
+        """Admit a request; returns an error status to inject, or 0."""
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            if self.max_concurrent is not None and self.in_flight > self.max_concurrent:
+                status = 429
+            elif self.fail_rate and random.random() < self.fail_rate:
+                status = self.fail_status
+            else:
+                status = 0
+            self.failures += bool(status)
+            return status
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def start(self):
+        threading.Thread(target=self._httpd.serve_forever, name="fake-openai", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--chunk-size", type=int, default=12)
+    ap.add_argument("--chunk-delay", type=float, default=0.01)
+    ap.add_argument("--first-token-delay", type=float, default=0.2)
+    ap.add_argument("--no-responses", action="store_true", help="answer /v1/responses with 404")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests that fail")
+    ap.add_argument("--fail-status", type=int, default=429)
+    ap.add_argument("--max-concurrent", type=int, default=None, help="answer 429 above this many in flight")
+    args = ap.parse_args()
+    server = FakeOpenAIServer(args.host, args.port, chunk_size=args.chunk_size, chunk_delay=args.chunk_delay,
+                              first_token_delay=args.first_token_delay, responses_enabled=not args.no_responses,
+                              fail_rate=args.fail_rate, fail_status=args.fail_status,
+                              max_concurrent=args.max_concurrent)
+    print(f"Fake OpenAI server at {server.base_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
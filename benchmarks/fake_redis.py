@@ -0,0 +1,219 @@
+# fake_redis.py
+"""In-process stand-in for a Redis server, for benchmarks and local checks of redis_store.py.
+
+Implements only the commands RedisSaveStore uses, with the redis-py call
+signatures and reply types (bytes values, float scores), including
+``WATCH``/``MULTI``/``EXEC`` pipelines: a watched key written by anyone
+else before ``execute()`` raises ``WatchError``.  One lock serialises all
+commands, like Redis's single thread.  ``latency`` adds a sleep per round
+trip (a command, or a whole pipeline) to stand in for the network.
+
+    store = RedisSaveStore(FakeRedis(), watch_errors=(WatchError,))
+"""
+import bisect
+import threading
+import time
+
+
+class WatchError(Exception):
+    pass
+
+
+def _b(value) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).encode("utf-8")
+
+
+def _score(value) -> float:
+    if isinstance(value, (bytes, str)):
+        value = _b(value).decode()
+        if value in ("+inf", "inf"):
+            return float("inf")
+        if value == "-inf":
+            return float("-inf")
+    return float(value)
+
+
+class FakeRedis:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self._data = {}      # key -> bytes | dict | list | (scores dict, sorted [(score, member)])
+        self._versions = {}  # key -> write counter, for WATCH
+        self._lock = threading.RLock()
+
+    def _trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _touch(self, key):
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def __getattr__(self, name):
+        # every public command is one locked round trip
+        command = getattr(type(self), "_" + name, None)
+        if command is None:
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            self._trip()
+            with self._lock:
+                return command(self, *args, **kwargs)
+        return call
+
+    def pipeline(self, transaction: bool = True):
+        return FakePipeline(self, transaction)
+
+    def close(self):
+        pass
+
+    # ---------------------------
+    # Commands (run under the lock)
+    # ---------------------------
+    def _get(self, key):
+        return self._data.get(key)
+
+    def _set(self, key, value):
+        self._data[key] = _b(value)
+        self._touch(key)
+        return True
+
+    def _incr(self, key):
+        value = int(self._data.get(key, b"0")) + 1
+        self._data[key] = _b(value)
+        self._touch(key)
+        return value
+
+    def _delete(self, *keys):
+        n = 0
+        for key in keys:
+            if self._data.pop(key, None) is not None:
+                self._touch(key)
+                n += 1
+        return n
+
+    def _hset(self, key, mapping):
+        h = self._data.setdefault(key, {})
+        added = sum(1 for f in mapping if _b(f) not in h)
+        h.update({_b(f): _b(v) for f, v in mapping.items()})
+        self._touch(key)
+        return added
+
+    def _hget(self, key, field):
+        return self._data.get(key, {}).get(_b(field))
+
+    def _hmget(self, key, fields):
+        h = self._data.get(key, {})
+        return [h.get(_b(f)) for f in fields]
+
+    def _rpush(self, key, *values):
+        items = self._data.setdefault(key, [])
+        items.extend(_b(v) for v in values)
+        self._touch(key)
+        return len(items)
+
+    def _ltrim(self, key, start, end):
+        items = self._data.get(key)
+        if items is not None:
+            items[:] = items[start:None if end == -1 else end + 1]
+            self._touch(key)
+        return True
+
+    def _lrange(self, key, start, end):
+        return list(self._data.get(key, [])[start:None if end == -1 else end + 1])
+
+    def _zadd(self, key, mapping):
+        scores, ordered = self._data.setdefault(key, ({}, []))
+        added = 0
+        for member, score in mapping.items():
+            member, score = _b(member), float(score)
+            old = scores.get(member)
+            if old is not None:
+                ordered.remove((old, member))
+            else:
+                added += 1
+            scores[member] = score
+            bisect.insort(ordered, (score, member))
+        self._touch(key)
+        return added
+
+    def _zrem(self, key, *members):
+        scores, ordered = self._data.get(key, ({}, []))
+        n = 0
+        for member in map(_b, members):
+            score = scores.pop(member, None)
+            if score is not None:
+                ordered.remove((score, member))
+                n += 1
+        if n:
+            self._touch(key)
+        return n
+
+    def _zcard(self, key):
+        return len(self._data.get(key, ({}, []))[0])
+
+    def _zcount(self, key, low, high):
+        ordered = self._data.get(key, ({}, []))[1]
+        return sum(1 for score, _ in ordered if _score(low) <= score <= _score(high))
+
+    def _zrevrangebyscore(self, key, high, low, start=None, num=None, withscores=False):
+        ordered = self._data.get(key, ({}, []))[1]
+        low, high = _score(low), _score(high)
+        hits = [(m, s) for s, m in reversed(ordered) if low <= s <= high]
+        if start is not None:
+            hits = hits[start:start + num]
+        return hits if withscores else [m for m, _ in hits]
+
+
+class FakePipeline:
+    """redis-py ``Pipeline`` semantics: immediate after ``watch()``, queued after ``multi()``."""
+
+    def __init__(self, server: FakeRedis, transaction: bool):
+        self.server = server
+        self.transaction = transaction
+        self.reset()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.reset()
+
+    def reset(self):
+        self._queue = []
+        self._watched = {}
+        self._immediate = False
+
+    def watch(self, *keys):
+        self.server._trip()
+        with self.server._lock:
+            for key in keys:
+                self._watched[key] = self.server._versions.get(key, 0)
+        self._immediate = True
+
+    def multi(self):
+        self._immediate = False
+
+    def __getattr__(self, name):
+        command = getattr(FakeRedis, "_" + name, None)
+        if command is None:
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            if self._immediate:
+                return getattr(self.server, name)(*args, **kwargs)
+            self._queue.append((command, args, kwargs))
+            return self
+        return call
+
+    def execute(self):
+        self.server._trip()
+        try:
+            with self.server._lock:
+                if any(self.server._versions.get(k, 0) != v for k, v in self._watched.items()):
+                    raise WatchError("Watched variable changed.")
+                return [command(self.server, *args, **kwargs) for command, args, kwargs in self._queue]
+        finally:
+            self.reset()
@@ -0,0 +1,303 @@
+# load_test.py
+"""Concurrent adventurers driven through the real script, against a fake OpenAI server.
+
+Every simulated session is a Streamlit ``AppTest`` of the app in its own
+worker process (AppTest swaps process-global Streamlit state on every run,
+so two cannot run at once in one process).  All workers share the fake
+server and one throwaway save database.  A session renders the intro and
+skips it, creates a character, starts an online game, clicks ``--turns``
+choices, saves, returns home and loads the save back.  Workers import the
+app and render the intro first, then all start playing together, so the
+figures cover concurrent play rather than interpreter start-up.  The DM is
+fake_openai_server.py in its own process; ``--first-token-delay``,
+``--chunk-delay`` and ``--fail-rate`` shape its latency and errors.  The
+response cache is off unless ``--response-cache`` is given.
+
+For each concurrency level the report gives DM turns per second, the
+latency of every rerun (p50/p95/p99, and separately for reruns that
+produced a DM turn), CPU seconds and resident memory growth per session
+(measured from the end of the intro, so shared start-up cost is left out),
+and the mean time of each in-app phase recorded by metrics.py.  AppTest's
+own overhead is part of the figures, so compare runs with each other
+rather than with a browser.  Process-wide caches are per worker here, so
+the cache-hit benefit of many sessions in one server process is not shown.
+
+    python benchmarks/load_test.py --sessions 1 8 32 --turns 5 --first-token-delay 0.3
+    python benchmarks/load_test.py --sessions 16 --json after.json --baseline before.json
+"""
+import argparse
+import gc
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "Final_AIDUNGEONMASTER_Project.py")
+FAKE_SERVER = os.path.join(ROOT, "benchmarks", "fake_openai_server.py")
+
+
+def start_fake_server(args):
+    cmd = [sys.executable, "-u", FAKE_SERVER, "--port", "0", "--first-token-delay", str(args.first_token_delay),
+           "--chunk-delay", str(args.chunk_delay), "--fail-rate", str(args.fail_rate),
+           "--fail-status", str(args.fail_status)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()  # "Fake OpenAI server at http://127.0.0.1:<port>/v1"
+    if not line.strip():
+        proc.kill()
+        raise RuntimeError("fake OpenAI server did not start")
+    return proc, line.split(" at ", 1)[1].strip()
+
+
+def rss_bytes() -> int:
+    """Current resident set size (falls back to the peak where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def percentiles(values) -> dict:
+    if len(values) < 2:
+        v = values[0] if values else 0.0
+        return {"p50": v, "p95": v, "p99": v}
+    cuts = statistics.quantiles(values, n=100)
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98]}
+
+
+# ---------------------------
+# One session
+# ---------------------------
+class Session:
+    def __init__(self, name: str, turns: int, think: float, timeout: float):
+        from streamlit.testing.v1 import AppTest
+        self.at = AppTest.from_file(SCRIPT, default_timeout=timeout)
+        self.name = name
+        self.turns = turns
+        self.think = think
+        self.reruns = []       # seconds per rerun
+        self.turn_reruns = []  # seconds per rerun that added a DM turn
+        self.dm_turns = 0
+        self.errors = []
+        self.outcome = "started"
+
+    def step(self, action=None):
+        """Run one interaction (``action(at)`` returns the widget call to run, or None for a plain rerun)."""
+        if self.think:
+            time.sleep(self.think)
+        before = self._dm_count()
+        started = time.perf_counter()
+        (action(self.at) if action else self.at).run()
+        elapsed = time.perf_counter() - started
+        self.reruns.append(elapsed)
+        added = self._dm_count() - before
+        if added > 0:
+            self.dm_turns += added
+            self.turn_reruns.append(elapsed)
+        self.errors += [str(e.value) for e in self.at.exception]
+
+    def _dm_count(self) -> int:
+        game = self.at.session_state["game"] if "game" in self.at.session_state else None
+        return sum(1 for t in game.history if t.role == "dm") if game else 0
+
+    def _button(self, label=None, key_prefix=None):
+        for b in self.at.button:
+            if (label and b.label == label) or (key_prefix and b.key and b.key.startswith(key_prefix)):
+                return b
+        return None
+
+    def _mode(self):
+        return self.at.session_state["game"].mode if "game" in self.at.session_state else None
+
+    def play(self):
+        """Everything after the intro has been rendered."""
+        self.step(lambda at: self._button(key_prefix="skip_intro").click())
+        self.step(lambda at: at.text_input(key="ui_name").input(self.name))
+        self.step(lambda at: self._button("Start Online (AI)").click())
+        for _ in range(self.turns * 3):  # a busy DM ("try again") costs extra clicks
+            if self._mode() != "online" or self.dm_turns > self.turns:
+                break
+            choice = self._button(key_prefix="online_choice") or self._button("Try again")
+            if choice is None:
+                self.outcome = "no choices"
+                return
+            self.step(lambda at: choice.click())
+        if self._mode() != "online":
+            self.outcome = "offline fallback"
+            return
+        if self.dm_turns <= self.turns:
+            self.outcome = "DM busy"
+            return
+        self.step(lambda at: self._button("Save Game (to DB)").click())
+        history = len(self.at.session_state["game"].history)
+        self.step(lambda at: self._button("Return to Home").click())
+        self.step(lambda at: at.text_input(key="saves_filter").input(self.name))
+        load = self._button(key_prefix="load_")
+        if load is None:
+            self.outcome = "save missing"
+            return
+        self.step(lambda at: load.click())
+        loaded = self.at.session_state["game"]
+        self.outcome = "ok" if loaded.mode == "online" and len(loaded.history) == history else "load mismatch"
+
+
+# ---------------------------
+# One concurrency level
+# ---------------------------
+def child_main(name: str, turns: int, think: float, timeout: float):
+    """Worker process: import and render the intro, wait for "go" on stdin, play, print the result as JSON."""
+    sys.path.insert(0, ROOT)
+    session = Session(name, turns, think, timeout)
+    session.step()  # the intro; imports the app's modules
+    import openai  # noqa: F401  the app imports it lazily on the first DM turn; keep that out of the timings
+    del session.reruns[:]
+    cpu_ready, rss_ready = cpu_seconds(), rss_bytes()
+    print("ready", flush=True)
+    sys.stdin.readline()
+    try:
+        session.play()
+    except Exception as e:
+        session.outcome = f"crashed: {type(e).__name__}: {e}"
+    gc.collect()
+    from metrics import METRICS
+    phases = {k: (h["count"], h["sum"]) for k, h in METRICS.snapshot()["histograms"].items()}
+    print(json.dumps({"outcome": session.outcome, "reruns": session.reruns, "turn_reruns": session.turn_reruns,
+                      "dm_turns": session.dm_turns, "errors": session.errors, "cpu_s": cpu_seconds() - cpu_ready,
+                      "rss_growth": rss_bytes() - rss_ready, "rss": rss_bytes(), "phases": phases}), flush=True)
+
+
+def run_level(n: int, args, level: int, env: dict) -> dict:
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", "--turns", str(args.turns),
+           "--think", str(args.think), "--timeout", str(args.timeout)]
+    children = [subprocess.Popen(cmd + ["--name", f"load-{level}-{i}"], cwd=ROOT, env=env, text=True,
+                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE) for i in range(n)]
+    for child in children:
+        while child.stdout.readline().strip() not in ("ready", ""):
+            pass
+    started = time.perf_counter()
+    for child in children:
+        child.stdin.write("go\n")
+        child.stdin.flush()
+    sessions = []
+    for child in children:
+        lines = child.stdout.read().strip().splitlines()
+        child.wait()
+        try:
+            sessions.append(json.loads(lines[-1]))
+        except (IndexError, ValueError):
+            sessions.append({"outcome": f"crashed: exit {child.returncode}", "reruns": [], "turn_reruns": [],
+                             "dm_turns": 0, "errors": [], "cpu_s": 0.0, "rss_growth": 0, "rss": 0, "phases": {}})
+    elapsed = time.perf_counter() - started
+
+    reruns = [r for s in sessions for r in s["reruns"]]
+    turn_reruns = [r for s in sessions for r in s["turn_reruns"]]
+    outcomes, phases = {}, {}
+    for s in sessions:
+        outcomes[s["outcome"]] = outcomes.get(s["outcome"], 0) + 1
+        for name, (count, total) in s["phases"].items():
+            c, t = phases.get(name, (0, 0.0))
+            phases[name] = (c + count, t + total)
+    result = {
+        "sessions": n, "elapsed_s": elapsed, "dm_turns": sum(s["dm_turns"] for s in sessions),
+        "reruns": len(reruns), "outcomes": outcomes,
+        "errors": sorted({e for s in sessions for e in s["errors"]})[:5],
+        "rerun_s": percentiles(reruns), "turn_rerun_s": percentiles(turn_reruns),
+        "cpu_s_per_session": sum(s["cpu_s"] for s in sessions) / n,
+        "rss_mb_per_session": sum(max(s["rss_growth"], 0) for s in sessions) / n / 2 ** 20,
+        "rss_mb": max(s["rss"] for s in sessions) / 2 ** 20,
+        "phase_mean_s": {name: total / count for name, (count, total) in sorted(phases.items()) if count},
+    }
+    result["turns_per_s"] = result["dm_turns"] / elapsed
+    return result
+
+
+def report(r: dict):
+    p, t = r["rerun_s"], r["turn_rerun_s"]
+    print(f"{r['sessions']:>4} sessions: {r['dm_turns']} DM turns in {r['elapsed_s']:.1f}s = {r['turns_per_s']:6.2f} turns/s; "
+          f"outcomes {r['outcomes']}")
+    print(f"{'':>14}rerun p50/p95/p99 {p['p50'] * 1e3:6.0f} /{p['p95'] * 1e3:6.0f} /{p['p99'] * 1e3:6.0f} ms "
+          f"({r['reruns']} reruns); with a DM turn {t['p50'] * 1e3:6.0f} /{t['p95'] * 1e3:6.0f} /{t['p99'] * 1e3:6.0f} ms")
+    print(f"{'':>14}CPU {r['cpu_s_per_session']:.2f} s/session, memory +{r['rss_mb_per_session']:.1f} MB/session "
+          f"(worker RSS {r['rss_mb']:.0f} MB)")
+    print(f"{'':>14}phases (mean ms): " + ", ".join(f"{name} {s * 1e3:.1f}" for name, s in r["phase_mean_s"].items()))
+    for error in r["errors"]:
+        print(f"{'':>14}error: {error}")
+
+
+def regressions(results, baseline, tolerance: float) -> list:
+    """Levels where throughput fell or p95 rerun latency rose by more than ``tolerance`` vs the baseline."""
+    found, old = [], {r["sessions"]: r for r in baseline}
+    for r in results:
+        b = old.get(r["sessions"])
+        if not b:
+            continue
+        if r["turns_per_s"] < b["turns_per_s"] * (1 - tolerance):
+            found.append(f"{r['sessions']} sessions: {b['turns_per_s']:.2f} -> {r['turns_per_s']:.2f} turns/s")
+        if r["rerun_s"]["p95"] > b["rerun_s"]["p95"] * (1 + tolerance):
+            found.append(f"{r['sessions']} sessions: rerun p95 {b['rerun_s']['p95'] * 1e3:.0f} -> "
+                         f"{r['rerun_s']['p95'] * 1e3:.0f} ms")
+    return found
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 16], help="concurrency levels")
+    ap.add_argument("--turns", type=int, default=5, help="choices clicked per session")
+    ap.add_argument("--think", type=float, default=0.0, help="seconds a player waits before each interaction")
+    ap.add_argument("--first-token-delay", type=float, default=0.2)
+    ap.add_argument("--chunk-delay", type=float, default=0.01)
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="fraction of API requests the fake server fails")
+    ap.add_argument("--fail-status", type=int, default=503)
+    ap.add_argument("--response-cache", action="store_true", help="keep the DM response cache on")
+    ap.add_argument("--timeout", type=float, default=120.0, help="seconds one rerun may take")
+    ap.add_argument("--json", help="write the results to this file")
+    ap.add_argument("--baseline", help="results file of an earlier run to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression vs the baseline")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--name", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        child_main(args.name, args.turns, args.think, args.timeout)
+        return
+
+    home = tempfile.mkdtemp(prefix="aidm-load-")
+    server, base_url = start_fake_server(args)
+    env = dict(os.environ, HOME=home, OPENAI_BASE_URL=base_url, OPENAI_API_KEY="fake")
+    if not args.response_cache:
+        env["AIDM_RESPONSE_CACHE"] = "off"
+    results = []
+    try:
+        for level, n in enumerate(args.sessions):
+            results.append(run_level(n, args, level, env))
+            report(results[-1])
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(home, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f)["results"], args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
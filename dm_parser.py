@@ -0,0 +1,161 @@
+# dm_parser.py
+"""Split a Dungeon Master reply into story text and the offered choices.
+
+Models are asked for a "Choices:" section but do not always follow it, so
+three strategies are tried, in order:
+
+- ``header``: everything after the first line starting with "Choices:"
+  (used whenever "choices:" appears anywhere in the reply);
+- ``bullets``: short numbered ("1." / "1)") or bulleted ("-" / "•") lines;
+- ``tail``: up to three short lines at the end of the reply.
+
+All three are decided in a single pass.  A short reply is split into lines
+and each line is classified once, in one loop; a longer one is scanned once
+with a single precompiled pattern, so Python-level work stays limited to the
+few header and choice lines.  The result matches the original
+``parse_ai_output`` exactly (see tests/test_dm_parser.py);
+``STRATEGY_COUNTS`` tracks how often each strategy was needed, i.e. how
+often the model ignored the format.
+"""
+import re
+import threading
+
+HEADER = "header"
+BULLETS = "bullets"
+TAIL = "tail"
+NONE = "none"
+
+_PREFIX_CHARS = "0123456789.)-• \t"
+# Replies up to this many characters are classified in one loop over their lines, which beats
+# the per-match overhead of _SCAN there (benchmarks/bench_dm_parser.py).
+SHORT_REPLY = 2048
+# One pattern, matched at line starts ("\n" is prepended to the reply), so the regex engine can skip
+# from one line break to the next.  It only stops at lines that need Python-level work: a header or
+# bullet candidate (group 1), or any line after one that ends in whitespace (then the story needs a
+# per-line rstrip).  Group 2 is a "choices:" header at the start of the line (ASCII case-insensitive,
+# like str.lower()); group 3 the character before "." / ")", a numbered choice if it is a digit.
+_SCAN = re.compile(r"\n(?:([^\S\n]*(?:([Cc][Hh][Oo][Ii][Cc][Ee][Ss]:)|[-•]|(\S)[.)])[^\n]*)|(?<=[^\S\n]\n))")
+# Line breaks str.splitlines() knows besides "\n", the ASCII ones first
+_ASCII_BREAKS = "\r\x0b\x0c\x1c\x1d\x1e"
+_OTHER_BREAKS = _ASCII_BREAKS + "\x85\u2028\u2029"
+
+STRATEGY_COUNTS = dict.fromkeys((HEADER, BULLETS, TAIL, NONE), 0)
+_counts_lock = threading.Lock()
+
+
+def _body(text: str) -> str:
+    """``text`` with "\n" line breaks, such that ``body.split("\n") == text.splitlines()``."""
+    for c in (_ASCII_BREAKS if text.isascii() else _OTHER_BREAKS):
+        if c in text:
+            return "\n".join(text.splitlines())
+    return text[:-1] if text.endswith("\n") else text
+
+
+def _clean(story: str, spaced: bool) -> str:
+    """Every line right-stripped (only needed when the scan saw trailing whitespace), then the whole story."""
+    if spaced:
+        story = "\n".join([ln.rstrip() for ln in story.split("\n")])
+    return story.strip()
+
+
+def _header_choices(lines):
+    """Choices from the lines after the header line."""
+    choices = []
+    for ln in lines:
+        s = ln.strip()
+        if s and not (s[0] in "Cc" and s[:8].lower() == "choices:"):
+            s = s.lstrip(_PREFIX_CHARS)
+            if s:
+                choices.append(s)
+    return choices
+
+
+def _short_reply(text):
+    """All three strategies for a short reply: each line is classified once, in a plain loop."""
+    lines = text.splitlines()
+    story, choices = [], []
+    for ln in lines:
+        s = ln.strip()
+        if s:
+            c = s[0]
+            if (c.isdigit() and s[1:2] in (".", ")")) or c in "-•":
+                candidate = s.lstrip(_PREFIX_CHARS)
+                if len(candidate.split()) <= 20:
+                    choices.append(candidate)
+                    continue
+            elif c in "Cc" and s[:8].lower() == "choices:":
+                # bullets above the header belong to the story after all
+                i = len(story) + len(choices)
+                if choices:
+                    story = [ln.rstrip() for ln in lines[:i]]
+                return "\n".join(story).strip(), _header_choices(lines[i + 1:]), HEADER
+            story.append(ln.rstrip())
+        else:
+            story.append("")
+    if ":" in text and "choices:" in text.lower():
+        # "choices:" only mid-line: the header strategy applies, and finds nothing
+        return "\n".join([ln.rstrip() for ln in lines]).strip(), [], HEADER
+    if choices:
+        return "\n".join(story).strip(), choices, BULLETS
+    # no line was taken as a bullet, so ``story`` holds every line
+    tail = [s for s in (ln.lstrip() for ln in story[-6:]) if s]
+    choices = [s for s in tail if len(s.split()) <= 12][-3:]
+    return "\n".join(story[:-len(choices)] if choices else story).strip(), choices, TAIL
+
+
+def _tail(body, spaced):
+    tail = [s for s in (ln.strip() for ln in body.rsplit("\n", 6)[-6:]) if s]
+    choices = [s for s in tail if len(s.split()) <= 12][-3:]
+    if not choices:
+        return _clean(body, spaced), choices
+    head = body.rsplit("\n", len(choices))
+    return (_clean(head[0], spaced) if len(head) > len(choices) else ""), choices
+
+
+def _long_reply(body):
+    """All three strategies for a long reply, from one scan with _SCAN."""
+    text = "\n" + body
+    pieces, choices, pos, spaced = [], [], 0, False
+    for m in _SCAN.finditer(text):
+        line, header, mark = m.groups()
+        start = m.start()
+        if not spaced and start and text[start - 1] != "\n" and text[start - 1].isspace():
+            spaced = True
+        if header is not None:
+            return _clean(text[:start], spaced), _header_choices(text[m.end():].split("\n")[1:]), HEADER
+        if line is None or (mark is not None and not mark.isdigit()):
+            continue
+        candidate = line.strip().lstrip(_PREFIX_CHARS)
+        if len(candidate.split()) <= 20:
+            choices.append(candidate)
+            pieces.append(text[pos:start])
+            pos = m.end()
+    if ":" in body and "choices:" in body.lower():
+        # "choices:" only mid-line: the header strategy applies, and finds nothing
+        return _clean(body, spaced), [], HEADER
+    if choices:
+        pieces.append(text[pos:])
+        return _clean("".join(pieces), spaced), choices, BULLETS
+    story, choices = _tail(body, spaced)
+    return story, choices, TAIL
+
+
+def parse_dm_output(text):
+    """``(story, choices, strategy)``; ``strategy`` is ``NONE`` when no choices were found."""
+    if not text:
+        return "", [], NONE
+    if len(text) <= SHORT_REPLY:
+        story, choices, strategy = _short_reply(text)
+    else:
+        story, choices, strategy = _long_reply(_body(text))
+    if not choices:
+        strategy = NONE
+    with _counts_lock:
+        STRATEGY_COUNTS[strategy] += 1
+    return story, choices, strategy
+
+
+def parse_ai_output(text):
+    """``(story, choices)``, as the app has always called it."""
+    story, choices, _ = parse_dm_output(text)
+    return story, choices
@@ -0,0 +1,274 @@
+# game_engine.py
+"""The game loop without Streamlit: explicit state in, new state out.
+
+``GameState`` is everything one player's game needs (mode, history, offline
+position, campaign key, rolling summary, recent turn timings).  It is frozen
+and its history is a tuple, so a state handed to a prefetch job or another
+thread never changes under it.  ``GameSession`` holds the collaborators (DM
+text generator, save store, story library, prefetcher) and turns a state
+plus an action into the next state; the Streamlit script keeps one state in
+``st.session_state.game`` and only renders it.  Without a browser, the same
+engine runs simulated sessions (see benchmarks/bench_game_engine.py).
+Each phase of a turn is timed into ``metrics.METRICS``.  ``save_async`` and
+autosave checkpoints go through the background writer in autosave.py.
+"""
+import os
+import time
+from dataclasses import dataclass, field, replace
+
+from ai_backend import generate_dm_text
+from autosave import AUTOSAVE, AUTOSAVE_EVERY
+from dm_parser import parse_dm_output
+from metrics import METRICS
+from prefetch import PREFETCH_ENABLED, PREFETCHER, state_key
+from prompt_builder import PromptBuilder, empty_summary, extractive_summary, make_llm_summarizer
+from response_cache import CACHE_TURNS, RESPONSE_CACHE
+from save_store import SAVE_STORE, new_campaign_key
+from scene_classifier import scene_table
+from story_engine import story_library
+from turns import DM, OFFLINE, PLAYER, Turn
+
+ONLINE_MODE = "online"
+OFFLINE_MODE = "offline"
+# Stream DM replies into the page as they are generated (AIDM_STREAM=0 to disable)
+STREAM_RESPONSES = os.getenv("AIDM_STREAM", "1") != "0"
+# Rolling summary of older turns: "extractive" (free) or "llm" (one extra call every AIDM_SUMMARY_EVERY entries)
+SUMMARY_MODE = os.getenv("AIDM_SUMMARY_MODE", "extractive")
+# Recent turn timings kept on the state
+MAX_TIMINGS = 50
+
+
+@dataclass(frozen=True)
+class GameState:
+    player_name: str = ""
+    mode: str = None                  # None (home screen), ONLINE_MODE or OFFLINE_MODE
+    history: tuple = ()               # turns.Turn records
+    offline_story_id: str = None      # None: the first story in the library
+    offline_segment: int = 0
+    campaign_key: str = field(default_factory=new_campaign_key)
+    saved_count: int = None           # entries in the store when last saved or loaded
+    summary: dict = field(default_factory=empty_summary)
+    turn_timings: tuple = ()
+    save_ticket: str = None           # queued background save whose result is not applied yet
+
+    def last_dm(self):
+        """The newest DM turn, or None."""
+        for turn in reversed(self.history):
+            if turn.role == DM:
+                return turn
+        return None
+
+
+class GameSession:
+    """Applies player actions to a ``GameState``.
+
+    ``client`` is a callable returning the OpenAI client (or None), called
+    only when a DM turn is generated.  ``generate`` replaces that path
+    entirely: ``generate(prompt, stream=, on_text=, cacheable=, session_id=,
+    background=)`` returning ``(text, ai_backend.TurnTiming)``, e.g. a
+    scripted DM for load tests.
+    """
+
+    def __init__(self, client=lambda: None, generate=None, store=SAVE_STORE, library=story_library,
+                 prefetcher=PREFETCHER, stream: bool = STREAM_RESPONSES, summary_mode: str = SUMMARY_MODE,
+                 prefetch: bool = PREFETCH_ENABLED, cache_turns: bool = CACHE_TURNS, writer=AUTOSAVE,
+                 autosave_every: int = AUTOSAVE_EVERY, log=print):
+        self.client = client
+        self._generate = generate
+        self.store = store
+        self.library = library
+        self.prefetcher = prefetcher
+        self.stream = stream
+        self.summary_mode = summary_mode
+        self.prefetch_enabled = prefetch
+        self.cache_turns = cache_turns
+        self.writer = writer
+        self.autosave_every = autosave_every
+        self.log = log
+
+    # ---------------------------
+    # Campaigns
+    # ---------------------------
+    def new_game(self, state: GameState, mode: str, player_name: str = None) -> GameState:
+        """A fresh campaign in ``mode`` (the next save creates a new campaign); keeps the chosen story."""
+        return replace(state, mode=mode, player_name=state.player_name if player_name is None else player_name,
+                       history=(), offline_segment=0, campaign_key=new_campaign_key(), saved_count=None,
+                       summary=empty_summary(), turn_timings=(), save_ticket=None)
+
+    def leave(self, state: GameState) -> GameState:
+        """Back to the home screen; the session's speculative jobs are cancelled."""
+        self.prefetcher.drop(state.campaign_key)
+        return replace(state, mode=None)
+
+    @staticmethod
+    def _save_args(state: GameState) -> dict:
+        return {"player_name": state.player_name, "mode": state.mode, "history": state.history,
+                "offline_story_id": state.offline_story_id, "offline_segment": state.offline_segment,
+                "expected_count": state.saved_count, "summary": state.summary}
+
+    def save(self, state: GameState) -> GameState:
+        """Append the entries added since the last save to the state's campaign."""
+        with METRICS.span("save"):
+            result = self.store.save(state.campaign_key, **self._save_args(state))
+        METRICS.inc("saves")
+        return replace(state, campaign_key=result["campaign_key"], saved_count=result["entry_count"])
+
+    def save_async(self, state: GameState) -> GameState:
+        """Queue a save on the background writer and return at once (a frozen state is safe to hand over)."""
+        state = self.sync_saves(state)
+        ticket = self.writer.enqueue(after=state.save_ticket, campaign_key=state.campaign_key,
+                                     **self._save_args(state))
+        return replace(state, save_ticket=ticket)
+
+    def sync_saves(self, state: GameState) -> GameState:
+        """Apply the campaign key and entry count of the queued save once the writer has written it."""
+        result = self.writer.take_result(state.save_ticket) if state.save_ticket else None
+        if result is None:
+            return state
+        return replace(state, campaign_key=result["campaign_key"], saved_count=result["entry_count"],
+                       save_ticket=None)
+
+    def checkpoint(self, state: GameState) -> GameState:
+        """Autosave (AIDM_AUTOSAVE_EVERY): queue a save every N DM replies or offline choices."""
+        if self.autosave_every > 0 and state.player_name.strip():
+            turns = sum(1 for turn in state.history if turn.role != PLAYER)
+            if turns and turns % self.autosave_every == 0:
+                return self.save_async(state)
+        return state
+
+    def load(self, save_id: int):
+        """The saved game as a new state, or None if it no longer exists."""
+        row = self.store.load(save_id)
+        if not row:
+            return None
+        return GameState(player_name=row["player_name"], mode=row["mode"],
+                         history=tuple(Turn.load(e) for e in row["history"]),
+                         offline_story_id=row["offline_story_id"], offline_segment=row["offline_segment"] or 0,
+                         campaign_key=row["campaign_key"], saved_count=row["entry_count"],
+                         summary=row["summary"])
+
+    # ---------------------------
+    # Online play
+    # ---------------------------
+    def ai_available(self) -> bool:
+        return self._generate is not None or RESPONSE_CACHE.replay_only or bool(self.client())
+
+    def generate(self, prompt: str, **kwargs):
+        if self._generate is not None:
+            return self._generate(prompt, **kwargs)
+        client = self.client()
+        if not client and not RESPONSE_CACHE.replay_only:
+            raise RuntimeError("OpenAI client not configured")
+        return generate_dm_text(client, prompt, **kwargs)
+
+    def prompt_builder(self, session_id: str) -> PromptBuilder:
+        if self.summary_mode == "llm" and self.ai_available():
+            summarizer = make_llm_summarizer(lambda p: self.generate(p, session_id=session_id)[0])
+        else:
+            summarizer = extractive_summary
+        return PromptBuilder(summarizer=summarizer)
+
+    def play(self, state: GameState, choice_label: str = None, free_text: str = None, on_text=None) -> GameState:
+        """The player's action (if any; none for the opening turn) followed by the DM's reply.
+
+        ``on_text(partial)`` receives the reply as it streams.  If generation
+        fails the exception propagates and ``state`` is simply kept, so the
+        same action can be tried again.
+        """
+        history = state.history
+        action = choice_label or free_text
+        if action:
+            history += (Turn(PLAYER, action, ts=time.time()),)
+        summary, session_id = state.summary, state.campaign_key
+        text, prefetched = None, False
+        if self.prefetch_enabled:
+            job = self.prefetcher.take(session_id, state_key(history, summary, choice_label, free_text))
+            if job is not None:
+                try:
+                    text, timing = job.wait(on_text)
+                    prompt, summary, prompt_stats = job.extra
+                    prefetched = True
+                except Exception as e:
+                    text = None
+                    self.log(f"Prefetched turn failed, generating again: {e}")
+        if text is None:
+            # Recent history packed into a token budget; older turns live in the rolling summary
+            with METRICS.span("prompt_build"):
+                prompt, summary, prompt_stats = self.prompt_builder(session_id).build(
+                    history, summary, choice_label=choice_label, free_text=free_text)
+            # The opening turn is the same prompt for every new game, so it is always cacheable
+            opening = not history
+            try:
+                with METRICS.span("model_call"):
+                    text, timing = self.generate(prompt, stream=self.stream, on_text=on_text,
+                                                 cacheable=opening or self.cache_turns, session_id=session_id)
+            except Exception:
+                METRICS.inc("ai_failures")
+                raise
+        # Choices are parsed once here and kept on the Turn; reruns never parse history again
+        with METRICS.span("parse"):
+            story_text, choices, parse_strategy = parse_dm_output(text)
+            scene = scene_table().classify(story_text)
+        history += (Turn(DM, story_text.strip(), choices, scene, time.time()),)
+        METRICS.inc("turns")
+        if prefetched:
+            METRICS.inc("prefetched_turns")
+        stats = dict(timing.as_dict(), prefetched=prefetched, parse_strategy=parse_strategy, **prompt_stats)
+        ttft = f"{timing.ttft:.2f}s" if timing.ttft is not None else "n/a"
+        self.log(f"DM turn via {timing.api}{' (prefetched)' if prefetched else ''}: {prompt_stats['prompt_tokens']} "
+                 f"prompt tokens, first token {ttft}, total {timing.total:.2f}s, {timing.chars} chars, "
+                 f"choices by {parse_strategy}")
+        return self.checkpoint(replace(state, history=history, summary=summary,
+                                       turn_timings=(state.turn_timings + (stats,))[-MAX_TIMINGS:]))
+
+    def fall_back_offline(self, state: GameState) -> GameState:
+        """Switch a game whose DM failed to offline mode, keeping its history."""
+        METRICS.inc("offline_fallbacks")
+        return replace(state, mode=OFFLINE_MODE)
+
+    def prefetch(self, state: GameState):
+        """Start generating the reply to every offered choice while the player reads (AIDM_PREFETCH=1)."""
+        last_dm = state.last_dm()
+        if not (self.prefetch_enabled and last_dm and last_dm.choices and self.ai_available()):
+            return
+        history, summary, session_id = state.history, state.summary, state.campaign_key
+        branches = [(c, history + (Turn(PLAYER, c),)) for c in last_dm.choices]
+        keys = [state_key(h, summary, choice_label=c) for c, h in branches]
+        if self.prefetcher.has(session_id, keys):
+            return
+        builder, specs, folded = self.prompt_builder(session_id), [], summary
+        for key, (c, h) in zip(keys, branches):
+            # every branch has the same length, so the first one's summary update serves all three
+            built = builder.build(h, folded, choice_label=c)
+            folded = built[1]
+            generate = lambda on_text, p=built[0]: self.generate(p, stream=True, on_text=on_text,
+                                                                 cacheable=self.cache_turns, session_id=session_id,
+                                                                 background=True)
+            specs.append((key, generate, built))
+        self.prefetcher.prefetch(session_id, specs)
+
+    # ---------------------------
+    # Offline play
+    # ---------------------------
+    def offline_story(self, state: GameState):
+        """The selected story (the library's first if the id is unknown), or None if none loaded."""
+        library = self.library()
+        if not library.ids:
+            return None
+        return library.get(state.offline_story_id) or library.stories[0]
+
+    def select_story(self, state: GameState, story_id: str) -> GameState:
+        """Switch adventure; a different one starts from its first segment."""
+        if story_id == state.offline_story_id:
+            return state
+        return replace(state, offline_story_id=story_id, offline_segment=0)
+
+    def choose_offline(self, state: GameState, index: int) -> GameState:
+        """Take choice ``index`` of the current segment."""
+        story = self.offline_story(state)
+        segment = story.segment(state.offline_segment) if story else None
+        if segment is None:
+            return state
+        choice = segment.choices[index]
+        return self.checkpoint(replace(state, offline_story_id=story.id, offline_segment=choice.next,
+                                       history=state.history + (Turn(OFFLINE, choice.result, ts=time.time()),)))
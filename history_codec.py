@@ -0,0 +1,256 @@
+# history_codec.py
+"""Optional compression of stored history entries.
+
+Entries are short, repetitive Turn records of DM prose, so they are
+compressed one by one against a shared preset dictionary ("zdict").  The
+built-in dictionaries are fixed files in ``dictionaries/`` (see
+``BUILTIN_DICTIONARIES``); new rows use the newest, and older ones stay
+loaded so the rows written with them keep decoding.
+
+Encoded entries are BLOBs laid out as::
+
+    version byte | 4-byte dictionary id | payload
+
+Plain ``str`` values are the uncompressed (and pre-compression) format and
+always decode as-is, so old rows keep loading.  The codec is chosen with
+``AIDM_HISTORY_CODEC`` = ``plain`` (default), ``zlib`` or ``zstd`` (needs
+the optional ``zstandard`` package).
+
+Train a dictionary from your own saves with::
+
+    python history_codec.py train --db ~/.ai_dungeon_master/game_data.db --out dm.zdict
+
+and point ``AIDM_HISTORY_DICT`` at the file.  Every dictionary is identified
+by a hash of its bytes, so rows written with an older dictionary still decode
+as long as that dictionary is loadable (built-in or ``AIDM_HISTORY_DICT``).
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import zlib
+from collections import Counter
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+VERSION_ZLIB = 1
+VERSION_ZSTD = 2
+HISTORY_CODEC = os.getenv("AIDM_HISTORY_CODEC", "plain").strip().lower()
+HISTORY_DICT_PATH = os.getenv("AIDM_HISTORY_DICT", "")
+MAX_DICT_SIZE = 32 * 1024  # zlib only looks back 32 KiB
+ZSTD_LEVEL = 6
+# Shipped dictionaries as (file in dictionaries/, id), oldest first.  Rows
+# name their dictionary by id, so these files are fixed bytes: never edit or
+# remove one; add a new file and append it here.
+DICT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dictionaries")
+BUILTIN_DICTIONARIES = (
+    ("dm-v1.zdict", "65f1961b"),        # "DM: ..." string entries
+    ("dm-turns-v2.zdict", "ad1c4231"),  # Turn JSON records (turns.py)
+)
+
+# Stored history entries are Turn records (turns.py) as compact JSON; these
+# are what the shipped dm-turns-v2 dictionary was trained on, and what
+# ``train`` falls back to when a database has no entries yet.
+_DM_TURNS = (
+    ("The fog parts as you step onto the old stone road. Lanterns sway from crooked posts, and somewhere "
+     "beyond the trees a bell tolls once, then falls silent.",
+     ("Follow the sound of the bell", "Search the roadside shrine", "Wait for the fog to lift"), None),
+    ("You push open the heavy oak door and the hinges groan in protest. Inside, the air is thick with dust "
+     "and the smell of old parchment. Shadows dance across the walls as your torch flickers.",
+     ("Draw your sword and step forward", "Call out to whoever is inside", "Search the room for clues"), None),
+    ("A hooded figure waits at the crossroads, a map clutched in one gloved hand. \"You are late,\" they "
+     "murmur. \"The tide will not wait for us.\"",
+     ("Ask the figure who sent them", "Demand to see the map", "Walk past without a word"), None),
+    ("The ancient forest closes around you, its twisted branches blocking out the moonlight. Somewhere in the "
+     "distance, a wolf howls, and the hairs on the back of your neck stand on end.",
+     ("Follow the path deeper into the forest", "Return to the village and warn the others",
+      "Climb a tree to get a better view"), "templates/forest background.jpg"),
+    ("As you descend the spiral staircase, the walls grow damp and cold. Water drips from the ceiling, and "
+     "the faint glow of phosphorescent moss lights your way into the depths of the crypt.",
+     ("Descend the stairs", "Light another torch", "Study the carvings"), None),
+    ("The innkeeper eyes you warily before sliding a tankard of ale across the counter. \"Strangers don't "
+     "come through Stillhollow often,\" he says. \"Not since the lighthouse went dark.\"",
+     ("Ask the innkeeper about the lighthouse", "Investigate the strange noise", "Leave quietly"), None),
+    ("The lighthouse beam sweeps across black water, then gutters and dies. On the rocks below, a lantern "
+     "answers it, swinging slowly from side to side.",
+     ("Signal back with your own lantern", "Climb down to the rocks", "Climb the lighthouse stairs"),
+     "templates/lighthouse background.jpg"),
+    ("Your boots sink into the marsh with every step. Mist curls over the reeds, and something large moves "
+     "beneath the still green water just out of sight.",
+     ("Wade toward the ruined chapel", "Stand still and listen", "Turn back to firmer ground"),
+     "templates/Misty Swamp background.jpeg"),
+    ("Your blade meets the creature's claws with a shower of sparks. It recoils, hissing, and for a moment "
+     "you see fear in its eyes before it lunges at you again.",
+     ("Strike again while it is off balance", "Retreat to the doorway", "Try to reason with it"), None),
+    ("The merchant unrolls a worn leather map across the table. \"The treasure lies beyond the mountains,\" "
+     "she whispers, tapping a faded symbol. \"But few who seek it ever return.\"",
+     ("Buy the map", "Ask who else has seen it", "Thank her and leave"), None),
+)
+_PLAYER_TURNS = ("Draw your sword and step forward", "Ask the figure who sent them",
+                 "Search the room for hidden passages", "Follow the path deeper into the forest",
+                 "Ask the innkeeper about the lighthouse", "Wade toward the ruined chapel")
+TURN_SAMPLES = tuple(
+    json.dumps({"r": "dm", "t": text, "c": list(choices), **({"bg": bg} if bg else {}), "ts": 1760000000.0 + i * 37.25},
+               ensure_ascii=False, separators=(",", ":"))
+    for i, (text, choices, bg) in enumerate(_DM_TURNS)
+) + tuple(json.dumps({"r": "player", "t": text, "ts": 1760000020.5 + i * 41.0}, separators=(",", ":"))
+          for i, text in enumerate(_PLAYER_TURNS)) + (
+    '{"r":"offline","t":"You step into the fog-wreathed square."}',
+)
+
+
+# ---------------------------
+# Dictionaries
+# ---------------------------
+def train_dictionary(samples, size: int = 16 * 1024) -> bytes:
+    """Build a preset dictionary from sample texts.
+
+    Frequent word n-grams are ranked by ``count * length`` and concatenated
+    with the most valuable last, since deflate finds nearer matches cheaper.
+    The result is raw content, the only kind both codecs can use: zlib takes
+    it as ``zdict`` and zstd loads it as ``DICT_TYPE_RAWCONTENT``.
+    """
+    counts = Counter()
+    for text in samples:
+        words = re.findall(r"\S+\s*", text)
+        for n in range(1, 7):
+            for i in range(len(words) - n + 1):
+                counts["".join(words[i:i + n])] += 1
+    ranked = sorted(((c * len(g), g) for g, c in counts.items() if c > 1 or len(g) > 24), reverse=True)[:20000]
+    picked, total = [], 0
+    for _, gram in ranked:
+        raw = gram.encode()
+        if total + len(raw) > size:
+            continue
+        if any(gram in p for p in picked):
+            continue
+        picked.append(gram)
+        total += len(raw)
+    picked.reverse()
+    return "".join(picked).encode()[-size:]
+
+
+def dictionary_id(zdict: bytes) -> bytes:
+    return hashlib.sha256(zdict).digest()[:4]
+
+
+def _load_builtin(name: str, did: str) -> bytes:
+    with open(os.path.join(DICT_DIR, name), "rb") as f:
+        zdict = f.read()
+    if dictionary_id(zdict).hex() != did:
+        raise ValueError(f"{name} does not match its id {did}; rows compressed with it would not decode")
+    return zdict
+
+
+_dictionaries = {}
+for _name, _did in BUILTIN_DICTIONARIES:
+    _dictionaries[bytes.fromhex(_did)] = _load_builtin(_name, _did)
+# New rows use the newest shipped dictionary; older ones stay loaded for rows written with them
+BUILTIN_DICTIONARY = _dictionaries[bytes.fromhex(BUILTIN_DICTIONARIES[-1][1])]
+_active_dictionary = BUILTIN_DICTIONARY
+if HISTORY_DICT_PATH:
+    with open(HISTORY_DICT_PATH, "rb") as _f:
+        _active_dictionary = _f.read()[-MAX_DICT_SIZE:]
+    _dictionaries[dictionary_id(_active_dictionary)] = _active_dictionary
+
+
+def register_dictionary(zdict: bytes, activate: bool = False) -> bytes:
+    """Make ``zdict`` available for decoding (and optionally for new writes); returns its id."""
+    global _active_dictionary
+    did = dictionary_id(zdict)
+    _dictionaries[did] = zdict
+    if activate:
+        _active_dictionary = zdict
+    return did
+
+
+# ---------------------------
+# Encode / decode
+# ---------------------------
+_zstd_dicts = {}
+
+
+def _zstd_dict(zdict: bytes):
+    did = dictionary_id(zdict)
+    if did not in _zstd_dicts:
+        d = zstandard.ZstdCompressionDict(zdict, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+        d.precompute_compress(level=ZSTD_LEVEL)
+        _zstd_dicts[did] = d
+    return _zstd_dicts[did]
+
+
+def encode_entry(text: str, codec: str = None):
+    """Encoded form of one history entry: ``str`` (plain) or ``bytes`` (compressed).
+
+    Falls back to plain text when compression would not make it smaller.
+    """
+    codec = codec or HISTORY_CODEC
+    if codec == "plain":
+        return text
+    raw = text.encode("utf-8")
+    zdict = _active_dictionary
+    if codec == "zstd" and zstandard is not None:
+        payload = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=_zstd_dict(zdict)).compress(raw)
+        version = VERSION_ZSTD
+    else:
+        comp = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=zdict)
+        payload = comp.compress(raw) + comp.flush()
+        version = VERSION_ZLIB
+    blob = bytes([version]) + dictionary_id(zdict) + payload
+    return blob if len(blob) < len(raw) else text
+
+
+def decode_entry(value) -> str:
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    version, did, payload = value[0], value[1:5], value[5:]
+    zdict = _dictionaries.get(did)
+    if zdict is None:
+        raise ValueError(f"History entry uses unknown dictionary {did.hex()}; set AIDM_HISTORY_DICT")
+    if version == VERSION_ZLIB:
+        decomp = zlib.decompressobj(-15, zdict=zdict)
+        return (decomp.decompress(payload) + decomp.flush()).decode("utf-8")
+    if version == VERSION_ZSTD:
+        if zstandard is None:
+            raise ValueError("History entry is zstd-compressed; install the zstandard package")
+        return zstandard.ZstdDecompressor(dict_data=_zstd_dict(zdict)).decompress(payload).decode("utf-8")
+    raise ValueError(f"Unknown history entry encoding version {version}")
+
+
+# ---------------------------
+# CLI: train a dictionary from saved games
+# ---------------------------
+def _db_samples(path: str, limit: int):
+    conn = sqlite3.connect(path)
+    try:
+        for (value,) in conn.execute("SELECT entry FROM history_entries ORDER BY campaign_id DESC, seq LIMIT ?",
+                                     (limit,)):
+            yield decode_entry(value)
+    finally:
+        conn.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="History compression tools")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    train = sub.add_parser("train", help="train a dictionary from saved history entries")
+    train.add_argument("--db", required=True)
+    train.add_argument("--out", required=True)
+    train.add_argument("--size", type=int, default=16 * 1024)
+    train.add_argument("--samples", type=int, default=20000)
+    args = ap.parse_args()
+    samples = list(_db_samples(args.db, args.samples)) or list(TURN_SAMPLES)
+    zdict = train_dictionary(samples, min(args.size, MAX_DICT_SIZE))
+    with open(args.out, "wb") as f:
+        f.write(zdict)
+    print(f"Wrote {len(zdict)} byte dictionary {dictionary_id(zdict).hex()} from {len(samples)} entries")
+
+
+if __name__ == "__main__":
+    main()
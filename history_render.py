@@ -0,0 +1,59 @@
+# history_render.py
+"""HTML for the online adventure log, memoized so reruns only build what changed.
+
+Each entry (a ``turns.Turn``) has its fragment built once and cached by
+content.  Only the last ``RECENT_ENTRIES`` entries are emitted as separate
+elements (so the newest DM turn can animate).  Older entries go into a single container, and when
+``PAGE_SIZE`` is set only one page of them is sent at a time, so the page
+stays bounded however long the campaign gets.
+"""
+import os
+from functools import lru_cache
+
+from turns import DM, Turn
+
+RECENT_ENTRIES = int(os.getenv("AIDM_HISTORY_RECENT", "12"))
+# Older entries per page of the "earlier in your adventure" log; 0 shows them all
+PAGE_SIZE = int(os.getenv("AIDM_HISTORY_PAGE_SIZE", "50"))
+
+
+def dm_block_html(text: str, is_new: bool = False):
+    cls = "parchment-box dm-new" if is_new else "parchment-box"
+    return f"<div class='{cls}'><div class='meta'>Dungeon Master</div><div style='white-space:pre-wrap; font-size:1.05em;'>{text.replace(chr(10),'<br>')}</div></div>"
+
+
+@lru_cache(maxsize=4096)
+def entry_html(turn: Turn, is_new: bool = False) -> str:
+    if turn.role == DM:
+        return dm_block_html(turn.display, is_new=is_new)
+    return f"<div style='margin:8px 0; color:#2f2f2f;'><b>Player:</b> {turn.text}</div>"
+
+
+@lru_cache(maxsize=64)
+def block_html(entries: tuple) -> str:
+    """One container holding several entries."""
+    return "<div class='history-older'>" + "".join(entry_html(e) for e in entries) + "</div>"
+
+
+def last_dm_index(history):
+    return next((i for i in range(len(history) - 1, -1, -1) if history[i].role == DM), None)
+
+
+def split_history(history, recent: int = RECENT_ENTRIES):
+    """``(older, recent)`` entries; ``recent`` are rendered one element each."""
+    cut = max(0, len(history) - recent)
+    return history[:cut], history[cut:]
+
+
+def page_count(n_older: int, page_size: int = PAGE_SIZE) -> int:
+    if not page_size:
+        return 1 if n_older else 0
+    return (n_older + page_size - 1) // page_size
+
+
+def older_page(older, page: int = 1, page_size: int = PAGE_SIZE):
+    """Entries of ``page`` (1 = the entries just before the recent ones), oldest first."""
+    if not page_size:
+        return older
+    end = max(0, len(older) - (page - 1) * page_size)
+    return older[max(0, end - page_size):end]
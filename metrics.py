@@ -0,0 +1,275 @@
+# metrics.py
+"""Per-process timing histograms and counters, with Prometheus/JSON-lines export.
+
+``METRICS.span(name)`` times a block into a histogram; ``METRICS.inc(name)``
+bumps a counter and ``METRICS.set_gauge(name, value)`` records a level (a
+queue depth, say).  Histograms use fixed log-spaced buckets (10 µs to ~2 min,
+20% apart), so recording is a bisect plus a few additions under a lock and
+p50/p95/p99 are estimated within a bucket's width, however many samples
+there are.  Everything is aggregated across sessions and reset only when the
+process restarts.
+
+``AIDM_METRICS_PORT`` starts a small HTTP server (once per process) serving
+``/metrics`` in the Prometheus text format and ``/metrics.jsonl`` as one JSON
+object per metric.  ``AIDM_PROFILE_SLOW_MS`` profiles every rerun with
+cProfile and keeps a dump of each one slower than that many milliseconds in
+``AIDM_PROFILE_DIR``.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from paths import DB_FOLDER
+
+METRICS_HOST = os.getenv("AIDM_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("AIDM_METRICS_PORT", "0"))  # 0: no endpoint
+PROFILE_SLOW_MS = float(os.getenv("AIDM_PROFILE_SLOW_MS", "0"))  # 0: no profiling
+PROFILE_DIR = os.getenv("AIDM_PROFILE_DIR") or os.path.join(DB_FOLDER, "profiles")
+PROFILE_KEEP = int(os.getenv("AIDM_PROFILE_KEEP", "50"))
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _bucket_bounds(low: float = 1e-5, high: float = 120.0, factor: float = 1.2) -> tuple:
+    bounds, bound = [], low
+    while bound < high:
+        bounds.append(bound)
+        bound *= factor
+    return tuple(bounds) + (float("inf"),)
+
+
+class Histogram:
+    """Latency histogram (seconds) with log-spaced buckets and quantile estimates."""
+
+    BOUNDS = _bucket_bounds()
+
+    def __init__(self):
+        self.counts = [0] * len(self.BOUNDS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        i = bisect.bisect_left(self.BOUNDS, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Estimated ``q``-quantile, interpolated inside its bucket (0.0 when empty)."""
+        with self._lock:
+            counts, count, top = list(self.counts), self.count, self.max
+        if not count:
+            return 0.0
+        rank, running = q * count, 0
+        for i, n in enumerate(counts):
+            if n and running + n >= rank:
+                low = self.BOUNDS[i - 1] if i else 0.0
+                high = min(self.BOUNDS[i], top)
+                return low + (high - low) * max(rank - running, 0) / n
+            running += n
+        return top
+
+    def snapshot(self) -> dict:
+        snap = {"count": self.count, "sum": self.sum, "max": self.max}
+        for q in QUANTILES:
+            snap[f"p{round(q * 100)}"] = self.quantile(q)
+        return snap
+
+
+class Metrics:
+    """Named counters, gauges and histograms, created on first use."""
+
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self.gauges[name] = value
+
+    def histogram(self, name: str) -> Histogram:
+        hist = self.histograms.get(name)
+        if hist is None:
+            with self._lock:
+                hist = self.histograms.setdefault(name, Histogram())
+        return hist
+
+    def observe(self, name: str, seconds: float):
+        self.histogram(name).observe(seconds)
+
+    @contextmanager
+    def span(self, name: str):
+        """Time the ``with`` block into histogram ``name`` (also when it raises)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(name).observe(time.perf_counter() - started)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters, gauges, histograms = dict(self.counters), dict(self.gauges), dict(self.histograms)
+        return {"counters": counters, "gauges": gauges,
+                "histograms": {name: h.snapshot() for name, h in histograms.items()}}
+
+    def prometheus(self) -> str:
+        """Prometheus text: counters ``aidm_<name>_total``, gauges ``aidm_<name>``, summaries ``..._seconds``."""
+        snap, lines = self.snapshot(), []
+        for name, value in sorted(snap["counters"].items()):
+            lines += [f"# TYPE aidm_{name}_total counter", f"aidm_{name}_total {value}"]
+        for name, value in sorted(snap["gauges"].items()):
+            lines += [f"# TYPE aidm_{name} gauge", f"aidm_{name} {value}"]
+        for name, h in sorted(snap["histograms"].items()):
+            metric = f"aidm_{name}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            lines += [f'{metric}{{quantile="{q}"}} {h[f"p{round(q * 100)}"]:.6f}' for q in QUANTILES]
+            lines += [f"{metric}_sum {h['sum']:.6f}", f"{metric}_count {h['count']}",
+                      f"# TYPE {metric}_max gauge", f"{metric}_max {h['max']:.6f}"]
+        return "\n".join(lines) + "\n"
+
+    def json_lines(self) -> str:
+        """One JSON object per metric, stamped with the current time."""
+        snap, ts = self.snapshot(), round(time.time(), 3)
+        rows = [{"ts": ts, "type": "counter", "name": name, "value": value}
+                for name, value in sorted(snap["counters"].items())]
+        rows += [{"ts": ts, "type": "gauge", "name": name, "value": value}
+                 for name, value in sorted(snap["gauges"].items())]
+        rows += [dict({"ts": ts, "type": "histogram", "name": name}, **h)
+                 for name, h in sorted(snap["histograms"].items())]
+        return "".join(json.dumps(row) + "\n" for row in rows)
+
+
+METRICS = Metrics()
+
+
+# ---------------------------
+# Reruns and slow-rerun profiles
+# ---------------------------
+_rerun = threading.local()  # Streamlit runs each session's script on its own thread
+
+
+def begin_rerun(profile_slow_ms: float = None):
+    """Start timing a script run on this thread (and profiling it when AIDM_PROFILE_SLOW_MS is set)."""
+    _stop_profiler()  # a previous run that died with an exception never reached end_rerun
+    threshold = PROFILE_SLOW_MS if profile_slow_ms is None else profile_slow_ms
+    _rerun.profiler = None
+    if threshold > 0:
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            _rerun.profiler = profiler
+        except ValueError:  # another profiler is already active on this thread
+            pass
+    _rerun.threshold = threshold
+    _rerun.started = time.perf_counter()
+
+
+def end_rerun():
+    """Record the run started by ``begin_rerun``; a no-op if none is open (e.g. in a fragment)."""
+    started = getattr(_rerun, "started", None)
+    if started is None:
+        return
+    _rerun.started = None
+    profiler = _stop_profiler()
+    elapsed = time.perf_counter() - started
+    METRICS.observe("rerun", elapsed)
+    METRICS.inc("reruns")
+    if elapsed * 1000 >= _rerun.threshold > 0:
+        METRICS.inc("slow_reruns")
+        if profiler is not None:
+            dump_profile(profiler, elapsed)
+
+
+def _stop_profiler():
+    profiler = getattr(_rerun, "profiler", None)
+    _rerun.profiler = None
+    if profiler is not None:
+        profiler.disable()
+    return profiler
+
+
+def dump_profile(profiler, elapsed: float, directory: str = None, keep: int = None):
+    """Write ``profiler``'s stats as ``rerun-<ms>ms-<time>.prof``, keeping only the newest ``keep`` dumps."""
+    directory = directory or PROFILE_DIR
+    keep = PROFILE_KEEP if keep is None else keep
+    name = f"rerun-{elapsed * 1000:.0f}ms-{time.strftime('%Y%m%d-%H%M%S')}-{threading.get_ident()}.prof"
+    try:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, name)
+        profiler.dump_stats(path)
+        dumps = sorted((e for e in os.scandir(directory) if e.name.endswith(".prof")),
+                       key=lambda e: e.stat().st_mtime)
+        for old in dumps[:max(len(dumps) - keep, 0)]:
+            os.remove(old.path)
+    except OSError as e:
+        print(f"Could not write profile to {directory}: {e}")
+        return None
+    METRICS.inc("profiles_written")
+    print(f"Slow rerun ({elapsed * 1000:.0f} ms) profiled to {path}")
+    return path
+
+
+# ---------------------------
+# HTTP endpoint
+# ---------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            body, ctype = METRICS.prometheus(), "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/metrics.jsonl":
+            body, ctype = METRICS.json_lines(), "application/x-ndjson"
+        else:
+            self.send_error(404, "Not found")
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_attempted = False
+_server_lock = threading.Lock()
+
+
+def serve_metrics(port: int = None, host: str = None):
+    """Start the metrics endpoint once per process when a port is configured; returns the server or None."""
+    global _server, _attempted
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+    with _server_lock:
+        if not _attempted:
+            _attempted = True
+            try:
+                server = ThreadingHTTPServer((host or METRICS_HOST, port), _MetricsHandler)
+            except OSError as e:
+                print(f"Metrics endpoint unavailable ({e})")
+                return None
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="aidm-metrics", daemon=True).start()
+            print(f"Serving metrics at http://{host or METRICS_HOST}:{port}/metrics")
+            _server = server
+    return _server
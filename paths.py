@@ -0,0 +1,17 @@
+# paths.py
+"""Where the app keeps its files on disk.
+
+Only the standard library is imported here, so any module can take its
+paths from this one without building a save store (and possibly connecting
+to Redis) or loading the history codec as a side effect.
+"""
+import os
+
+DB_FOLDER = os.path.join(os.path.expanduser("~"), ".ai_dungeon_master")
+DB_PATH = os.path.join(DB_FOLDER, "game_data.db")
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def app_path(path: str) -> str:
+    """``path`` relative to the app directory rather than the working directory (absolute ones are kept)."""
+    return os.path.join(APP_DIR, path)
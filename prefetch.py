@@ -0,0 +1,206 @@
+# prefetch.py
+"""Speculative generation of the DM reply for each offered choice.
+
+While the player reads a DM turn, the continuations for all of its choices
+are generated on a small shared thread pool.  Each one is keyed by the state
+the turn would be generated from (history, summary and choice), so a click
+that matches is answered from the finished (or still streaming) job, and
+the other jobs for that session are cancelled.  Speculative calls cost
+tokens, so they are capped per minute for the whole process and skipped
+when the pool is busy.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+PREFETCH_ENABLED = os.getenv("AIDM_PREFETCH", "0") == "1"
+PREFETCH_WORKERS = int(os.getenv("AIDM_PREFETCH_WORKERS", "3"))
+# Speculative completions allowed per minute across all sessions
+PREFETCH_MAX_PER_MIN = int(os.getenv("AIDM_PREFETCH_MAX_PER_MIN", "30"))
+# Unclaimed jobs older than this are dropped
+PREFETCH_TTL = 600
+
+
+class PrefetchCancelled(Exception):
+    """Raised inside a job's stream to stop generating a discarded continuation."""
+
+
+def state_key(history, summary, choice_label=None, free_text=None) -> str:
+    payload = json.dumps([[str(h) for h in history], summary, choice_label, free_text], sort_keys=True,
+                         ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PrefetchJob:
+    def __init__(self, key: str, extra=None):
+        self.key = key
+        self.extra = extra          # caller data kept with the job (e.g. the updated summary)
+        self.partial = ""           # text generated so far
+        self.started = time.perf_counter()
+        self.finished = None        # perf_counter() when generation ended
+        self.cancelled = False
+        self.future = None
+
+    def on_text(self, text: str):
+        if self.cancelled:
+            raise PrefetchCancelled()
+        self.partial = text
+
+    def wait(self, on_text=None, interval: float = 0.05):
+        """Block until the job is done, passing partial text to ``on_text``; returns the generate() result."""
+        while on_text and not self.future.done():
+            if self.partial:
+                on_text(self.partial)
+            time.sleep(interval)
+        return self.future.result()
+
+
+class _Group:
+    """One session's jobs: the keys it asked for and the jobs actually started for them."""
+
+    def __init__(self, created: float, keys):
+        self.created = created
+        self.keys = frozenset(keys)
+        self.jobs = {}                # state key -> PrefetchJob
+        self.skipped = set()          # keys already counted as skipped
+
+    def missing(self):
+        return [key for key in self.keys if key not in self.jobs]
+
+
+class Prefetcher:
+    """Per-process pool of speculative jobs, grouped per session.
+
+    A session has at most one group of jobs (those for its latest DM turn).
+    Asking for a new set of keys discards only the jobs no longer asked for;
+    keys skipped for the cost cap or a busy pool are started on a later call
+    once there is room.  Claiming a job discards the rest of the group.
+    """
+
+    def __init__(self, workers: int = PREFETCH_WORKERS, max_per_min: int = PREFETCH_MAX_PER_MIN):
+        self.workers = max(1, workers)
+        self.max_per_min = max_per_min
+        self._pool = None
+        self._groups = {}             # session id -> _Group
+        self._spent = deque()         # start times of speculative calls in the last minute
+        self._lock = threading.Lock()
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+        self.skipped = 0              # keys not started because of the cost cap or a busy pool
+        self.saved_seconds = 0.0
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="aidm-prefetch")
+        return self._pool
+
+    def _discard(self, jobs):
+        for job in jobs:
+            job.cancelled = True
+            if job.future is not None:
+                job.future.cancel()
+            self.discarded += 1
+
+    def _expire(self, now):
+        for sid, group in list(self._groups.items()):
+            if now - group.created > PREFETCH_TTL:
+                del self._groups[sid]
+                self._discard(group.jobs.values())
+
+    def _has_room(self, now) -> bool:
+        while self._spent and now - self._spent[0] > 60:
+            self._spent.popleft()
+        return len(self._spent) < self.max_per_min and self._in_flight() < self.workers * 2
+
+    def has(self, session_id: str, keys) -> bool:
+        """True if the session's group is for exactly ``keys`` and nothing is left to start now."""
+        with self._lock:
+            group = self._groups.get(session_id)
+            if group is None or group.keys != frozenset(keys):
+                return False
+            return not group.missing() or not self._has_room(time.monotonic())
+
+    def _in_flight(self) -> int:
+        return sum(1 for group in self._groups.values() for j in group.jobs.values()
+                   if j.future is not None and not j.future.done())
+
+    def prefetch(self, session_id: str, specs):
+        """Start jobs for one session; ``specs`` is a list of ``(state_key, generate, extra)``.
+
+        ``generate(on_text)`` runs in the pool and returns ``(text, timing)``.
+        Jobs already running for a key in ``specs`` are kept; only missing keys are started.
+        """
+        now = time.monotonic()
+        keys = {key for key, _, _ in specs}
+        with self._lock:
+            self._expire(now)
+            current = self._groups.get(session_id)
+            if current is not None and current.keys == keys:
+                group = current
+            else:
+                group = self._groups[session_id] = _Group(now, keys)
+                if current is not None:
+                    # keep the jobs that are still wanted, cancel the rest
+                    for key, job in current.jobs.items():
+                        if key in keys:
+                            group.jobs[key] = job
+                    self._discard(job for key, job in current.jobs.items() if key not in keys)
+            for key, generate, extra in specs:
+                if key in group.jobs:
+                    continue
+                if not self._has_room(now):
+                    if key not in group.skipped:
+                        group.skipped.add(key)
+                        self.skipped += 1
+                    continue
+                job = PrefetchJob(key, extra)
+                job.future = self._executor().submit(self._run, job, generate)
+                group.jobs[key] = job
+                self._spent.append(now)
+                self.started += 1
+
+    @staticmethod
+    def _run(job, generate):
+        try:
+            return generate(job.on_text)
+        finally:
+            job.finished = time.perf_counter()
+
+    def take(self, session_id: str, key: str):
+        """Claim the job for ``key`` (or None) and discard the session's other jobs."""
+        with self._lock:
+            group = self._groups.pop(session_id, None)
+            jobs = group.jobs if group else {}
+            job = jobs.pop(key, None)
+            self._discard(jobs.values())
+            if job is None or job.future.cancelled():
+                self.misses += 1
+                return None
+            self.hits += 1
+            # time the job had already been generating before the player clicked
+            self.saved_seconds += (job.finished or time.perf_counter()) - job.started
+            return job
+
+    def drop(self, session_id: str):
+        with self._lock:
+            group = self._groups.pop(session_id, None)
+            if group:
+                self._discard(group.jobs.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            claimed = self.hits + self.misses
+            return {"started": self.started, "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / claimed if claimed else 0.0, "discarded": self.discarded,
+                    "skipped": self.skipped, "saved_seconds": self.saved_seconds,
+                    "in_flight": self._in_flight()}
+
+
+# One pool per process, shared by every session.
+PREFETCHER = Prefetcher()
@@ -0,0 +1,163 @@
+# prompt_builder.py
+"""Token-budgeted DM prompt assembly with a rolling story summary.
+
+Recent history is packed newest-first into ``budget`` tokens.  Anything
+older is folded into a running summary, recomputed at most once every
+``summary_every`` history entries, so long campaigns keep their continuity
+while the prompt size (and so API cost and latency) stays bounded.
+
+History entries may be strings or ``turns.Turn`` records; ``str(entry)``
+is the prompt line either way.
+
+The summary state is a plain dict ``{"text", "upto", "at_len"}``: the
+summary text, how many leading history entries it covers, and the history
+length when it was last updated.  It is kept in session state and saved
+with the campaign.
+"""
+import os
+import re
+
+try:
+    import tiktoken
+except ImportError:  # optional dependency; fall back to a character estimate
+    tiktoken = None
+
+PROMPT_HEADER = ("You are a consistent Dungeon Master running a long-form interactive fantasy adventure. "
+                 "Maintain continuity and character.\n\n")
+PROMPT_FOOTER = ("Now continue the story in vivid detail (a few paragraphs) and then provide exactly 3 clear "
+                 "choices for the player (either numbered or under 'Choices:').")
+PROMPT_BUDGET = int(os.getenv("AIDM_PROMPT_BUDGET", "1200"))
+SUMMARY_EVERY = int(os.getenv("AIDM_SUMMARY_EVERY", "6"))
+SUMMARY_BUDGET = 250
+
+_encoding = None            # tiktoken encoding, loaded on the first count (False if unavailable)
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding("o200k_base") if tiktoken is not None else False
+        except Exception:
+            _encoding = False
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def empty_summary() -> dict:
+    return {"text": "", "upto": 0, "at_len": 0}
+
+
+# ---------------------------
+# Summarizers: (previous_summary_text, new_entries) -> summary_text
+# ---------------------------
+_SENTENCE = re.compile(r"(.+?[.!?])(\s|$)", re.S)
+
+
+def _first_sentence(text: str) -> str:
+    m = _SENTENCE.match(text.strip())
+    return (m.group(1) if m else text.strip()).replace("\n", " ")
+
+
+def extractive_summary(previous: str, entries) -> str:
+    """Cheap summary: first sentence of each DM turn plus the player's actions.
+
+    Oldest sentences are dropped once the summary exceeds SUMMARY_BUDGET tokens.
+    """
+    lines = [ln for ln in previous.split("\n") if ln] if previous else []
+    for entry in map(str, entries):
+        if entry.startswith("DM:"):
+            story = entry[3:].split("\n\nChoices:", 1)[0]
+            lines.append(_first_sentence(story))
+        elif entry.startswith("PLAYER:"):
+            lines.append("Player: " + entry[len("PLAYER:"):].strip())
+        elif entry.strip():
+            lines.append(_first_sentence(entry.split(":", 1)[-1]))
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > SUMMARY_BUDGET:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def make_llm_summarizer(generate):
+    """Summarizer backed by the model; ``generate(prompt) -> text`` (falls back to extractive)."""
+    def summarize(previous: str, entries) -> str:
+        prompt = ("Summarize this fantasy adventure so far in at most 120 words, keeping names, places, "
+                  "items and unresolved threads.\n\n")
+        if previous:
+            prompt += f"Summary so far:\n{previous}\n\n"
+        prompt += "New events:\n" + "\n".join(map(str, entries))
+        try:
+            return generate(prompt).strip() or extractive_summary(previous, entries)
+        except Exception:
+            return extractive_summary(previous, entries)
+    return summarize
+
+
+# ---------------------------
+# Builder
+# ---------------------------
+class PromptBuilder:
+    def __init__(self, budget: int = PROMPT_BUDGET, summary_every: int = SUMMARY_EVERY, summarizer=None):
+        self.budget = budget
+        self.summary_every = max(1, summary_every)
+        self.summarizer = summarizer or extractive_summary
+
+    def build(self, history, summary: dict = None, choice_label=None, free_text=None):
+        """Returns ``(prompt, summary, stats)``; ``summary`` is the (possibly updated) state dict."""
+        summary = dict(summary or empty_summary())
+        if choice_label:
+            action = f"Player chooses: {choice_label}\n"
+        elif free_text:
+            action = f"Player says: {free_text}\n"
+        else:
+            action = ""
+        fixed = count_tokens(PROMPT_HEADER) + count_tokens("History:\n") + count_tokens(action) \
+            + count_tokens(PROMPT_FOOTER)
+        available = self.budget - fixed - count_tokens(summary["text"])
+
+        # Newest entries first, as many as fit (always at least the latest one).
+        start, used = len(history), 0
+        while start > summary["upto"]:
+            cost = count_tokens(str(history[start - 1])) + 1
+            if used + cost > available and start < len(history):
+                break
+            used += cost
+            start -= 1
+
+        # Fold entries that fell out of the window into the summary, at most every N entries.
+        if start > summary["upto"] and len(history) - summary["at_len"] >= self.summary_every:
+            summary = {"text": self.summarizer(summary["text"], history[summary["upto"]:start]),
+                       "upto": start, "at_len": len(history)}
+            # a longer summary may push the window over budget; trim its oldest entries
+            over = fixed + count_tokens(summary["text"]) + used - self.budget
+            while over > 0 and start < len(history) - 1:
+                cost = count_tokens(str(history[start])) + 1
+                used -= cost
+                over -= cost
+                start += 1
+        dropped = max(0, start - summary["upto"])
+
+        prompt = PROMPT_HEADER
+        if summary["text"]:
+            prompt += "Story so far:\n" + summary["text"] + "\n\n"
+        prompt += "History:\n"
+        for h in history[start:]:
+            prompt += str(h) + "\n"
+        prompt += action + PROMPT_FOOTER
+        stats = {
+            "prompt_tokens": count_tokens(prompt),
+            "history_entries": len(history) - start,
+            "history_tokens": used,
+            "summary_tokens": count_tokens(summary["text"]),
+            "summarized_entries": summary["upto"],
+            "dropped_entries": dropped,
+        }
+        return prompt, summary, stats
@@ -0,0 +1,223 @@
+# redis_store.py
+"""Saved games in Redis, so every app replica sees the same saves.
+
+Layout (all keys under ``prefix``, default ``aidm:``)::
+
+    next_id                  INCR counter for campaign ids
+    campaign:<id>            hash: campaign_key, player_name, created_at, saved_at, mode,
+                             offline_story_id, offline_segment, entry_count, summary, ...
+    entries:<id>             list of history entries (append-only, like history_entries)
+    key:<campaign_key>       campaign id
+    saves                    sorted set of ids scored by saved_at
+    saves:player:<name>      the same, per player
+
+Ids are zero-padded in the sorted sets so equal ``saved_at`` scores still
+order by id and keyset pages work as in SQLite.  A save reads the campaign
+under ``WATCH`` and writes in one ``MULTI``/``EXEC``; if another replica
+changed it in between, the save is retried.  Entries are stored through
+history_codec (tagged ``t:`` plain / ``c:`` compressed).
+
+Needs the optional ``redis`` package; ``AIDM_REDIS_POOL`` caps connections
+per process (default 16; callers wait for a free one).  Anything with the
+redis-py command API works as ``client``, e.g. benchmarks/fake_redis.py.
+"""
+import os
+import time
+
+try:
+    import redis
+except ImportError:  # optional dependency
+    redis = None
+
+from history_codec import HISTORY_CODEC, decode_entry, encode_entry
+from save_store import SaveBackend, entry_text, new_campaign_key
+
+REDIS_POOL_SIZE = int(os.getenv("AIDM_REDIS_POOL", "16"))
+REDIS_TIMEOUT = float(os.getenv("AIDM_REDIS_TIMEOUT_S", "5"))
+MAX_RETRIES = 20
+FIELDS = ("campaign_key", "player_name", "created_at", "saved_at", "mode", "offline_story_id", "offline_segment",
+          "entry_count", "summary", "summary_upto", "summary_at_len")
+
+
+def _member(campaign_id: int) -> str:
+    return f"{campaign_id:015d}"
+
+
+def _text(value):
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def _pack(entry, codec: str) -> bytes:
+    value = encode_entry(entry_text(entry), codec)
+    return b"t:" + value.encode("utf-8") if isinstance(value, str) else b"c:" + value
+
+
+def _unpack(value: bytes) -> str:
+    return value[2:].decode("utf-8") if value[:2] == b"t:" else decode_entry(value[2:])
+
+
+class RedisSaveStore(SaveBackend):
+    def __init__(self, client, prefix: str = "aidm:", codec: str = HISTORY_CODEC, watch_errors=()):
+        self.client = client
+        self.prefix = prefix
+        self.codec = codec
+        # raised by EXEC when a watched key changed; redis-py's, plus whatever a fake client raises
+        self.watch_errors = tuple(watch_errors) + ((redis.WatchError,) if redis is not None else ())
+
+    @classmethod
+    def from_url(cls, url: str, pool_size: int = REDIS_POOL_SIZE, **kwargs):
+        if redis is None:
+            raise ImportError("the redis package is not installed")
+        pool = redis.BlockingConnectionPool.from_url(url, max_connections=pool_size, timeout=REDIS_TIMEOUT,
+                                                     socket_timeout=REDIS_TIMEOUT)
+        return cls(redis.Redis(connection_pool=pool), **kwargs)
+
+    def _k(self, *parts) -> str:
+        return self.prefix + ":".join(str(p) for p in parts)
+
+    def close(self):
+        self.client.close()
+
+    # ---------------------------
+    # Saves
+    # ---------------------------
+    def save(self, campaign_key: str, player_name: str, mode, history, offline_story_id, offline_segment,
+             expected_count: int = None, summary: dict = None) -> dict:
+        return self.save_many([{"campaign_key": campaign_key, "player_name": player_name, "mode": mode,
+                                "history": history, "offline_story_id": offline_story_id,
+                                "offline_segment": offline_segment, "expected_count": expected_count,
+                                "summary": summary}])[0]
+
+    def save_many(self, saves) -> list:
+        """All saves in one ``MULTI``/``EXEC``, retried as a whole if a watched campaign changed."""
+        new_ids = []  # ids handed out so far; a retry reuses them rather than burning new ones
+        for _ in range(MAX_RETRIES):
+            with self.client.pipeline(transaction=True) as pipe:
+                try:
+                    writes, results = self._plan(pipe, saves, new_ids)
+                    pipe.multi()
+                    for write in writes:
+                        write(pipe)
+                    pipe.execute()
+                    return results
+                except self.watch_errors:
+                    continue
+        raise RuntimeError(f"save gave up after {MAX_RETRIES} conflicting writes")
+
+    def _plan(self, pipe, saves, new_ids):
+        """Read (under WATCH) what each save needs; returns the write callbacks and the results.
+
+        New campaigns take their ids from ``new_ids`` in order; only ids beyond it are allocated
+        (and appended), so a retried plan does not INCR ``next_id`` again.
+        """
+        writes, results, staged = [], [], {}  # staged: key -> [id, count, player] within the batch
+        used = 0
+        for s in saves:
+            saved_at = s.get("saved_at") or time.time()
+            key, history = s["campaign_key"], s["history"]
+            row = staged.get(key) or self._lookup(pipe, key)
+            if row and s.get("expected_count") is not None and row[1] != s["expected_count"]:
+                # someone else appended to this campaign since it was loaded: fork
+                key, row = new_campaign_key(), None
+            new = row is None
+            if new:
+                if used == len(new_ids):
+                    new_ids.append(int(self.client.incr(self._k("next_id"))))
+                row = [new_ids[used], 0, None]
+                used += 1
+            campaign_id, stored, old_player = row
+            fields = {"player_name": s["player_name"] or "", "saved_at": saved_at, "mode": s["mode"] or "",
+                      "offline_story_id": s["offline_story_id"] or "", "offline_segment": s["offline_segment"] or 0,
+                      "entry_count": len(history)}
+            if new:
+                fields.update(campaign_key=key, created_at=saved_at)
+            if s.get("summary") is not None:
+                summary = s["summary"]
+                fields.update(summary=summary["text"], summary_upto=summary["upto"],
+                              summary_at_len=summary["at_len"])
+            writes.append(self._writer(campaign_id, key, stored, old_player, history, fields))
+            staged[key] = [campaign_id, len(history), fields["player_name"]]
+            results.append({"id": campaign_id, "campaign_key": key, "entry_count": len(history)})
+        return writes, results
+
+    def _lookup(self, pipe, campaign_key: str):
+        """``[id, entry_count, player_name]`` of a stored campaign (watched until EXEC), or None."""
+        pipe.watch(self._k("key", campaign_key))
+        campaign_id = pipe.get(self._k("key", campaign_key))
+        if campaign_id is None:
+            return None
+        campaign_id = int(campaign_id)
+        pipe.watch(self._k("campaign", campaign_id))
+        count, player = pipe.hmget(self._k("campaign", campaign_id), ["entry_count", "player_name"])
+        return [campaign_id, int(count or 0), _text(player) or ""]
+
+    def _writer(self, campaign_id, key, stored, old_player, history, fields):
+        def write(pipe):
+            lkey, member, saved_at = self._k("entries", campaign_id), _member(campaign_id), fields["saved_at"]
+            if not history:
+                pipe.delete(lkey)
+            elif len(history) < stored:
+                pipe.ltrim(lkey, 0, len(history) - 1)
+            elif len(history) > stored:
+                pipe.rpush(lkey, *(_pack(e, self.codec) for e in history[stored:]))
+            if "campaign_key" in fields:
+                pipe.set(self._k("key", key), campaign_id)
+            if old_player is not None and old_player != fields["player_name"]:
+                pipe.zrem(self._k("saves", "player", old_player), member)
+            pipe.hset(self._k("campaign", campaign_id), mapping=fields)
+            pipe.zadd(self._k("saves"), {member: saved_at})
+            pipe.zadd(self._k("saves", "player", fields["player_name"]), {member: saved_at})
+        return write
+
+    # ---------------------------
+    # Listing, loading, deleting
+    # ---------------------------
+    def list_saves_page(self, player_name: str = None, after=None, limit: int = 10):
+        index = self._k("saves", "player", player_name) if player_name else self._k("saves")
+        if after is None:
+            members = self.client.zrevrangebyscore(index, "+inf", "-inf", start=0, num=limit + 1, withscores=True)
+        else:
+            # ties on saved_at come first (ordered by id), then strictly older saves
+            saved_at, last_id = after
+            ties = self.client.zcount(index, saved_at, saved_at)
+            members = self.client.zrevrangebyscore(index, saved_at, "-inf", start=0, num=ties + limit + 1,
+                                                   withscores=True)
+            members = [(m, score) for m, score in members if score < saved_at or int(m) < last_id][:limit + 1]
+        pipe = self.client.pipeline(transaction=False)
+        for member, _ in members:
+            pipe.hget(self._k("campaign", int(member)), "player_name")
+        names = pipe.execute()
+        rows = [(int(m), _text(name), score) for (m, score), name in zip(members, names) if name is not None]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1][2], rows[-1][0])
+        return rows, next_cursor
+
+    def count_saves(self, player_name: str = None) -> int:
+        return self.client.zcard(self._k("saves", "player", player_name) if player_name else self._k("saves"))
+
+    def load(self, campaign_id: int):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hmget(self._k("campaign", campaign_id), list(FIELDS))
+        pipe.lrange(self._k("entries", campaign_id), 0, -1)
+        values, entries = pipe.execute()
+        row = dict(zip(FIELDS, (_text(v) for v in values)))
+        if row["campaign_key"] is None:
+            return None
+        count = int(row["entry_count"] or 0)
+        return {"campaign_key": row["campaign_key"], "player_name": row["player_name"], "mode": row["mode"] or None,
+                "history": [_unpack(e) for e in entries[:count]], "offline_story_id": row["offline_story_id"] or None,
+                "offline_segment": int(row["offline_segment"] or 0), "entry_count": count,
+                "summary": {"text": row["summary"] or "", "upto": int(row["summary_upto"] or 0),
+                            "at_len": int(row["summary_at_len"] or 0)}}
+
+    def delete(self, campaign_id: int):
+        key, player = self.client.hmget(self._k("campaign", campaign_id), ["campaign_key", "player_name"])
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(self._k("campaign", campaign_id), self._k("entries", campaign_id))
+        if key is not None:
+            pipe.delete(self._k("key", _text(key)))
+        pipe.zrem(self._k("saves"), _member(campaign_id))
+        pipe.zrem(self._k("saves", "player", _text(player) or ""), _member(campaign_id))
+        pipe.execute()
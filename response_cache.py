@@ -0,0 +1,182 @@
+# response_cache.py
+"""Persistent cache of DM completions, keyed by prompt, model and parameters.
+
+Stored in ``response_cache.db`` next to ``game_data.db``, with a TTL and a
+size budget (least recently used rows are evicted first).  ``AIDM_RESPONSE_CACHE``
+selects the mode:
+
+- ``on`` (default): call sites that ask for it are cached (the opening turn
+  always; later turns when ``AIDM_CACHE_TURNS=1``).
+- ``record``: every call site is cached, e.g. to record a session.
+- ``replay``: answers come only from the cache and a miss raises
+  ``CacheMiss`` -- no network access, so recorded sessions replay
+  deterministically.
+- ``off``: no caching.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from paths import DB_FOLDER
+from sqlite_pool import ConnectionPool
+
+CACHE_PATH = os.getenv("AIDM_RESPONSE_CACHE_PATH") or os.path.join(DB_FOLDER, "response_cache.db")
+CACHE_MODE = os.getenv("AIDM_RESPONSE_CACHE", "on").strip().lower()
+CACHE_TURNS = os.getenv("AIDM_CACHE_TURNS", "0") == "1"
+CACHE_TTL = float(os.getenv("AIDM_RESPONSE_CACHE_TTL_S", str(7 * 24 * 3600)))
+CACHE_MAX_BYTES = int(float(os.getenv("AIDM_RESPONSE_CACHE_MB", "50")) * 1024 * 1024)
+EVICT_BATCH = 64  # least recently used rows read per eviction query
+
+
+class CacheMiss(LookupError):
+    """Raised in replay mode when a prompt was never recorded."""
+
+
+def cache_key(prompt: str, **params) -> str:
+    payload = json.dumps({"prompt": prompt, **params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path: str = CACHE_PATH, mode: str = CACHE_MODE, ttl: float = CACHE_TTL,
+                 max_bytes: int = CACHE_MAX_BYTES):
+        self.path = path
+        self.mode = mode
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._pool = ConnectionPool(path, self._setup_connection)
+        self._lock = threading.Lock()
+        self._bytes = None  # running total, read from the table on first write
+
+    @property
+    def replay_only(self) -> bool:
+        return self.mode == "replay"
+
+    def enabled_for(self, cacheable: bool) -> bool:
+        """Whether a call site (``cacheable`` = its own opt-in) goes through the cache."""
+        if self.mode in ("record", "replay"):
+            return True
+        return self.mode == "on" and cacheable
+
+    def connection(self):
+        """Borrow a pooled connection for a ``with`` block (see sqlite_pool.py)."""
+        return self._pool.connection()
+
+    @staticmethod
+    def _setup_connection(conn: sqlite3.Connection):
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            created_at REAL,
+            last_used REAL,
+            size INTEGER,
+            text TEXT
+        )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used)")
+
+    def get(self, key: str):
+        with self.connection() as conn:
+            return self._get(conn, key)
+
+    def _get(self, conn, key: str):
+        row = conn.execute("SELECT created_at, text FROM responses WHERE key=?", (key,)).fetchone()
+        now = time.time()
+        if row and (self.replay_only or now - row[0] <= self.ttl):
+            conn.execute("UPDATE responses SET last_used=? WHERE key=?", (now, key))
+            with self._lock:
+                self.hits += 1
+            return row[1]
+        if row:
+            self._delete(conn, key)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, text: str):
+        if self.replay_only or text is None:
+            return
+        with self.connection() as conn:
+            self._put(conn, key, text)
+
+    def _put(self, conn, key: str, text: str):
+        size = len(text.encode("utf-8"))
+        now = time.time()
+        added = evicted = freed = 0
+        loaded = False
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            old = conn.execute("SELECT size FROM responses WHERE key=?", (key,)).fetchone()
+            conn.execute("INSERT OR REPLACE INTO responses (key, created_at, last_used, size, text) VALUES (?,?,?,?,?)",
+                         (key, now, now, size, text))
+            with self._lock:
+                if self._bytes is None:
+                    self._bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                    loaded = True
+                else:
+                    added = size - (old[0] if old else 0)
+                    self._bytes += added
+                over = self._bytes - self.max_bytes
+            if over > 0:
+                evicted, freed = self._evict(conn, over)
+                with self._lock:
+                    self.evictions += evicted
+                    self._bytes -= freed
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            # the table is back as it was, so the running totals go back too
+            with self._lock:
+                if loaded:
+                    self._bytes = None
+                elif self._bytes is not None:
+                    self._bytes -= added - freed
+                self.evictions -= evicted
+            raise
+
+    def _evict(self, conn, over: int):
+        """Drop expired rows, then least recently used ones, until ``over`` bytes are freed.
+
+        Returns ``(rows, bytes)`` evicted; the caller updates the running totals.
+        """
+        cutoff = time.time() - self.ttl
+        freed = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses WHERE created_at < ?",
+                             (cutoff,)).fetchone()[0]
+        evicted = conn.execute("DELETE FROM responses WHERE created_at < ?", (cutoff,)).rowcount
+        while freed < over:
+            # a bounded batch at a time, never the whole table
+            rows = conn.execute("SELECT key, size FROM responses ORDER BY last_used LIMIT ?",
+                                (EVICT_BATCH,)).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if freed >= over:
+                    break
+                conn.execute("DELETE FROM responses WHERE key=?", (key,))
+                freed += size
+                evicted += 1
+        return evicted, freed
+
+    def _delete(self, conn, key: str):
+        size = conn.execute("SELECT size FROM responses WHERE key=?", (key,)).fetchone()
+        conn.execute("DELETE FROM responses WHERE key=?", (key,))
+        with self._lock:
+            if size and self._bytes is not None:
+                self._bytes -= size[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"mode": self.mode, "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "bytes": self._bytes}
+
+
+# One cache per process.
+RESPONSE_CACHE = ResponseCache()
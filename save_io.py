@@ -0,0 +1,291 @@
+# save_io.py
+"""Streaming export and import of saved games as JSON Lines.
+
+An export is a header line followed, for every campaign, by one
+``campaign`` line and one ``entry`` line per history entry::
+
+    {"type": "export", "format": "aidm-saves", "version": 1, "exported_at": ...}
+    {"type": "campaign", "id": 7, "campaign_key": "...", "player_name": "Aria", ..., "entry_count": 2}
+    {"type": "entry", "campaign_key": "...", "seq": 0, "entry": "..."}
+    {"type": "entry", "campaign_key": "...", "seq": 1, "entry": "..."}
+
+Entries are written decoded (see history_codec.py), so an export loads into
+a store using any codec.  Neither side ever holds a whole history: export
+reads campaigns by id, and each campaign's entries by sequence number, in
+chunks of ``--chunk`` rows, each fetched by one short query before it is
+written out; import writes in batched transactions of ``--batch`` lines.
+
+Both are restartable.  ``export --resume`` keeps the complete campaigns
+already in the output file and continues after the last one.  Import is
+idempotent: campaigns are matched by ``campaign_key`` and entries by
+sequence number, so re-running an interrupted import finishes it without
+duplicating anything (``--skip-lines`` jumps over what was already done).
+
+    python save_io.py export --out saves.jsonl.gz --player Aria --since 2026-01-01
+    python save_io.py import --db other.db saves.jsonl.gz
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from history_codec import decode_entry, encode_entry
+from paths import DB_PATH
+from save_store import SaveStore
+
+FORMAT = "aidm-saves"
+FORMAT_VERSION = 1
+CAMPAIGN_FIELDS = ("campaign_key", "player_name", "created_at", "saved_at", "mode", "offline_story_id",
+                   "offline_segment", "entry_count", "summary", "summary_upto", "summary_at_len")
+
+
+# ---------------------------
+# Export
+# ---------------------------
+def export_saves(store: SaveStore, player: str = None, since: float = None, until: float = None,
+                 after_id: int = 0, chunk: int = 500):
+    """Yield export records (dicts), campaigns in id order after ``after_id``."""
+    where, args = ["id > ?"], []
+    if player:
+        where.append("player_name = ?")
+        args.append(player)
+    if since is not None:
+        where.append("saved_at >= ?")
+        args.append(since)
+    if until is not None:
+        where.append("saved_at < ?")
+        args.append(until)
+    sql = f"SELECT id, {', '.join(CAMPAIGN_FIELDS)} FROM campaigns WHERE {' AND '.join(where)} ORDER BY id LIMIT ?"
+    with store.connection() as conn:
+        last = after_id
+        while True:
+            # every query is fetched in full before anything is yielded, so no read transaction stays
+            # open while the caller writes, and none pins the WAL for long
+            rows = conn.execute(sql, [last] + args + [chunk]).fetchall()
+            for row in rows:
+                campaign = {"type": "campaign", "id": row[0], **dict(zip(CAMPAIGN_FIELDS, row[1:]))}
+                yield campaign
+                seq = 0
+                while seq < campaign["entry_count"]:
+                    entries = conn.execute("SELECT seq, entry FROM history_entries WHERE campaign_id=? AND seq>=? "
+                                           "AND seq<? ORDER BY seq LIMIT ?",
+                                           (row[0], seq, campaign["entry_count"], chunk)).fetchall()
+                    if not entries:
+                        break
+                    for seq, value in entries:
+                        yield {"type": "entry", "campaign_key": campaign["campaign_key"], "seq": seq,
+                               "entry": decode_entry(value)}
+                    seq += 1
+            if len(rows) < chunk:
+                return
+            last = rows[-1][0]
+
+
+def resume_point(path: str):
+    """``(offset, last_id)`` just after the last complete campaign in an earlier export (``(0, 0)`` if none)."""
+    offset = last_id = 0
+    pending = None  # [id, entries expected, entries seen]
+    with open(path, "rb") as f:
+        pos = 0
+        for line in f:
+            pos += len(line)
+            if not line.endswith(b"\n"):
+                break  # torn last line
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                break
+            if rec.get("type") == "export" and pending is None:
+                offset = pos
+            elif rec.get("type") == "campaign":
+                pending = [rec["id"], rec["entry_count"], 0]
+            elif rec.get("type") == "entry" and pending is not None:
+                pending[2] += 1
+            else:
+                break
+            if pending is not None and pending[2] == pending[1]:
+                offset, last_id = pos, pending[0]
+    return offset, last_id
+
+
+def write_export(store: SaveStore, out: str, resume: bool = False, progress_every: int = 10000, **filters) -> dict:
+    """Write an export to ``out`` ("-" for stdout, ``.gz`` for gzip); returns counts."""
+    after_id, mode = 0, "w"
+    if resume and out != "-" and os.path.exists(out):
+        if out.endswith(".gz"):
+            raise ValueError("--resume needs an uncompressed output file")
+        offset, after_id = resume_point(out)
+        with open(out, "r+b") as f:
+            f.truncate(offset)
+        mode = "a" if offset else "w"
+    f = _open(out, mode)
+    counts = {"campaigns": 0, "entries": 0, "last_id": after_id}
+    try:
+        if mode == "w":
+            f.write(json.dumps({"type": "export", "format": FORMAT, "version": FORMAT_VERSION,
+                                "exported_at": time.time()}) + "\n")
+        for rec in export_saves(store, after_id=after_id, **filters):
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            if rec["type"] == "campaign":
+                counts["campaigns"] += 1
+                counts["last_id"] = rec["id"]
+            else:
+                counts["entries"] += 1
+                if progress_every and counts["entries"] % progress_every == 0:
+                    print(f"exported {counts['campaigns']} campaigns, {counts['entries']} entries "
+                          f"(last id {counts['last_id']})", file=sys.stderr)
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    return counts
+
+
+# ---------------------------
+# Import
+# ---------------------------
+def import_saves(store: SaveStore, lines, batch: int = 1000, skip_lines: int = 0, progress_every: int = 100000) -> dict:
+    """Load export records from an iterable of JSON lines into ``store``; returns counts.
+
+    A campaign whose key already exists is merged: missing entries are
+    added, and its details are replaced only if the imported copy was saved
+    later.  A campaign cut off by an interrupted run keeps ``entry_count``
+    0 until a later run has written its last entry.
+    """
+    with store.connection() as conn:
+        return _import_lines(conn, store.codec, lines, batch, skip_lines, progress_every)
+
+
+def _import_lines(conn, codec: str, lines, batch: int, skip_lines: int, progress_every: int) -> dict:
+    counts = {"lines": 0, "campaigns": 0, "entries": 0}
+    current = None  # (campaign row id, header record)
+    skipped_header = None  # the campaign the first unskipped line may belong to
+    pending = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for number, line in enumerate(lines, start=1):
+            if number <= skip_lines:
+                if line.strip():
+                    rec = json.loads(line)
+                    if rec.get("type") == "campaign":
+                        skipped_header = rec
+                continue
+            if skipped_header is not None:
+                current, skipped_header = (_upsert_campaign(conn, skipped_header), skipped_header), None
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            kind = rec.get("type")
+            if kind == "export":
+                if rec.get("format") != FORMAT or rec.get("version", 0) > FORMAT_VERSION:
+                    raise ValueError(f"line {number}: not a supported {FORMAT} export")
+            elif kind == "campaign":
+                _finish_campaign(conn, current)
+                current = (_upsert_campaign(conn, rec), rec)
+                counts["campaigns"] += 1
+            elif kind == "entry":
+                if current is None or rec["campaign_key"] != current[1]["campaign_key"]:
+                    raise ValueError(f"line {number}: entry outside its campaign")
+                conn.execute("INSERT OR IGNORE INTO history_entries (campaign_id, seq, entry) VALUES (?,?,?)",
+                             (current[0], rec["seq"], encode_entry(rec["entry"], codec)))
+                counts["entries"] += 1
+            else:
+                raise ValueError(f"line {number}: unknown record type {kind!r}")
+            counts["lines"] = number
+            pending += 1
+            if pending >= batch:
+                conn.execute("COMMIT")
+                conn.execute("BEGIN IMMEDIATE")
+                pending = 0
+            if progress_every and number % progress_every == 0:
+                print(f"imported {number} lines ({counts['campaigns']} campaigns, {counts['entries']} entries)",
+                      file=sys.stderr)
+        _finish_campaign(conn, current)
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+    return counts
+
+
+def _upsert_campaign(conn, rec) -> int:
+    row = conn.execute("SELECT id FROM campaigns WHERE campaign_key=?", (rec["campaign_key"],)).fetchone()
+    if row:
+        return row[0]
+    cur = conn.execute(
+        "INSERT INTO campaigns (campaign_key, player_name, created_at, saved_at, mode, offline_story_id, "
+        "offline_segment, entry_count, summary, summary_upto, summary_at_len) VALUES (?,?,?,?,?,?,?,0,?,?,?)",
+        (rec["campaign_key"], rec["player_name"], rec["created_at"], rec["saved_at"], rec["mode"],
+         rec["offline_story_id"], rec["offline_segment"], rec["summary"], rec["summary_upto"] or 0,
+         rec["summary_at_len"] or 0))
+    return cur.lastrowid
+
+
+def _finish_campaign(conn, current):
+    if current is None:
+        return
+    campaign_id, rec = current
+    # entries of a newer local copy stay; a shorter local copy grows to the imported length
+    conn.execute("UPDATE campaigns SET entry_count=MAX(entry_count, ?) WHERE id=?", (rec["entry_count"], campaign_id))
+    conn.execute(
+        "UPDATE campaigns SET player_name=?, saved_at=?, mode=?, offline_story_id=?, offline_segment=?, "
+        "summary=?, summary_upto=?, summary_at_len=? WHERE id=? AND (saved_at IS NULL OR saved_at<=?)",
+        (rec["player_name"], rec["saved_at"], rec["mode"], rec["offline_story_id"], rec["offline_segment"],
+         rec["summary"], rec["summary_upto"] or 0, rec["summary_at_len"] or 0, campaign_id, rec["saved_at"]))
+
+
+# ---------------------------
+# CLI
+# ---------------------------
+def _open(path: str, mode: str):
+    if path == "-":
+        return sys.stdout if "w" in mode or "a" in mode else sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def parse_time(value: str) -> float:
+    """Epoch seconds, or an ISO date/datetime in local time."""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Export and import saved games as JSON Lines")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    exp = sub.add_parser("export", help="stream saves to a JSON Lines file")
+    exp.add_argument("--db", default=DB_PATH)
+    exp.add_argument("--out", default="-", help="output file (.gz to compress; - for stdout)")
+    exp.add_argument("--player", help="only this player's saves")
+    exp.add_argument("--since", type=parse_time, help="saved at or after (ISO date or epoch seconds)")
+    exp.add_argument("--until", type=parse_time, help="saved before (ISO date or epoch seconds)")
+    exp.add_argument("--chunk", type=int, default=500, help="campaigns and entries fetched per query")
+    exp.add_argument("--resume", action="store_true", help="continue an interrupted export into --out")
+    imp = sub.add_parser("import", help="load saves from a JSON Lines file")
+    imp.add_argument("path", help="export file (.gz is decompressed; - for stdin)")
+    imp.add_argument("--db", default=DB_PATH)
+    imp.add_argument("--batch", type=int, default=1000, help="lines written per transaction")
+    imp.add_argument("--skip-lines", type=int, default=0, help="lines already imported by an interrupted run")
+    args = ap.parse_args()
+    store = SaveStore(path=args.db)
+    started = time.perf_counter()
+    if args.cmd == "export":
+        counts = write_export(store, args.out, resume=args.resume, player=args.player, since=args.since,
+                              until=args.until, chunk=args.chunk)
+    else:
+        f = _open(args.path, "r")
+        try:
+            counts = import_saves(store, f, batch=args.batch, skip_lines=args.skip_lines)
+        finally:
+            if f is not sys.stdin:
+                f.close()
+    print(f"{args.cmd}: {counts} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
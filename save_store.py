@@ -0,0 +1,348 @@
+# save_store.py
+"""Saved games (campaigns with append-only transcripts) and where they are stored.
+
+``SaveBackend`` is the abstract base class for what the app needs from a
+store.  ``SaveStore`` keeps saves in a local SQLite file and is the default;
+``AIDM_SAVE_BACKEND`` can name another one, e.g. ``redis://host:6379/0``
+(redis_store.py) so several app replicas share one set of saves, or
+``sqlite:///path/to/game_data.db``.
+
+SQLite connections come from a small pool shared by all threads (see
+sqlite_pool.py; Streamlit starts a new script thread for most reruns), each
+opened once in WAL mode with a busy timeout so readers never wait for writers
+and concurrent writers queue instead of failing.  Writes run in
+explicit ``BEGIN IMMEDIATE`` transactions; ``save_many`` batches several
+saves into one commit.  The schema version lives in ``PRAGMA user_version``
+and migrations run once, when the first connection of the process opens.
+"""
+import abc
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from history_codec import HISTORY_CODEC, decode_entry, encode_entry
+from paths import DB_PATH
+from sqlite_pool import ConnectionPool
+
+BUSY_TIMEOUT_MS = int(os.getenv("AIDM_DB_BUSY_TIMEOUT_MS", "5000"))
+
+# Bump SCHEMA_VERSION (PRAGMA user_version) when adding a migration step.
+SCHEMA_VERSION = 3
+SCHEMA = (
+    # One row per campaign; its transcript lives in history_entries and is
+    # only ever appended to, so a save writes just the new entries.
+    """
+    CREATE TABLE IF NOT EXISTS campaigns (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        campaign_key TEXT UNIQUE,
+        player_name TEXT,
+        created_at REAL,
+        saved_at REAL,
+        mode TEXT,
+        offline_story_id TEXT,
+        offline_segment INTEGER,
+        entry_count INTEGER NOT NULL DEFAULT 0,
+        summary TEXT,
+        summary_upto INTEGER NOT NULL DEFAULT 0,
+        summary_at_len INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS history_entries (
+        campaign_id INTEGER NOT NULL,
+        seq INTEGER NOT NULL,
+        entry NOT NULL,  -- TEXT (plain) or BLOB (history_codec)
+        PRIMARY KEY (campaign_id, seq)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_campaigns_saved_at ON campaigns(saved_at)",
+    "CREATE INDEX IF NOT EXISTS idx_campaigns_player_saved_at ON campaigns(player_name, saved_at)",
+)
+
+
+def new_campaign_key() -> str:
+    return uuid.uuid4().hex
+
+
+def entry_text(entry) -> str:
+    """Stored form of a history entry: strings as they are, ``turns.Turn`` records as JSON."""
+    return entry if isinstance(entry, str) else entry.dumps()
+
+
+class SaveBackend(abc.ABC):
+    """Interface of a save store; campaign ids are integers, ``saved_at`` is epoch seconds."""
+
+    @abc.abstractmethod
+    def save(self, campaign_key: str, player_name: str, mode, history, offline_story_id, offline_segment,
+             expected_count: int = None, summary: dict = None) -> dict:
+        """Create or extend a campaign; returns ``{"id", "campaign_key", "entry_count"}``.
+
+        Only entries not stored yet are written.  If the stored entry count
+        differs from ``expected_count``, the history is saved as a new
+        campaign instead.
+        """
+
+    def save_many(self, saves) -> list:
+        """Apply several saves (dicts with the ``save`` arguments), in one transaction where the store can."""
+        return [self.save(s["campaign_key"], s["player_name"], s["mode"], s["history"], s["offline_story_id"],
+                          s["offline_segment"], s.get("expected_count"), s.get("summary")) for s in saves]
+
+    def list_saves(self):
+        """All ``(id, player_name, saved_at)`` rows, most recently saved first."""
+        rows, after = [], None
+        while True:
+            page, after = self.list_saves_page(after=after, limit=500)
+            rows += page
+            if after is None:
+                return rows
+
+    @abc.abstractmethod
+    def list_saves_page(self, player_name: str = None, after=None, limit: int = 10):
+        """``(rows, next_cursor)``: one page of ``(id, player_name, saved_at)``, newest first."""
+
+    @abc.abstractmethod
+    def count_saves(self, player_name: str = None) -> int:
+        """How many campaigns there are (of ``player_name``, if given)."""
+
+    @abc.abstractmethod
+    def load(self, campaign_id: int):
+        """The campaign as a dict (history decoded), or None."""
+
+    @abc.abstractmethod
+    def delete(self, campaign_id: int):
+        """Remove the campaign and its history; unknown ids are ignored."""
+
+    def close(self):
+        pass
+
+
+class SaveStore(SaveBackend):
+    def __init__(self, path: str = DB_PATH, busy_timeout_ms: int = BUSY_TIMEOUT_MS, codec: str = HISTORY_CODEC):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        # How new history entries are stored (see history_codec.py); any row decodes
+        self.codec = codec
+        self._pool = ConnectionPool(path, self._setup_connection, timeout=busy_timeout_ms / 1000)
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    # ---------------------------
+    # Connections
+    # ---------------------------
+    def connection(self):
+        """Borrow a pooled connection for a ``with`` block (the schema is created on first use)."""
+        return self._pool.connection()
+
+    def _setup_connection(self, conn: sqlite3.Connection):
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        self._ensure_schema(conn)
+
+    def _ensure_schema(self, conn):
+        if self._schema_ready:
+            return
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            with self.transaction(conn):
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                for stmt in SCHEMA:
+                    conn.execute(stmt)
+                if version < 2:
+                    self._migrate_legacy_saves(conn)
+                if version < 3:
+                    self._add_summary_columns(conn)
+                conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+            self._schema_ready = True
+
+    @staticmethod
+    def _add_summary_columns(conn):
+        """v3: rolling story summary (prompt_builder.py) saved with each campaign."""
+        have = {row[1] for row in conn.execute("PRAGMA table_info(campaigns)")}
+        for column, decl in (("summary", "TEXT"), ("summary_upto", "INTEGER NOT NULL DEFAULT 0"),
+                             ("summary_at_len", "INTEGER NOT NULL DEFAULT 0")):
+            if column not in have:
+                conn.execute(f"ALTER TABLE campaigns ADD COLUMN {column} {decl}")
+
+    @staticmethod
+    def _migrate_legacy_saves(conn):
+        """Move rows of the old one-table ``saves`` layout into campaigns + history_entries.
+
+        Each old save becomes its own campaign (key ``legacy-<id>``) so no
+        save point is lost; the old table is dropped in the same transaction.
+        """
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='saves'").fetchone():
+            return
+        rows = conn.execute("SELECT id, player_name, created_at, mode, history, offline_story_id, offline_segment "
+                            "FROM saves ORDER BY id").fetchall()
+        moved = 0
+        for sid, player_name, created_at, mode, history, story_id, segment in rows:
+            entries = json.loads(history) if history else []
+            cur = conn.execute(
+                "INSERT INTO campaigns (campaign_key, player_name, created_at, saved_at, mode, offline_story_id, "
+                "offline_segment, entry_count) VALUES (?,?,?,?,?,?,?,?)",
+                (f"legacy-{sid}", player_name, created_at, created_at, mode, story_id, segment, len(entries)))
+            conn.executemany("INSERT INTO history_entries (campaign_id, seq, entry) VALUES (?,?,?)",
+                             [(cur.lastrowid, seq, e) for seq, e in enumerate(entries)])
+            moved += 1
+        conn.execute("DROP TABLE saves")
+        print(f"Migrated {moved} saves to the campaign layout")
+
+    @contextmanager
+    def transaction(self, conn: sqlite3.Connection = None):
+        """A write transaction on ``conn``, or on a connection borrowed for the block."""
+        if conn is None:
+            with self.connection() as conn, self.transaction(conn):
+                yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def close(self):
+        """Close the idle pooled connections."""
+        self._pool.close()
+
+    # ---------------------------
+    # Saves
+    # ---------------------------
+    def _save(self, conn, campaign_key, player_name, mode, history, offline_story_id, offline_segment,
+              expected_count=None, saved_at=None, summary=None):
+        saved_at = saved_at or time.time()
+        row = conn.execute("SELECT id, entry_count FROM campaigns WHERE campaign_key=?",
+                           (campaign_key,)).fetchone()
+        if row and expected_count is not None and row[1] != expected_count:
+            # Someone else appended to this campaign since we loaded it: fork
+            # instead of interleaving two transcripts.
+            campaign_key, row = new_campaign_key(), None
+        if row is None:
+            cur = conn.execute(
+                "INSERT INTO campaigns (campaign_key, player_name, created_at, saved_at, mode, offline_story_id, "
+                "offline_segment, entry_count) VALUES (?,?,?,?,?,?,?,0)",
+                (campaign_key, player_name, saved_at, saved_at, mode, offline_story_id, offline_segment))
+            campaign_id, stored = cur.lastrowid, 0
+        else:
+            campaign_id, stored = row
+        if len(history) < stored:
+            conn.execute("DELETE FROM history_entries WHERE campaign_id=? AND seq>=?", (campaign_id, len(history)))
+            stored = len(history)
+        conn.executemany("INSERT INTO history_entries (campaign_id, seq, entry) VALUES (?,?,?)",
+                         [(campaign_id, seq, encode_entry(entry_text(history[seq]), self.codec))
+                          for seq in range(stored, len(history))])
+        conn.execute(
+            "UPDATE campaigns SET player_name=?, saved_at=?, mode=?, offline_story_id=?, offline_segment=?, "
+            "entry_count=? WHERE id=?",
+            (player_name, saved_at, mode, offline_story_id, offline_segment, len(history), campaign_id))
+        if summary is not None:
+            conn.execute("UPDATE campaigns SET summary=?, summary_upto=?, summary_at_len=? WHERE id=?",
+                         (summary["text"], summary["upto"], summary["at_len"], campaign_id))
+        return {"id": campaign_id, "campaign_key": campaign_key, "entry_count": len(history)}
+
+    def save(self, campaign_key: str, player_name: str, mode, history, offline_story_id, offline_segment,
+             expected_count: int = None, summary: dict = None) -> dict:
+        """Create or extend a campaign, writing only history entries not stored yet.
+
+        ``expected_count`` is the entry count this session last saw in the
+        store; if the campaign has changed since, the history is saved as a
+        new campaign.  ``summary`` is the prompt_builder summary state, if
+        any.  Returns ``{"id", "campaign_key", "entry_count"}``.
+        """
+        with self.transaction() as conn:
+            return self._save(conn, campaign_key, player_name, mode, history, offline_story_id,
+                              offline_segment, expected_count, summary=summary)
+
+    def save_many(self, saves) -> list:
+        """Apply several saves (dicts with the ``save`` arguments) in one transaction."""
+        with self.transaction() as conn:
+            return [self._save(conn, s["campaign_key"], s["player_name"], s["mode"], s["history"],
+                               s["offline_story_id"], s["offline_segment"], s.get("expected_count"),
+                               s.get("saved_at"), s.get("summary"))
+                    for s in saves]
+
+    def list_saves(self):
+        with self.connection() as conn:
+            return conn.execute("SELECT id, player_name, saved_at FROM campaigns ORDER BY saved_at DESC").fetchall()
+
+    def list_saves_page(self, player_name: str = None, after=None, limit: int = 10):
+        """One page of ``(id, player_name, saved_at)`` rows, most recently saved first.
+
+        Keyset pagination: ``after`` is the ``(saved_at, id)`` cursor
+        returned with the previous page, so every page costs one index range
+        scan of ``limit`` rows however large the table is.  Returns
+        ``(rows, next_cursor)``; ``next_cursor`` is None on the last page.
+        """
+        where, args = [], []
+        if player_name:
+            where.append("player_name = ?")
+            args.append(player_name)
+        if after is not None:
+            # written so the saved_at bound is an index range, not a filter
+            where.append("saved_at <= ? AND (saved_at < ? OR id < ?)")
+            args += [after[0], after[0], after[1]]
+        sql = "SELECT id, player_name, saved_at FROM campaigns"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY saved_at DESC, id DESC LIMIT ?"
+        with self.connection() as conn:
+            rows = conn.execute(sql, args + [limit + 1]).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1][2], rows[-1][0])
+        return rows, next_cursor
+
+    def count_saves(self, player_name: str = None) -> int:
+        with self.connection() as conn:
+            if player_name:
+                return conn.execute("SELECT COUNT(*) FROM campaigns WHERE player_name = ?",
+                                    (player_name,)).fetchone()[0]
+            return conn.execute("SELECT COUNT(*) FROM campaigns").fetchone()[0]
+
+    def load(self, campaign_id: int):
+        with self.connection() as conn:
+            row = conn.execute(
+                "SELECT campaign_key, player_name, mode, offline_story_id, offline_segment, entry_count, "
+                "summary, summary_upto, summary_at_len FROM campaigns WHERE id=?", (campaign_id,)).fetchone()
+            if not row:
+                return None
+            history = [decode_entry(e) for (e,) in conn.execute(
+                "SELECT entry FROM history_entries WHERE campaign_id=? ORDER BY seq", (campaign_id,))]
+        return {"campaign_key": row[0], "player_name": row[1], "mode": row[2], "history": history,
+                "offline_story_id": row[3], "offline_segment": row[4], "entry_count": row[5],
+                "summary": {"text": row[6] or "", "upto": row[7], "at_len": row[8]}}
+
+    def delete(self, campaign_id: int):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM history_entries WHERE campaign_id=?", (campaign_id,))
+            conn.execute("DELETE FROM campaigns WHERE id=?", (campaign_id,))
+
+
+SAVE_BACKEND = os.getenv("AIDM_SAVE_BACKEND", "sqlite").strip()
+
+
+def open_save_store(spec: str = SAVE_BACKEND) -> SaveBackend:
+    """The store named by ``spec``: "sqlite", "sqlite:///<path>" or a redis:// / rediss:// URL."""
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        from redis_store import RedisSaveStore
+        try:
+            return RedisSaveStore.from_url(spec)
+        except (ImportError, ValueError) as e:
+            print(f"Save backend {spec} unavailable ({e}) — saves stay in local SQLite, not shared")
+    elif spec.startswith("sqlite:///"):
+        return SaveStore(path=spec[len("sqlite:///"):])
+    elif spec not in ("", "sqlite"):
+        print(f"Unknown AIDM_SAVE_BACKEND {spec!r}, using local SQLite")
+    return SaveStore()
+
+
+# One store per process; SQLite connections come from its sqlite_pool.ConnectionPool, Redis ones from a redis pool.
+SAVE_STORE = open_save_store()
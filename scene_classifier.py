@@ -0,0 +1,144 @@
+# scene_classifier.py
+"""Pick a background scene for a DM reply from weighted keywords.
+
+Every scene has a background image and a table of keywords (whole words or
+phrases, case-insensitive) with weights.  All keywords are compiled into a
+single regex, shaped as a trie so shared prefixes are only tried once, and a
+reply is scanned once: the scene with the highest total weight wins (ties
+go to the scene listed first).  Image paths are relative to the app
+directory (``paths.app_path``), not the working directory, and are checked
+once, when ``scene_table()`` first builds the classifier; scenes whose image
+is missing are reported then and left out of the matcher, so their keywords
+cannot shadow a scene that can be shown.
+
+``AIDM_SCENES_FILE`` points at a JSON file replacing the built-in table:
+
+    {"scenes": [{"name": "forest", "background": "templates/forest background.jpg",
+                 "keywords": {"forest": 3, "trees": 2, "woods": 2}}]}
+
+(``keywords`` may also be a plain list, each with weight 1.)
+"""
+import json
+import os
+import re
+import threading
+from collections import Counter
+
+from paths import app_path
+
+SCENES_FILE = os.getenv("AIDM_SCENES_FILE", "")
+DEFAULT_SCENE = "default"
+
+DEFAULT_SCENES = [
+    {"name": "forest", "background": "templates/forest background.jpg",
+     "keywords": {"forest": 3, "forests": 3, "woods": 2, "woodland": 2, "trees": 2, "tree": 1, "wood": 1,
+                  "grove": 2, "glade": 2, "undergrowth": 1, "dryad": 1, "dryads": 1, "moss": 1, "mossy": 1}},
+    {"name": "lighthouse", "background": "templates/lighthouse background.jpg",
+     "keywords": {"lighthouse": 3, "sea": 2, "coast": 2, "pier": 2, "jetty": 2, "harbor": 2, "harbour": 2,
+                  "shore": 1, "cliff": 1, "waves": 1, "tide": 1, "gulls": 1, "fisherman": 1, "fisherwoman": 1}},
+    {"name": "swamp", "background": "templates/Misty Swamp background.jpeg",
+     "keywords": {"swamp": 3, "marsh": 2, "bog": 2, "mire": 2, "fen": 1, "reeds": 1, "bayou": 2}},
+]
+
+
+def load_scenes(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    scenes = data.get("scenes") if isinstance(data, dict) else None
+    if not isinstance(scenes, list):
+        raise ValueError(f"{path}: expected an object with a 'scenes' list")
+    return scenes
+
+
+def _trie_pattern(words) -> str:
+    """Regex source matching any of ``words``, nested by common prefix."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node):
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        if len(branches) == 1:
+            group = branches[0]
+            optional = group if len(group) == 1 else f"(?:{group})"
+        else:
+            group = optional = "(?:" + "|".join(branches) + ")"
+        return optional + "?" if "" in node else group  # "?": a keyword also ends here
+
+    return emit(trie)
+
+
+class SceneClassifier:
+    def __init__(self, scenes, exists=os.path.exists):
+        self.order = []               # scene names, in table order (breaks ties)
+        self.backgrounds = {}         # scene -> image path, only for images that exist
+        self.weights = {}             # lower-cased keyword -> [(scene, weight)]
+        for scene in scenes:
+            name, path = scene["name"], scene.get("background")
+            if not path or not exists(app_path(path)):
+                print(f"Scene {name!r}: background {path!r} not found, scene disabled")
+                continue
+            self.order.append(name)
+            self.backgrounds[name] = app_path(path)
+            keywords = scene.get("keywords", {})
+            if not isinstance(keywords, dict):
+                keywords = dict.fromkeys(keywords, 1)
+            for word, weight in keywords.items():
+                word = " ".join(word.lower().split())
+                if word:
+                    self.weights.setdefault(word, []).append((name, float(weight)))
+        self._rank = {name: i for i, name in enumerate(self.order)}
+        self._pattern = re.compile(r"\b(?:" + _trie_pattern(self.weights) + r")\b") if self.weights else None
+        # phrases match across any run of whitespace, so replies are normalized only when there are phrases
+        self._phrases = any(" " in word for word in self.weights)
+
+    def scores(self, text: str) -> Counter:
+        totals = Counter()
+        if self._pattern is None or not text:
+            return totals
+        text = text.lower()
+        if self._phrases:
+            text = " ".join(text.split())
+        for word in self._pattern.findall(text):
+            for name, weight in self.weights[word]:
+                totals[name] += weight
+        return totals
+
+    def classify(self, text: str) -> str:
+        """Best-scoring scene name, or ``DEFAULT_SCENE`` when no keyword matches."""
+        totals = self.scores(text)
+        if not totals:
+            return DEFAULT_SCENE
+        return max(totals, key=lambda name: (totals[name], -self._rank[name]))
+
+    def background(self, scene: str):
+        """Image path for ``scene``; None for the default scene or one without an image."""
+        return self.backgrounds.get(scene)
+
+
+def build_classifier() -> SceneClassifier:
+    if SCENES_FILE:
+        try:
+            return SceneClassifier(load_scenes(SCENES_FILE))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Scene table {SCENES_FILE} not loaded, using the built-in one: {e}")
+    return SceneClassifier(DEFAULT_SCENES)
+
+
+_scenes = None
+_scenes_lock = threading.Lock()
+
+
+def scene_table() -> SceneClassifier:
+    """The process-wide classifier, built on first use; backgrounds are checked then, never per rerun."""
+    global _scenes
+    if _scenes is None:
+        with _scenes_lock:
+            if _scenes is None:
+                _scenes = build_classifier()
+    return _scenes
@@ -0,0 +1,197 @@
+# scheduler.py
+"""Process-wide scheduling of OpenAI calls.
+
+Every Streamlit session runs in the same process, so a burst of players
+acting at once would otherwise burst past the account's rate limits.
+``RequestScheduler`` caps the number of calls in flight, hands free slots to
+waiting sessions round-robin (one call per session at a time, so a busy
+session cannot starve the others; speculative background calls only get a
+slot when no player is waiting), and retries rate-limit (429) and server
+(5xx) errors with jittered exponential backoff, honouring ``Retry-After``.
+``shared_client`` gives every session the same pooled HTTP client, and
+``default_client`` builds the app's client on the first AI call, so the
+(slow) ``openai`` import is not paid before the first page renders.
+"""
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+MAX_IN_FLIGHT = int(os.getenv("AIDM_MAX_IN_FLIGHT", "4"))
+MAX_RETRIES = int(os.getenv("AIDM_MAX_RETRIES", "4"))
+BACKOFF_BASE = 0.5   # seconds; attempt n waits up to BACKOFF_BASE * 2**n
+BACKOFF_MAX = 8.0
+RETRY_STATUSES = (408, 409, 429)  # and every 5xx
+REQUEST_TIMEOUT = 60.0
+
+
+def is_retryable(exc: Exception) -> bool:
+    """True for rate limits, server errors and dropped connections."""
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in RETRY_STATUSES or status >= 500
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    return type(exc).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def retry_after(exc: Exception):
+    """Seconds from the error's ``Retry-After`` header, if it has one."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestScheduler:
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT, max_retries: int = MAX_RETRIES,
+                 base_delay: float = BACKOFF_BASE, max_delay: float = BACKOFF_MAX):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        # session id -> waiting tickets; dict order is the round-robin order
+        self._waiting = OrderedDict()
+        self._background = OrderedDict()
+        self.in_flight = 0
+        self.calls = 0
+        self.retries = 0
+        self.gave_up = 0
+        self.queued = 0
+        self.peak_queue_depth = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    # ---------------------------
+    # Slots
+    # ---------------------------
+    def _queue_depth(self) -> int:
+        return sum(len(q) for q in self._waiting.values()) + sum(len(q) for q in self._background.values())
+
+    def _acquire(self, session_id, background: bool):
+        queued_at = time.perf_counter()
+        with self._lock:
+            self.calls += 1
+            idle = not self._waiting and not (background and self._background)
+            if idle and self.in_flight < self.max_in_flight:
+                self.in_flight += 1
+                return
+            ticket = threading.Event()
+            queues = self._background if background else self._waiting
+            queues.setdefault(session_id, deque()).append(ticket)
+            self.queued += 1
+            self.peak_queue_depth = max(self.peak_queue_depth, self._queue_depth())
+        ticket.wait()
+        waited = time.perf_counter() - queued_at
+        with self._lock:
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+            for queues in (self._waiting, self._background):
+                if queues:
+                    session_id, tickets = next(iter(queues.items()))
+                    ticket = tickets.popleft()
+                    if tickets:
+                        queues.move_to_end(session_id)
+                    else:
+                        del queues[session_id]
+                    self.in_flight += 1
+                    ticket.set()
+                    return
+
+    # ---------------------------
+    # Calls
+    # ---------------------------
+    def run(self, fn, session_id: str = "", background: bool = False, can_retry=None):
+        """Call ``fn()`` in a slot, retrying transient errors; returns its result.
+
+        ``can_retry()`` is checked before each retry (e.g. to stop once a
+        streamed reply has started painting).  The slot is released while
+        backing off so other sessions keep going.
+        """
+        attempt = 0
+        while True:
+            self._acquire(session_id, background)
+            try:
+                return fn()
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries or (can_retry and not can_retry()):
+                    if is_retryable(e):
+                        with self._lock:
+                            self.gave_up += 1
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                hinted = retry_after(e)
+                if hinted is not None:
+                    delay = min(self.max_delay, hinted) + delay / 4
+                attempt += 1
+                with self._lock:
+                    self.retries += 1
+            finally:
+                self._release()
+            time.sleep(delay)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = self.queued
+            return {"in_flight": self.in_flight, "queue_depth": self._queue_depth(),
+                    "peak_queue_depth": self.peak_queue_depth, "calls": self.calls, "queued": waits,
+                    "wait_avg": self.wait_total / waits if waits else 0.0, "wait_max": self.wait_max,
+                    "retries": self.retries, "gave_up": self.gave_up}
+
+
+# One scheduler per process, shared by every session.
+SCHEDULER = RequestScheduler()
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def shared_client(api_key: str, base_url: str = None):
+    """One OpenAI client per key and endpoint, so all sessions share its HTTP connection pool.
+
+    SDK retries are off: ``SCHEDULER`` retries instead, without holding a slot.
+    """
+    base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+    key = (api_key, base_url)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            from openai import OpenAI  # imported on first use: the slowest import of the app
+            client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0, timeout=REQUEST_TIMEOUT)
+            _clients[key] = client
+        return client
+
+
+_default_client = None        # (client or None,) once the key has been looked up
+_default_lock = threading.Lock()
+
+
+def default_client(find_key=lambda: os.getenv("OPENAI_API_KEY", "")):
+    """The process-wide client for the configured key, created on first use; None without a key.
+
+    ``find_key`` is called once per process.  A missing key or a failed
+    initialisation is remembered too, so it is reported once, not on every rerun.
+    """
+    global _default_client
+    if _default_client is None:
+        with _default_lock:
+            if _default_client is None:
+                client = None
+                api_key = find_key()
+                if api_key:
+                    try:
+                        client = shared_client(api_key)
+                        print("✅ OpenAI API key loaded")
+                    except Exception as e:  # e.g. the openai package is not installed
+                        print(f"OpenAI init error: {e}")
+                else:
+                    print("No OpenAI key found — offline mode available")
+                _default_client = (client,)
+    return _default_client[0]
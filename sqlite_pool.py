@@ -0,0 +1,81 @@
+# sqlite_pool.py
+"""A small pool of SQLite connections shared by every thread of the process.
+
+Streamlit starts a new script thread for most reruns, so connections kept
+per thread were opened (and their PRAGMAs re-run) on nearly every rerun and
+never reused.  A pooled connection is opened with ``check_same_thread=False``,
+set up once by ``setup(conn)`` and lent to one thread at a time::
+
+    with pool.connection() as conn:
+        conn.execute(...)
+
+Any number of connections can be out at once (WAL readers never block each
+other); up to ``max_idle`` are kept for reuse.  A connection handed back in
+the middle of a transaction is rolled back first.
+"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class ConnectionPool:
+    def __init__(self, path: str, setup=None, timeout: float = 5.0, max_idle: int = 8):
+        self.path = path
+        self.setup = setup
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle = []  # most recently returned last, so warm connections are reused first
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def _open(self) -> sqlite3.Connection:
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+        try:
+            if self.setup is not None:
+                self.setup(conn)
+        except BaseException:
+            conn.close()
+            raise
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Lend a connection for the ``with`` block."""
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._open()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def _release(self, conn: sqlite3.Connection):
+        try:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+        except sqlite3.Error:
+            conn.close()
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        """Close the idle connections; the pool opens new ones if it is used again."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"opened": self.opened, "idle": len(self._idle)}
@@ -0,0 +1,192 @@
+# static_assets.py
+"""Serve page images as content-hashed static files instead of inline base64.
+
+With ``AIDM_ASSET_MODE=static`` each background/scroll image is copied once
+under a name containing a hash of its bytes, and the page CSS references
+``url(...)`` instead of inlining it, so browsers download each image once (a
+changed file gets a new name).  Where the copies are served from:
+
+- Streamlit itself, when ``server.enableStaticServing`` is on: copies go to
+  ``static/assets/`` next to the app and are linked as ``app/static/...``,
+  relative to the page, so they share its origin, scheme and base path.
+- Otherwise a small HTTP server in a daemon thread (``Cache-Control:
+  immutable``), but only when ``AIDM_STATIC_BASE_URL`` says how browsers
+  reach it.  It binds to ``AIDM_STATIC_HOST`` (default ``127.0.0.1``), to sit
+  behind the same proxy as the app.
+
+With neither, or if the directory or server is unavailable, no resolver is
+installed and the app keeps inlining images as before.
+"""
+import hashlib
+import os
+import shutil
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from paths import DB_FOLDER
+
+ASSET_MODE = os.getenv("AIDM_ASSET_MODE", "inline").strip().lower()
+STATIC_DIR = os.getenv("AIDM_STATIC_DIR") or os.path.join(DB_FOLDER, "static")
+STATIC_HOST = os.getenv("AIDM_STATIC_HOST", "127.0.0.1")
+STATIC_PORT = int(os.getenv("AIDM_STATIC_PORT", "8599"))
+# Public base URL browsers use to reach the built-in server (e.g. through the app's proxy); unset: no server
+STATIC_BASE_URL = os.getenv("AIDM_STATIC_BASE_URL", "").strip()
+# Streamlit serves <app dir>/static/<path> at app/static/<path> when server.enableStaticServing is on
+APP_STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "assets")
+APP_STATIC_URL = "app/static/assets"
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def hashed_name(path: str, digest: str) -> str:
+    stem, ext = os.path.splitext(os.path.basename(path))
+    stem = "".join(ch if ch.isalnum() or ch in "-_" else "-" for ch in stem)
+    return f"{stem}.{digest[:16]}{ext.lower()}"
+
+
+class _ImmutableFileHandler(SimpleHTTPRequestHandler):
+    """Plain file handler that never lists directories and marks files immutable."""
+
+    def end_headers(self):
+        if self.command in ("GET", "HEAD"):
+            self.send_header("Cache-Control", CACHE_CONTROL)
+        super().end_headers()
+
+    def list_directory(self, path):
+        self.send_error(404, "Not found")
+        return None
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StaticAssetDirectory:
+    """Content-hashed copies of images in ``directory``, which something else serves at ``base_url``."""
+
+    def __init__(self, directory: str, base_url: str, signature=None):
+        self.directory = directory
+        self.base_url = base_url.rstrip("/")
+        # ``signature(path) -> (mtime_ns, size) or None``; AssetCache.signature throttles os.stat.
+        self.signature = signature or _stat_signature
+        self._published = {}  # (path, mtime_ns, size) -> URL
+        self._lock = threading.Lock()
+
+    def start(self) -> bool:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+        except OSError as e:
+            print(f"Static asset directory unavailable ({e}) — inlining images")
+            return False
+        print(f"Publishing static assets to {self.directory} as {self.base_url}/...")
+        return True
+
+    def publish(self, path: str):
+        """Copy ``path`` under its content-hashed name and return its URL (None on failure)."""
+        sig = self.signature(path)
+        if sig is None:
+            return None
+        key = (path, sig[0], sig[1])
+        with self._lock:
+            url = self._published.get(key)
+        if url:
+            return url
+        try:
+            h = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 16), b""):
+                    h.update(chunk)
+            name = hashed_name(path, h.hexdigest())
+            target = os.path.join(self.directory, name)
+            if not os.path.exists(target):
+                tmp = target + ".tmp"
+                shutil.copyfile(path, tmp)
+                os.replace(tmp, target)
+        except OSError as e:
+            print(f"Could not publish {path}: {e}")
+            return None
+        url = f"{self.base_url}/{name}"
+        with self._lock:
+            self._published[key] = url
+        return url
+
+    def url_for(self, path: str):
+        return self.publish(path)
+
+
+class StaticAssetServer(StaticAssetDirectory):
+    """A StaticAssetDirectory served by its own HTTP server."""
+
+    def __init__(self, directory: str = STATIC_DIR, host: str = STATIC_HOST, port: int = STATIC_PORT,
+                 base_url: str = STATIC_BASE_URL, signature=None):
+        super().__init__(directory, base_url, signature)
+        self.host = host
+        self.port = port
+        self._httpd = None
+
+    def start(self) -> bool:
+        if self._httpd is not None:
+            return True
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            handler = partial(_ImmutableFileHandler, directory=self.directory)
+            self._httpd = ThreadingHTTPServer((self.host, self.port), handler)
+        except OSError as e:
+            print(f"Static asset server unavailable ({e}) — inlining images")
+            self._httpd = None
+            return False
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, name="aidm-static", daemon=True).start()
+        print(f"Serving static assets from {self.directory} on {self.host}:{self.port} as {self.base_url}")
+        return True
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def url_for(self, path: str):
+        return self.publish(path) if self._httpd is not None else None
+
+
+def _stat_signature(path: str):
+    try:
+        st_ = os.stat(path)
+    except OSError:
+        return None
+    return (st_.st_mtime_ns, st_.st_size)
+
+
+def _streamlit_static_serving() -> bool:
+    try:
+        import streamlit as st
+        return bool(st.get_option("server.enableStaticServing"))
+    except Exception:  # not running under Streamlit, or an old version without the option
+        return False
+
+
+_server = None
+_attempted = False
+_server_lock = threading.Lock()
+
+
+def enable_static_assets(cache, mode: str = None):
+    """Install the static URL resolver on ``cache`` once per process when mode is "static"."""
+    global _server, _attempted
+    if (mode or ASSET_MODE) != "static":
+        return None
+    with _server_lock:
+        if not _attempted:
+            _attempted = True
+            if _streamlit_static_serving():
+                server = StaticAssetDirectory(APP_STATIC_DIR, APP_STATIC_URL, signature=cache.signature)
+            elif STATIC_BASE_URL:
+                server = StaticAssetServer(signature=cache.signature)
+            else:
+                print("AIDM_ASSET_MODE=static needs server.enableStaticServing or AIDM_STATIC_BASE_URL "
+                      "— inlining images")
+                return None
+            if server.start():
+                _server = server
+                cache.url_resolver = server.url_for
+    return _server
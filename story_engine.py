@@ -0,0 +1,228 @@
+# story_engine.py
+"""Offline adventures, loaded from story packs into an immutable graph.
+
+A story pack is a JSON (or, with PyYAML installed, YAML) file in
+``stories/`` (``AIDM_STORIES_DIR``) holding ``{"stories": [...]}``.  Each
+story has an ``id``, a ``title`` and a list of ``segments``; a segment has
+an ``id``, ``text``, an optional ``background`` image and its ``choices``
+(``label``, ``result`` and an optional ``next`` segment id, or ``"end"``).
+Without ``next`` a choice leads to the following segment, as the old
+hard-coded stories did.
+
+Packs are read and validated once per process, on first use: ``next`` ids
+are resolved to segment positions, and unreachable segments and missing
+background images are reported then, never during play.  Positions are
+plain integers, so ``offline_segment`` in older saves keeps working.
+"""
+import json
+import os
+import threading
+from dataclasses import dataclass
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+STORIES_DIR = os.getenv("AIDM_STORIES_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "stories")
+END = "end"
+
+_PACK_ERRORS = (OSError, ValueError) + ((yaml.YAMLError,) if yaml is not None else ())
+
+
+class StoryPackError(ValueError):
+    """A story that cannot be played (bad structure or a dangling ``next``)."""
+
+
+@dataclass(frozen=True)
+class Choice:
+    label: str
+    result: str
+    next: int                 # position of the next segment; ``len(story.segments)`` ends the story
+
+
+@dataclass(frozen=True)
+class Segment:
+    id: str
+    text: str
+    background: str           # None when not given or the file is missing
+    choices: tuple
+
+
+@dataclass(frozen=True)
+class Story:
+    id: str
+    title: str
+    segments: tuple
+
+    def segment(self, position: int):
+        """The segment at ``position``, or None once the story is finished."""
+        if position is None or not 0 <= position < len(self.segments):
+            return None
+        return self.segments[position]
+
+
+class StoryLibrary:
+    """All loaded stories, indexed by id; built once and never modified."""
+
+    def __init__(self, stories, warnings=()):
+        self.stories = tuple(stories)
+        self.ids = tuple(s.id for s in self.stories)
+        self.warnings = tuple(warnings)
+        self._by_id = {s.id: s for s in self.stories}
+        self._positions = {story_id: i for i, story_id in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.stories)
+
+    def get(self, story_id, default=None):
+        return self._by_id.get(story_id, default)
+
+    def title(self, story_id) -> str:
+        story = self._by_id.get(story_id)
+        return story.title if story else str(story_id)
+
+    def position(self, story_id) -> int:
+        """Index of ``story_id`` in ``ids`` (0 for unknown ids, e.g. a story removed since a save)."""
+        return self._positions.get(story_id, 0)
+
+
+# ---------------------------
+# Loading and validation
+# ---------------------------
+def _text(raw: dict, field: str, where: str) -> str:
+    value = raw.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise StoryPackError(f"{where}: '{field}' must be a non-empty string")
+    return value
+
+
+def build_story(raw: dict, warnings: list, asset_exists=os.path.exists) -> Story:
+    """Validate one story dict and resolve its ``next`` ids; raises ``StoryPackError``."""
+    if not isinstance(raw, dict):
+        raise StoryPackError("a story must be an object")
+    story_id = _text(raw, "id", "story")
+    where = f"story {story_id!r}"
+    title = _text(raw, "title", where)
+    raw_segments = raw.get("segments")
+    if not isinstance(raw_segments, list) or not raw_segments:
+        raise StoryPackError(f"{where}: 'segments' must be a non-empty list")
+
+    index = {}
+    for pos, seg in enumerate(raw_segments):
+        if not isinstance(seg, dict):
+            raise StoryPackError(f"{where}: segment {pos} must be an object")
+        seg_id = str(seg.get("id", pos))
+        if seg_id in index:
+            raise StoryPackError(f"{where}: duplicate segment id {seg_id!r}")
+        index[seg_id] = pos
+
+    end = len(raw_segments)
+    segments = []
+    for pos, seg in enumerate(raw_segments):
+        seg_id = str(seg.get("id", pos))
+        seg_where = f"{where}, segment {seg_id!r}"
+        raw_choices = seg.get("choices")
+        if not isinstance(raw_choices, list) or not raw_choices:
+            raise StoryPackError(f"{seg_where}: 'choices' must be a non-empty list")
+        choices = []
+        for ch in raw_choices:
+            if not isinstance(ch, dict):
+                raise StoryPackError(f"{seg_where}: a choice must be an object")
+            target = ch.get("next", pos + 1)
+            if target is None or target == END:
+                target = end
+            elif target != pos + 1:
+                if not isinstance(target, str) or target not in index:
+                    raise StoryPackError(f"{seg_where}: choice {ch.get('label')!r} leads to unknown segment {target!r}")
+                target = index[target]
+            choices.append(Choice(_text(ch, "label", seg_where), _text(ch, "result", seg_where), target))
+        background = seg.get("background") or None
+        if background and not asset_exists(background):
+            warnings.append(f"{seg_where}: background {background!r} not found, using the default")
+            background = None
+        segments.append(Segment(seg_id, _text(seg, "text", seg_where), background, tuple(choices)))
+
+    reachable, frontier = {0}, [0]
+    while frontier:
+        for ch in segments[frontier.pop()].choices:
+            if ch.next < end and ch.next not in reachable:
+                reachable.add(ch.next)
+                frontier.append(ch.next)
+    for pos, seg in enumerate(segments):
+        if pos not in reachable:
+            warnings.append(f"{where}: segment {seg.id!r} can never be reached")
+    return Story(story_id, title, tuple(segments))
+
+
+def read_pack(path: str) -> list:
+    """Raw story dicts from one pack file."""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    stories = data.get("stories") if isinstance(data, dict) else None
+    if not isinstance(stories, list):
+        raise StoryPackError("expected an object with a 'stories' list")
+    return stories
+
+
+def load_library(directory: str = STORIES_DIR) -> StoryLibrary:
+    """Read and validate every pack in ``directory`` (sorted by file name).
+
+    A pack that cannot be read, or a story that fails validation, is left
+    out with a warning; the rest of the library still loads.
+    """
+    stories, warnings, seen = [], [], set()
+    exists = {}
+
+    def asset_exists(path):
+        if path not in exists:
+            exists[path] = os.path.exists(path)
+        return exists[path]
+
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError as e:
+        names = []
+        warnings.append(f"cannot read {directory}: {e}")
+    for name in names:
+        if not name.endswith((".json", ".yaml", ".yml")):
+            continue
+        if not name.endswith(".json") and yaml is None:
+            warnings.append(f"{name}: skipped, install PyYAML to load YAML story packs")
+            continue
+        try:
+            raw_stories = read_pack(os.path.join(directory, name))
+        except _PACK_ERRORS as e:
+            warnings.append(f"{name}: {e}")
+            continue
+        for raw in raw_stories:
+            try:
+                story = build_story(raw, warnings, asset_exists)
+            except StoryPackError as e:
+                warnings.append(f"{name}: {e}")
+                continue
+            if story.id in seen:
+                warnings.append(f"{name}: duplicate story id {story.id!r} skipped")
+                continue
+            seen.add(story.id)
+            stories.append(story)
+    for w in warnings:
+        print(f"Story pack warning: {w}")
+    return StoryLibrary(stories, warnings)
+
+
+_library = None
+_library_lock = threading.Lock()
+
+
+def story_library() -> StoryLibrary:
+    """The process-wide library, loaded on first use."""
+    global _library
+    if _library is None:
+        with _library_lock:
+            if _library is None:
+                _library = load_library()
+    return _library
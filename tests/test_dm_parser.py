@@ -0,0 +1,143 @@
+# test_dm_parser.py
+"""dm_parser must split every reply exactly as the original parser did.
+
+A corpus of typical and awkward DM outputs, plus randomly assembled ones,
+goes through both the short-reply line loop and the long-reply pattern scan
+and is compared with the original multi-pass ``parse_ai_output`` (kept
+below as ``legacy_parse_ai_output``).  Runs under pytest or on its own:
+
+    python tests/test_dm_parser.py
+"""
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import dm_parser  # noqa: E402
+from dm_parser import parse_ai_output, parse_dm_output  # noqa: E402
+
+
+def legacy_parse_ai_output(text):
+    """The parser as it was in Final_AIDUNGEONMASTER_Project.py before dm_parser.py."""
+    if not text:
+        return ("", [])
+    lines = [ln.rstrip() for ln in text.splitlines()]
+    joined_lower = "\n".join(lines).lower()
+    choices = []
+    if "choices:" in joined_lower:
+        story_lines = []
+        in_choices = False
+        for ln in lines:
+            if ln.strip().lower().startswith("choices:"):
+                in_choices = True
+                continue
+            if in_choices:
+                s = ln.strip()
+                if not s:
+                    continue
+                s = s.lstrip("0123456789.)-• \t")
+                if s:
+                    choices.append(s)
+            else:
+                story_lines.append(ln)
+        return ("\n".join(story_lines).strip(), choices)
+    story_lines = []
+    for ln in lines:
+        s = ln.strip()
+        if not s:
+            story_lines.append(ln)
+            continue
+        if (s[0].isdigit() and (s[1:2] in ('.', ')'))) or s.startswith(("-", "•")):
+            candidate = s.lstrip("0123456789.)-• \t")
+            if len(candidate.split()) <= 20:
+                choices.append(candidate)
+            else:
+                story_lines.append(ln)
+        else:
+            story_lines.append(ln)
+    if not choices:
+        tail = [ln.strip() for ln in lines[-6:] if ln.strip()]
+        heur = [ln for ln in tail if len(ln.split()) <= 12]
+        choices = heur[-3:]
+        story_lines = lines[:-len(choices)] if choices else lines
+    return ("\n".join(story_lines).strip(), choices)
+
+
+STORY = ("The fog parts as you step onto the old stone road. Lanterns sway from crooked posts, and somewhere "
+         "beyond the trees a bell tolls once, then falls silent.")
+CORPUS = [
+    "",
+    "   ",
+    STORY,
+    STORY + "\n\nChoices:\n1. Ask the figure\n2. Follow the road\n3. Slip into the forest",
+    STORY + "\n\nCHOICES:\n1) Ask\n2) Follow\n3) Hide\n",
+    STORY + "\n\n**Choices:**\n1. Ask\n2. Follow",  # markdown header: "choices:" only mid-line
+    STORY + "\n\n  choices: pick one\n- Ask\n- Follow\n\nChoices:\n3. Hide",
+    STORY + "\n\n1. Ask the figure who sent them\n2. Follow the road toward the bell\n3. Hide",
+    STORY + "\n\n- Ask\n• Follow\n-\n- " + " ".join(["word"] * 25),
+    STORY + "\n\n1.Ask\n2)Follow\n3 . not a bullet\n10. Ten\n²) superscript\n٣. arabic-indic",
+    "Line one\nLine two\n\nDo you go left?\nOr right?\nOr wait here?\n\n",
+    "A\r\nB\r\n1. one\r\n2. two",
+    "Story\x0bwith\x0cform feeds and separators\n- choice",
+    "\t - nbsp bullet\n　１. fullwidth digit",
+    "Choices:",
+    "choices:\n\n   \n",
+    "The path splits.\nChoices: left, right\n",
+    STORY + "\n" + "\n".join(f"short line {i}" for i in range(10)),
+    " .\n5 .\n x.\n7-\n-\n•",
+]
+
+PIECES = ["Choices:", "choices:", "CHOICES: ", "**Choices:**", "1. Go", "2) Run", "3.", "- Hide", "• Sneak",
+          "-", "", " ", "\t", STORY, "Do you fight?", "A short line", "x." , "9) nine", "٣. three",
+          "² two", " ".join(["long"] * 21), " ".join(["mid"] * 13), " - nbsp", "line\r", "a\x0bb"]
+
+
+def fuzz_case(rng):
+    return rng.choice(["\n", "\r\n", "\n\n"]).join(rng.choice(PIECES) for _ in range(rng.randint(0, 12)))
+
+
+def mismatches(cases):
+    """Replies that parse differently from the original, through either path."""
+    bad, short_reply_default = [], dm_parser.SHORT_REPLY
+    try:
+        for text in cases:
+            expected = legacy_parse_ai_output(text)
+            for short_reply in (len(text), 0):  # the line loop, then the pattern scan
+                dm_parser.SHORT_REPLY = short_reply
+                got = parse_ai_output(text)
+                if (expected[0], list(expected[1])) != (got[0], list(got[1])):
+                    bad.append((text, expected, got))
+    finally:
+        dm_parser.SHORT_REPLY = short_reply_default
+    return bad
+
+
+def test_corpus():
+    bad = mismatches(CORPUS)
+    assert not bad, f"{len(bad)} mismatches, first: {bad[0]!r}"
+
+
+def test_fuzz():
+    rng = random.Random(1)
+    bad = mismatches([fuzz_case(rng) for _ in range(5000)])
+    assert not bad, f"{len(bad)} mismatches, first: {bad[0]!r}"
+
+
+def test_strategies():
+    assert parse_dm_output("")[2] == dm_parser.NONE
+    assert parse_dm_output(CORPUS[3])[2] == dm_parser.HEADER
+    assert parse_dm_output(CORPUS[5])[2] == dm_parser.NONE  # "choices:" only mid-line
+    assert parse_dm_output(CORPUS[7])[2] == dm_parser.BULLETS
+    assert parse_dm_output(CORPUS[10])[2] == dm_parser.TAIL
+    before = dm_parser.STRATEGY_COUNTS[dm_parser.BULLETS]
+    parse_dm_output(CORPUS[7])
+    assert dm_parser.STRATEGY_COUNTS[dm_parser.BULLETS] == before + 1
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"{name}: ok")
@@ -0,0 +1,104 @@
+# test_response_shapes.py
+"""ai_backend.normalize_response_text on every completion shape the app meets.
+
+Each recorded completion below (Responses API and chat/legacy completions,
+as plain dicts and, when the ``openai`` package is installed, as the SDK
+objects built from the same payloads) must normalize to its expected text.
+Runs under pytest or on its own:
+
+    python tests/test_response_shapes.py
+"""
+import copy
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ai_backend import normalize_response_text  # noqa: E402
+
+STORY = "The torches gutter as a cold wind sweeps through the hall."
+CHOICES = "Choices:\n1. Descend\n2. Follow the voice\n3. Wait"
+
+# ---------------------------
+# Recorded payloads (ids and usage trimmed)
+# ---------------------------
+RESPONSES_MESSAGE = {
+    "id": "resp_0a1b2c", "object": "response", "created_at": 1760000000.0, "model": "gpt-4o-mini-2024-07-18",
+    "status": "completed", "parallel_tool_calls": True, "tool_choice": "auto", "tools": [],
+    "output": [
+        {"type": "reasoning", "id": "rs_01", "summary": []},
+        {"type": "message", "id": "msg_01", "role": "assistant", "status": "completed",
+         "content": [{"type": "output_text", "text": STORY + "\n", "annotations": []},
+                     {"type": "output_text", "text": CHOICES, "annotations": []}]},
+    ],
+}
+RESPONSES_TEXT_PARTS = {  # older gateways label the parts "text"
+    "id": "resp_0d", "object": "response", "status": "completed",
+    "output": [{"type": "message", "role": "assistant",
+                "content": [{"type": "text", "text": STORY}, {"type": "refusal", "refusal": "no"}]}],
+}
+RESPONSES_OUTPUT_TEXT = {"id": "resp_0e", "object": "response", "output_text": STORY + "\n" + CHOICES}
+RESPONSES_EMPTY = {"id": "resp_0f", "object": "response", "status": "incomplete", "output": []}
+CHAT = {
+    "id": "chatcmpl-9x", "object": "chat.completion", "created": 1760000000, "model": "gpt-4o-mini-2024-07-18",
+    "choices": [{"index": 0, "finish_reason": "stop", "logprobs": None,
+                 "message": {"role": "assistant", "content": STORY + "\n" + CHOICES, "refusal": None}}],
+}
+CHAT_NO_CONTENT = {
+    "id": "chatcmpl-9y", "object": "chat.completion", "created": 1760000000, "model": "gpt-4o-mini-2024-07-18",
+    "choices": [{"index": 0, "finish_reason": "tool_calls", "logprobs": None,
+                 "message": {"role": "assistant", "content": None}}],
+}
+LEGACY_COMPLETION = {
+    "id": "cmpl-7z", "object": "text_completion", "created": 1760000000, "model": "gpt-3.5-turbo-instruct",
+    "choices": [{"index": 0, "finish_reason": "stop", "logprobs": None, "text": STORY}],
+}
+
+# (name, payload, expected text, SDK model to build it as or None)
+CASES = [
+    ("responses output[] output_text parts", RESPONSES_MESSAGE, STORY + "\n" + CHOICES, "Response"),
+    ("responses output[] text parts", RESPONSES_TEXT_PARTS, STORY, None),
+    ("responses output_text field", RESPONSES_OUTPUT_TEXT, STORY + "\n" + CHOICES, None),
+    ("responses empty output", RESPONSES_EMPTY, "", None),
+    ("chat choices[0].message.content", CHAT, STORY + "\n" + CHOICES, "ChatCompletion"),
+    ("chat message without content", CHAT_NO_CONTENT, "", "ChatCompletion"),
+    ("legacy choices[0].text", LEGACY_COMPLETION, STORY, "Completion"),
+    ("None", None, "", None),
+    ("empty string", "", "", None),
+    ("plain string", STORY, STORY, None),
+]
+
+
+def sdk_object(model: str, payload: dict):
+    """The payload as the openai SDK returns it, or None without the package."""
+    try:
+        from openai.types import Completion
+        from openai.types.chat import ChatCompletion
+        from openai.types.responses import Response
+    except ImportError:
+        return None
+    models = {"Response": Response, "ChatCompletion": ChatCompletion, "Completion": Completion}
+    return models[model].model_validate(copy.deepcopy(payload))
+
+
+def cases():
+    for name, payload, expected, model in CASES:
+        yield name, payload, expected
+        obj = sdk_object(model, payload) if model else None
+        if obj is not None:
+            yield f"{name} (SDK {model})", obj, expected
+
+
+def test_response_shapes():
+    bad = []
+    for name, resp, expected in cases():
+        got = normalize_response_text(resp)
+        if got != expected:
+            bad.append(f"{name}: expected {expected!r}, got {got!r}")
+    assert not bad, "\n".join(bad)
+
+
+if __name__ == "__main__":
+    test_response_shapes()
+    print(f"{sum(1 for _ in cases())} response shapes normalized as expected")
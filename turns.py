@@ -0,0 +1,103 @@
+# turns.py
+"""Typed history entries.
+
+A ``Turn`` keeps a DM reply's choices (parsed once, when the reply arrives)
+and its scene background next to the text, so reruns never parse history
+again.  ``str(turn)`` is the original prompt line (``"DM: ..."``,
+``"PLAYER: ..."``, ``"OFFLINE: ..."``), which is also the format of saves
+made before turns were stored as JSON; ``Turn.load`` reads both.
+"""
+import json
+
+DM = "dm"
+PLAYER = "player"
+OFFLINE = "offline"
+_PREFIXES = ((DM, "DM:"), (PLAYER, "PLAYER:"), (OFFLINE, "OFFLINE:"))
+_CHOICES = "\n\nChoices:\n"
+
+
+class Turn:
+    """One history entry; treat as immutable (equality and hash use the content)."""
+
+    __slots__ = ("role", "text", "choices", "background", "ts")
+
+    def __init__(self, role: str, text: str, choices=(), background: str = None, ts: float = None):
+        self.role = role
+        self.text = text
+        self.choices = tuple(choices)
+        self.background = background
+        self.ts = ts
+
+    def _key(self):
+        return (self.role, self.text, self.choices, self.background, self.ts)
+
+    def __eq__(self, other):
+        return isinstance(other, Turn) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return f"Turn({self.role!r}, {self.text[:30]!r}, choices={len(self.choices)})"
+
+    @property
+    def display(self) -> str:
+        """Text as shown in the log: the story followed by its numbered choices."""
+        if not self.choices:
+            return self.text
+        return self.text + _CHOICES + "\n".join(f"{i + 1}. {c}" for i, c in enumerate(self.choices))
+
+    def __str__(self):
+        if self.role == DM:
+            return "DM: " + self.display
+        if self.role == PLAYER:
+            return "PLAYER: " + self.text
+        return "OFFLINE: " + self.text
+
+    # ---------------------------
+    # Serialization
+    # ---------------------------
+    def to_dict(self) -> dict:
+        d = {"r": self.role, "t": self.text}
+        if self.choices:
+            d["c"] = list(self.choices)
+        if self.background:
+            d["bg"] = self.background
+        if self.ts is not None:
+            d["ts"] = self.ts
+        return d
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        return cls(d["r"], d["t"], d.get("c", ()), d.get("bg"), d.get("ts"))
+
+    def dumps(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def from_legacy(cls, entry: str):
+        """Parse an old ``"DM: ..."``-style string entry."""
+        for role, prefix in _PREFIXES:
+            if entry.startswith(prefix):
+                body = entry[len(prefix):].strip()
+                break
+        else:
+            return cls(PLAYER, entry.strip())
+        if role != DM or _CHOICES not in body:
+            return cls(role, body)
+        story, listed = body.split(_CHOICES, 1)
+        choices = [line.split(".", 1)[1].strip() for line in listed.splitlines()
+                   if "." in line and line.split(".", 1)[0].strip().isdigit()]
+        return cls(DM, story.strip(), choices)
+
+    @classmethod
+    def load(cls, value):
+        """A Turn from a stored entry: JSON (current saves) or a legacy string."""
+        if isinstance(value, Turn):
+            return value
+        if value.startswith("{"):
+            try:
+                return cls.from_dict(json.loads(value))
+            except (ValueError, KeyError, TypeError):
+                pass
+        return cls.from_legacy(value)